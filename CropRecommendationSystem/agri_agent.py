@@ -1,6 +1,6 @@
 
 import os
-import google.generativeai as genai
+import sys
 import json
 import logging
 from dotenv import load_dotenv, find_dotenv
@@ -8,47 +8,62 @@ from dotenv import load_dotenv, find_dotenv
 # Load environment variables from the project root .env file
 load_dotenv(find_dotenv())
 
+# Shared helpers live in the repo-root `common` package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.chat_agent import ChatAgent
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class AgriAgent:
-    def __init__(self):
-        # API Key Pool
-        # You can add more keys here to distribute the load
-        self.api_keys = [
-            os.getenv('GOOGLE_API_KEY_1'),
-            os.getenv('GOOGLE_API_KEY_2'),
-            os.getenv('GOOGLE_API_KEY_3')
-        ]
-        # Filter out None values
-        self.api_keys = [key for key in self.api_keys if key]
-        self.current_key_index = 0
-        self.model = None
-        self._configure_current_key()
-
-    def _configure_current_key(self):
-        """Configures Gemini with the current active key."""
-        if not self.api_keys:
-            logger.error("No API keys available.")
-            return
-
-        current_key = self.api_keys[self.current_key_index]
-        try:
-            genai.configure(api_key=current_key)
-            logger.info(f"Switched to API Key Index: {self.current_key_index}")
-            # Using Gemini Pro (Stable)
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
-        except Exception as e:
-            logger.error(f"Error configuring key index {self.current_key_index}: {e}")
-
-    def _rotate_key(self):
-        """Rotates to the next available API key."""
-        self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-        logger.warning(f"Rotating API Key... New Index: {self.current_key_index}")
-        self._configure_current_key()
-
-    def construct_system_prompt(self, context_data):
+# Identical questions on the same context reuse the cached answer for this long
+CACHE_TTL_S = 6 * 3600
+
+class AgriAgent(ChatAgent):
+    cache_namespace = "agri"
+    cache_ttl_s = CACHE_TTL_S
+    fallback_reply = "I am having trouble connecting to the knowledge base. All keys exhausted. Error: {error}"
+
+    def _format_ranked_crops(self, ranked_crops):
+        """
+        Formats the /predict top_k list into compact prompt lines, e.g.
+        '- maize (12.0%): needs N +14.2, rainfall -35.0'.
+        """
+        lines = []
+        for entry in ranked_crops:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                pct = f"{float(entry.get('probability', 0)) * 100:.1f}%"
+            except (TypeError, ValueError):
+                pct = "?"
+            gaps = entry.get('requirement_gap') or {}
+            # Gap is input minus requirement, so the change needed is its negation
+            needs = [f"{feat} {-gap:+.1f}" for feat, gap in gaps.items() if gap]
+            detail = f"needs {', '.join(needs)}" if needs else "within requirement ranges"
+            lines.append(f"- {entry.get('crop', 'Unknown')} ({pct}): {detail}")
+        return "\n".join(lines)
+
+    def _format_similar_farms(self, neighbors):
+        """
+        Formats /similar_farms records into compact prompt lines, e.g.
+        '- rice: N 85, P 58, K 41, 21.8°C, 80% humidity, pH 7.0, 226 mm'.
+        """
+        lines = []
+        for entry in neighbors:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                lines.append(
+                    f"- {entry.get('crop', 'Unknown')}: N {entry['N']:.0f}, P {entry['P']:.0f}, K {entry['K']:.0f}, "
+                    f"{entry['temperature']:.1f}°C, {entry['humidity']:.0f}% humidity, pH {entry['ph']:.1f}, "
+                    f"{entry['rainfall']:.0f} mm"
+                )
+            except (KeyError, TypeError, ValueError):
+                continue
+        return "\n".join(lines)
+
+    def construct_chat_prompt(self, context_data):
         """
         Generates the system prompt merging static rules with dynamic context.
         """
@@ -69,6 +84,10 @@ class AgriAgent:
         rainfall = context_data.get('rainfall', 'N/A')
         temperature = context_data.get('temperature', 'N/A')
         
+        ranked_crops = context_data.get('top_k') or []
+        alternatives = self._format_ranked_crops(ranked_crops[1:]) or "- None provided"
+        similar_farms = self._format_similar_farms(context_data.get('similar_farms') or []) or "- None provided"
+
         confidence_warning = ""
         if conf_val < 60:
             confidence_warning = "\nWARNING: The model confidence is LOW (< 60%). You MUST advise the user to consult a local agricultural officer before taking final decisions."
@@ -92,9 +111,17 @@ PREDICTION CONTEXT:
 - Rainfall: {rainfall} mm
 - Temperature: {temperature} °C
 
+RUNNER-UP CROPS (model probability, change needed to meet crop requirements):
+{alternatives}
+
+SIMILAR KNOWN CONDITIONS (closest labelled records in the training data):
+{similar_farms}
+
 YOUR TASK:
 - Answer the user's question using the above context.
 - If the question is about cultivation, pests, fertilizer, irrigation, yield, or risks → answer it.
+- If the user asks about alternatives, use the runner-up crops above instead of guessing.
+- If the user asks which known conditions resemble theirs, use the similar known conditions above.
 - If the question is unrelated to agriculture → politely refuse.
 - Do NOT repeat full explanations unless the user asks for them.
 
@@ -108,39 +135,3 @@ RULES:
 - Stay within the crop context.
 """
         return prompt
-
-    def generate_response(self, user_message, context_data, history=[]):
-        """
-        Generates a response from Gemini based on user message, context, and history.
-        Retries with different keys on failure.
-        """
-        system_instruction = self.construct_system_prompt(context_data)
-            
-        full_prompt = f"{system_instruction}\n\n"
-        for msg in history:
-            role = "User" if msg.get('role') == 'user' else "Assistant"
-            content = msg.get('content', '')
-            full_prompt += f"{role}: {content}\n"
-        
-        full_prompt += f"User: {user_message}\nAssistant:"
-
-        # Try up to the number of keys available (one full rotation)
-        attempts = len(self.api_keys)
-        last_error = None
-
-        for _ in range(attempts):
-            try:
-                if not self.model:
-                     self._configure_current_key()
-                
-                response = self.model.generate_content(full_prompt)
-                return response.text
-            except Exception as e:
-                logger.error(f"API Error with Key Index {self.current_key_index}: {e}")
-                last_error = e
-                # Rotate and retry
-                self._rotate_key()
-
-        # If all keys failed
-        logger.error("All API keys exhausted.")
-        return f"I am having trouble connecting to the knowledge base. All keys exhausted. Error: {str(last_error)}"
@@ -0,0 +1,110 @@
+import time
+import numpy as np
+
+
+# Features a farmer can change (fertilizer, lime/sulphur) and their search
+# bounds, resolution and column in the model's feature order. Climate stays fixed.
+CONTROLLABLE = {
+    "N": {"column": 0, "bounds": (0.0, 140.0), "step": 1.0},
+    "P": {"column": 1, "bounds": (5.0, 145.0), "step": 1.0},
+    "K": {"column": 2, "bounds": (5.0, 205.0), "step": 1.0},
+    "ph": {"column": 5, "bounds": (3.5, 9.9), "step": 0.05},
+}
+# Candidates per feature in the coarse grid and in every refinement round
+COARSE_POINTS = 9
+FINE_POINTS = 7
+REFINE_ROUNDS = 4
+# Points on the segment from the input to the best candidate, to pull it closer
+LINE_POINTS = 64
+
+
+def _snap(values):
+    """Rounds candidate values to each feature's resolution and clips them to its bounds."""
+    for spec in CONTROLLABLE.values():
+        col = spec["column"]
+        low, high = spec["bounds"]
+        values[:, col] = np.clip(np.round(values[:, col] / spec["step"]) * spec["step"], low, high)
+    return values
+
+
+def _grid(center, half_widths, points):
+    """Cartesian grid of the controllable features around `center` (one row per candidate)."""
+    axes = []
+    for name, spec in CONTROLLABLE.items():
+        col = spec["column"]
+        low, high = spec["bounds"]
+        axes.append(np.linspace(max(low, center[col] - half_widths[name]),
+                                min(high, center[col] + half_widths[name]), points))
+    mesh = np.meshgrid(*axes, indexing="ij")
+    candidates = np.tile(center, (mesh[0].size, 1))
+    for spec, values in zip(CONTROLLABLE.values(), mesh):
+        candidates[:, spec["column"]] = values.ravel()
+    return _snap(candidates)
+
+
+def search_amendments(predict_proba, row, target_column, scale):
+    """
+    Smallest change to N, P, K and pH (Euclidean distance in standardized
+    units, `scale` = per-feature scaler.scale_) that makes `target_column`
+    the model's top class, with temperature, humidity and rainfall fixed.
+
+    Coarse-to-fine: one grid over the full bounds, then shrinking grids around
+    the best candidate, each scored in a single predict_proba call. Returns a
+    dict with the best candidate row, whether the target ranks first there,
+    its probability and the number of candidates scored.
+    """
+    start = time.perf_counter()
+    row = np.asarray(row, dtype=np.float64)
+    scale = np.asarray(scale, dtype=np.float64)
+    scored = 0
+
+    def evaluate(candidates):
+        nonlocal scored
+        scored += len(candidates)
+        probs = predict_proba(candidates)
+        target = probs[:, target_column]
+        others = np.delete(probs, target_column, axis=1).max(axis=1)
+        cost = np.sqrt((((candidates - row) / scale) ** 2).sum(axis=1))
+        return target > others, target - others, cost
+
+    def pick(candidates, feasible, margin, cost):
+        # Cheapest feasible candidate, otherwise the one closest to becoming feasible
+        if feasible.any():
+            i = np.flatnonzero(feasible)[np.argmin(cost[feasible])]
+        else:
+            i = int(np.argmax(margin))
+        return candidates[i], bool(feasible[i]), float(margin[i]), float(cost[i])
+
+    current = _snap(row[None].copy())
+    feasible, margin, cost = evaluate(current)
+    best = pick(current, feasible, margin, cost)
+    if not best[1]:
+        full = {name: (spec["bounds"][1] - spec["bounds"][0]) / 2 for name, spec in CONTROLLABLE.items()}
+        centre = row.copy()
+        for spec in CONTROLLABLE.values():
+            centre[spec["column"]] = sum(spec["bounds"]) / 2
+        candidates = np.vstack([current, _grid(centre, full, COARSE_POINTS)])
+        best = pick(candidates, *evaluate(candidates))
+
+        half_widths = {name: width / (COARSE_POINTS - 1) * 2 for name, width in full.items()}
+        for _ in range(REFINE_ROUNDS):
+            # Pull towards the input along the segment, then search around the result
+            t = np.linspace(0.0, 1.0, LINE_POINTS)[:, None]
+            line = _snap(row + t * (best[0] - row))
+            local = _grid(best[0], half_widths, FINE_POINTS)
+            candidates = np.vstack([best[0][None], line, local])
+            feasible, margin, cost = evaluate(candidates)
+            candidate = pick(candidates, feasible, margin, cost)
+            if candidate[1] or not best[1]:
+                best = candidate
+            half_widths = {name: width / 2 for name, width in half_widths.items()}
+
+    suggestion, achieved, _, cost = best
+    return {
+        "suggestion": suggestion,
+        "achieved": achieved,
+        "probability": float(predict_proba(suggestion[None])[0, target_column]),
+        "distance": round(cost, 4),
+        "candidates_scored": scored,
+        "search_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
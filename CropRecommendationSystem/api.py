@@ -1,13 +1,26 @@
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, JSONResponse
-from pydantic import BaseModel
-import joblib
-import numpy as np
+from pydantic import BaseModel, ValidationError
+import os
+import sys
+import asyncio
+import csv
+import io
+import json
 import logging
+import threading
 import uvicorn
 from agri_agent import AgriAgent
+from crop_model import FEATURE_COLS, load_crop_model, artifact_paths, warmup
+from shadow_scoring import ShadowScorer, SAMPLE_RATE
+
+# Shared helpers live in the repo-root `common` package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.hot_reload import ModelSlot, artifacts_fingerprint
+from common.sse import sse_chat_response
+from common.admin import check_admin, llm_admin_router
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -23,19 +36,44 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load the model, scaler, and label encoder
-try:
-    model = joblib.load('model.pkl')
-    scaler = joblib.load('scaler.pkl')
-    le = joblib.load('label_encoder.pkl')
-    MODELS_LOADED = True
-except FileNotFoundError as e:
-    logger.error(f"Error loading model files: {e}")
-    MODELS_LOADED = False
-    model = scaler = le = None
+# Load the crop model (versioned bundle, or the legacy pickles). New artifacts
+# are picked up through POST /admin/reload or the file watcher without a restart.
+crop_models = ModelSlot(
+    "crop-model",
+    loader=load_crop_model,
+    warmup=warmup,
+    fingerprint=lambda: artifacts_fingerprint(artifact_paths()),
+)
+if not crop_models.load():
+    logger.error("Error loading model files, /predict disabled until a reload succeeds.")
+crop_models.watch(float(os.getenv("MODEL_WATCH_INTERVAL", "0")))
+
+
+# Optional candidate model scored in the background on a share of /predict
+# traffic (see shadow_scoring.py); also started and stopped via /admin/shadow
+shadow = None
+_shadow_lock = threading.Lock()
+# /admin/shadow only loads candidate bundles from below this directory
+CANDIDATE_ROOT = os.path.realpath(os.getenv(
+    "CROP_CANDIDATE_ROOT", os.path.join(os.path.dirname(os.path.abspath(__file__)), "candidates")))
+if os.getenv("CROP_CANDIDATE_BUNDLE_PATH"):
+    shadow = ShadowScorer(os.getenv("CROP_CANDIDATE_BUNDLE_PATH"))
 
 # Initialize the Agent
 agent = AgriAgent()
+app.include_router(llm_admin_router(agent))
+
+# Maximum number of records accepted by /predict_batch in a single request
+MAX_BATCH_SIZE = int(os.getenv("CROP_BATCH_MAX_ROWS", "1000"))
+# Request bodies larger than this are refused before they are read in full or parsed
+MAX_BATCH_BYTES = int(os.getenv("CROP_BATCH_MAX_BYTES", str(MAX_BATCH_SIZE * 512)))
+
+# Number of ranked crops returned per prediction unless the caller asks otherwise
+DEFAULT_TOP_K = 3
+
+# Upper bound on k for /similar_farms, and the neighbours given to the chat agent
+MAX_NEIGHBORS = 50
+CHAT_NEIGHBORS = 5
 
 # Pydantic Models for Input Validation
 class CropInput(BaseModel):
@@ -47,6 +85,9 @@ class CropInput(BaseModel):
     ph: float
     rainfall: float
 
+class AmendmentInput(CropInput):
+    target_crop: str
+
 class ChatInput(BaseModel):
     message: str
     context: dict = {}
@@ -74,44 +115,315 @@ async def home():
     </html>
     """
 
-@app.post("/predict")
-async def predict(data: CropInput):
-    if not MODELS_LOADED:
+def _current_model():
+    """The model serving this request; read once so a concurrent reload cannot change it mid-request."""
+    crop_model = crop_models.current
+    if crop_model is None:
         raise HTTPException(status_code=500, detail="Model files not loaded. Check server logs.")
+    return crop_model
+
+def _format_prediction(ranked):
+    """Builds the public response for one row from its ranked crop list."""
+    return {
+        'recommended_crop': ranked[0]['crop'],
+        'confidence': f"{ranked[0]['probability'] * 100:.2f}%",
+        'top_k': ranked
+    }
+
+@app.post("/predict")
+async def predict(data: CropInput, top_k: int = Query(DEFAULT_TOP_K, ge=1)):
+    crop_model = _current_model()
 
     try:
         # Extract features from the pydantic model
-        features = [
-            data.N,
-            data.P,
-            data.K,
-            data.temperature,
-            data.humidity,
-            data.ph,
-            data.rainfall
-        ]
-        
-        # Prepare input for the model
-        input_data = np.array([features])
-        input_scaled = scaler.transform(input_data)
-        
-        # Make prediction
-        prediction_idx = model.predict(input_scaled)[0]
-        crop = le.inverse_transform([prediction_idx])[0]
-        
-        # Get prediction probabilities
-        probs = model.predict_proba(input_scaled)[0]
-        confidence = np.max(probs) * 100
-        
+        features = [[getattr(data, col) for col in FEATURE_COLS]]
+        crop_model.drift.update(features)
+
+        ranked = crop_model.rank_crops(features, top_k)[0]
+        if shadow is not None:
+            shadow.offer(features[0], crop_model)
+
         return {
-            'recommended_crop': crop,
-            'confidence': f'{confidence:.2f}%'
+            **_format_prediction(ranked),
+            'model_version': crop_model.version
         }
         
     except Exception as e:
         logger.error(f"Prediction Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _read_body(request: Request):
+    """The request body, refused with 413 as soon as it exceeds MAX_BATCH_BYTES."""
+    too_large = HTTPException(status_code=413, detail=f"Request body exceeds {MAX_BATCH_BYTES} bytes.")
+    try:
+        if int(request.headers.get('content-length', 0)) > MAX_BATCH_BYTES:
+            raise too_large
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length header.")
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > MAX_BATCH_BYTES:
+            raise too_large
+    return bytes(body)
+
+def _parse_batch_records(body: bytes, content_type: str):
+    """Parses a JSON array or CSV (with header row) request body into a list of dicts."""
+    if 'csv' in content_type:
+        try:
+            reader = csv.DictReader(io.StringIO(body.decode('utf-8-sig')), strict=True)
+            records = []
+            for row in reader:
+                # Stop reading as soon as the batch is over the limit
+                _check_batch_size(len(records) + 1)
+                records.append({k.strip(): v for k, v in row.items() if k})
+            return records
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid CSV body: {e}")
+
+    try:
+        records = json.loads(body)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of crop records.")
+    _check_batch_size(len(records))
+    return records
+
+def _check_batch_size(n_records):
+    if n_records > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {n_records} records exceeds the limit of {MAX_BATCH_SIZE}."
+        )
+
+def _validate_records(records):
+    """
+    Validates each record against CropInput.
+    Returns (results with an error entry for every invalid record, valid feature rows, their positions).
+    """
+    results = [None] * len(records)
+    valid_rows = []
+    valid_positions = []
+    for i, record in enumerate(records):
+        if not isinstance(record, dict):
+            results[i] = {'index': i, 'error': 'Record must be an object.'}
+            continue
+        try:
+            item = CropInput(**record)
+        except ValidationError as e:
+            results[i] = {
+                'index': i,
+                'error': '; '.join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            }
+            continue
+        valid_rows.append([getattr(item, col) for col in FEATURE_COLS])
+        valid_positions.append(i)
+    return results, valid_rows, valid_positions
+
+# Parsing, validation and scoring of a batch are CPU work, so they run in a
+# worker thread; only reading the body happens on the event loop.
+@app.post("/predict_batch")
+async def predict_batch(request: Request, top_k: int = Query(DEFAULT_TOP_K, ge=1)):
+    """
+    Batch crop recommendation.
+    Input: JSON array of CropInput objects, or text/csv with a header row of feature names.
+    Rows that fail validation are reported individually and do not fail the batch.
+    """
+    crop_model = _current_model()
+    body = await _read_body(request)
+    return await asyncio.to_thread(_predict_batch, crop_model, body, request.headers.get('content-type', ''), top_k)
+
+def _predict_batch(crop_model, body, content_type, top_k):
+    records = _parse_batch_records(body, content_type)
+    results, valid_rows, valid_positions = _validate_records(records)
+
+    try:
+        if valid_rows:
+            crop_model.drift.update(valid_rows)
+            rankings = crop_model.rank_crops(valid_rows, top_k)
+            for pos, ranked in zip(valid_positions, rankings):
+                results[pos] = {'index': pos, **_format_prediction(ranked)}
+    except Exception as e:
+        logger.error(f"Batch Prediction Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        'count': len(records),
+        'succeeded': len(valid_rows),
+        'failed': len(records) - len(valid_rows),
+        'results': results,
+        'model_version': crop_model.version
+    }
+
+@app.post("/explain")
+async def explain(request: Request, crop: str = Query(None)):
+    """
+    Per-feature contributions behind a recommendation.
+    Input: one CropInput object, or a JSON array of them (same limits as /predict_batch).
+    For every row, base_value + sum(contributions) equals the probability of the
+    recommended crop, or of `crop` when given.
+    """
+    crop_model = _current_model()
+    body = await _read_body(request)
+    return await asyncio.to_thread(_explain, crop_model, body, crop)
+
+def _explain(crop_model, body, crop):
+    try:
+        body = json.loads(body)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+    single = isinstance(body, dict)
+    records = [body] if single else body
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="Expected a crop record or a JSON array of them.")
+    _check_batch_size(len(records))
+    results, valid_rows, valid_positions = _validate_records(records)
+    if single and not valid_rows:
+        raise HTTPException(status_code=422, detail=results[0]['error'])
+
+    try:
+        if valid_rows:
+            explanations = crop_model.explain(valid_rows, crop=crop)
+            for pos, explanation in zip(valid_positions, explanations):
+                results[pos] = {'index': pos, **explanation}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except TypeError as e:
+        raise HTTPException(status_code=501, detail=f"Explanations are not available for this model: {e}")
+    except Exception as e:
+        logger.error(f"Explain Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if single:
+        del results[0]['index']
+        return {**results[0], 'model_version': crop_model.version}
+    return {
+        'count': len(records),
+        'succeeded': len(valid_rows),
+        'failed': len(records) - len(valid_rows),
+        'results': results,
+        'model_version': crop_model.version
+    }
+
+# Plain def: the first call builds the neighbour index, which must not block the event loop
+@app.post("/similar_farms")
+def similar_farms(data: CropInput, k: int = Query(5, ge=1, le=MAX_NEIGHBORS)):
+    """The k labelled records closest to the input conditions, with their crops."""
+    crop_model = _current_model()
+    try:
+        neighbors = crop_model.similar_farms([[getattr(data, col) for col in FEATURE_COLS]], k)[0]
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {'neighbors': neighbors, 'model_version': crop_model.version}
+
+# Plain def: the search scores thousands of candidates (~100 ms), so it runs in the threadpool
+@app.post("/amendments")
+def amendments(data: AmendmentInput):
+    """
+    Soil changes (N, P, K, pH; climate fixed) that would make the model
+    recommend `target_crop`. `achievable` is false when no amendment within the
+    searched ranges does; the closest candidate is returned then.
+    """
+    crop_model = _current_model()
+    try:
+        result = crop_model.amendments([getattr(data, col) for col in FEATURE_COLS], data.target_crop)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Amendment Search Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {**result, 'model_version': crop_model.version}
+
+def _context_neighbors(context):
+    """Nearest labelled records for the chat context's features, or None if they are incomplete."""
+    crop_model = crop_models.current
+    if crop_model is None or crop_model.neighbors is None:
+        return None
+    try:
+        row = [float(context[col]) for col in FEATURE_COLS]
+    except (KeyError, TypeError, ValueError):
+        return None
+    return crop_model.similar_farms([row], CHAT_NEIGHBORS)[0]
+
+# Plain def: wait=true joins the loader thread, which must not block the event loop
+@app.post("/admin/reload")
+def reload_model(wait: bool = False, x_admin_token: str = Header(None)):
+    """
+    Loads the current artifacts in the background, warms them up and swaps them
+    in atomically. Requests keep being served by the old model meanwhile.
+    """
+    check_admin(x_admin_token)
+    started = crop_models.reload(wait=wait)
+    return {'started': started, **crop_models.status}
+
+@app.get("/admin/model")
+async def model_status(x_admin_token: str = Header(None)):
+    check_admin(x_admin_token)
+    return crop_models.status
+
+def _candidate_path(path):
+    """`path` resolved inside CANDIDATE_ROOT; anything outside it (or a symlink out) is refused."""
+    resolved = os.path.realpath(os.path.join(CANDIDATE_ROOT, path))
+    if os.path.commonpath([resolved, CANDIDATE_ROOT]) != CANDIDATE_ROOT or resolved == CANDIDATE_ROOT:
+        raise HTTPException(status_code=400, detail="Candidate bundles must be inside CROP_CANDIDATE_ROOT.")
+    if not os.path.isdir(resolved):
+        raise HTTPException(status_code=404, detail=f"No candidate bundle at {path}.")
+    return resolved
+
+# Plain def: stopping the previous worker can take seconds, so these run in the threadpool
+@app.post("/admin/shadow")
+def start_shadow(path: str, sample_rate: float = Query(SAMPLE_RATE, gt=0, le=1),
+                 x_admin_token: str = Header(None)):
+    """
+    Starts shadow scoring with the candidate bundle at `path` (relative to
+    CROP_CANDIDATE_ROOT), replacing any running candidate.
+    """
+    global shadow
+    check_admin(x_admin_token)
+    bundle_path = _candidate_path(path)
+    with _shadow_lock:
+        previous, shadow = shadow, ShadowScorer(bundle_path, sample_rate=sample_rate)
+        if previous is not None:
+            previous.stop()
+        return shadow.status()
+
+@app.get("/admin/shadow")
+async def shadow_status(x_admin_token: str = Header(None)):
+    """Agreement rate, probability deltas and latency histograms of the candidate vs the primary model."""
+    check_admin(x_admin_token)
+    if shadow is None:
+        raise HTTPException(status_code=404, detail="No candidate model is being shadowed.")
+    return {**shadow.status(), 'primary_version': crop_models.version}
+
+@app.delete("/admin/shadow")
+def stop_shadow(x_admin_token: str = Header(None)):
+    global shadow
+    check_admin(x_admin_token)
+    with _shadow_lock:
+        if shadow is None:
+            raise HTTPException(status_code=404, detail="No candidate model is being shadowed.")
+        previous, shadow = shadow, None
+        previous.stop()
+        return previous.status()
+
+@app.get("/admin/drift")
+async def drift_report(x_admin_token: str = Header(None)):
+    """
+    Statistics of the features received by /predict and /predict_batch since
+    the serving model was loaded, with PSI against its training data per feature.
+    """
+    check_admin(x_admin_token)
+    crop_model = _current_model()
+    return {**crop_model.drift.report(), 'model_version': crop_model.version}
+
+def _chat_context(data):
+    context = dict(data.context)
+    if 'similar_farms' not in context:
+        # Ground answers about comparable conditions in real labelled records
+        context['similar_farms'] = _context_neighbors(context)
+    return context
+
 @app.post("/chat")
 async def chat(data: ChatInput):
     """
@@ -121,11 +433,24 @@ async def chat(data: ChatInput):
         raise HTTPException(status_code=400, detail="Message cannot be empty")
         
     try:
-        reply = agent.generate_response(data.message, data.context, data.history)
+        # In a thread: the first lookup builds the neighbour index
+        context = await asyncio.to_thread(_chat_context, data)
+        reply = await agent.generate_response(data.message, context, data.history)
         return {'reply': reply}
     except Exception as e:
         logger.error(f"Chat Endpoint Error: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+@app.post("/chat/stream")
+async def chat_stream(data: ChatInput):
+    """
+    /chat as Server-Sent Events: `data: {"delta": ...}` per piece of the reply
+    as Gemini produces it, then `event: done` with the full reply.
+    """
+    if not data.message:
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    context = await asyncio.to_thread(_chat_context, data)
+    return sse_chat_response(agent.stream_response(data.message, context, data.history))
+
 if __name__ == '__main__':
     uvicorn.run(app, host="0.0.0.0", port=5000)
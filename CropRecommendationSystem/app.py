@@ -1,13 +1,84 @@
+import os
+import sys
 import streamlit as st
 import joblib
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.colors import ListedColormap
 
-# Load the model, scaler, and label encoder
-model = joblib.load('model.pkl')
-scaler = joblib.load('scaler.pkl')
-le = joblib.load('label_encoder.pkl')
+# Shared helpers live in the repo-root `common` package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.model_bundle import bundle_exists, bundle_markers, load_bundle
+from common.hot_reload import artifacts_fingerprint
+from tree_engine import compile_model
+
+FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+def current_fingerprint():
+    # Changes when a new bundle version goes live or the legacy pickles are rewritten
+    return artifacts_fingerprint(bundle_markers('crop_bundle') + ['model.pkl'])
+
+@st.cache_resource(max_entries=2)
+def load_artifacts(fingerprint):
+    # Load the model, scaler, and labels (versioned bundle, or the legacy pickles).
+    # Cached per artifact fingerprint instead of on every widget change, so a
+    # retrained model is picked up on the next rerun.
+    if bundle_exists('crop_bundle'):
+        bundle = load_bundle('crop_bundle')
+        return bundle.get('model'), bundle.get('scaler'), np.asarray(bundle.labels), bundle.version
+    model = joblib.load('model.pkl')
+    scaler = joblib.load('scaler.pkl')
+    labels = joblib.load('label_encoder.pkl').classes_
+    return model, scaler, labels, f"legacy-{int(os.path.getmtime('model.pkl'))}"
+
+@st.cache_resource
+def load_explainer(model_version):
+    # Compiled forest with its attribution tables, built once per model version.
+    # None for models without per-tree class probabilities (e.g. XGBoost).
+    model, scaler, _, _ = load_artifacts(artifacts_key)
+    try:
+        forest = compile_model(model, scaler)
+    except TypeError:
+        return None
+    if forest.kind != 'mean':
+        return None
+    forest.attribution_tables()
+    return forest
+
+@st.cache_data
+def feature_ranges():
+    # Observed min/max of every feature, used to size the what-if ranges
+    df = pd.read_csv('Crop_recommendation.csv', usecols=FEATURES)
+    return df.min().to_dict(), df.max().to_dict()
+
+@st.cache_data
+def score_grid(model_version, base_row, x_feature, x_values, y_feature=None, y_values=(None,)):
+    """
+    Scores every (x, y) combination around base_row in one predict_proba call.
+    Returns (winning label index, winning probability), both shaped (len(y_values), len(x_values)).
+    model_version is only part of the cache key, so a new model invalidates old grids.
+    """
+    model, scaler, _, _ = load_artifacts(artifacts_key)
+    xx, yy = np.meshgrid(x_values, y_values)
+    grid = pd.DataFrame(np.tile(base_row, (xx.size, 1)), columns=FEATURES)
+    grid[x_feature] = xx.ravel()
+    if y_feature is not None:
+        grid[y_feature] = yy.ravel()
+    probs = model.predict_proba(scaler.transform(grid))
+    best = probs.argmax(axis=1)
+    winners = model.classes_[best].reshape(xx.shape)
+    return winners, probs[np.arange(len(best)), best].reshape(xx.shape)
+
+def what_if_values(feature, center, spread, steps):
+    low, high = feature_ranges()
+    half_width = spread * (high[feature] - low[feature]) / 2
+    start = max(0.0, center - half_width)
+    return tuple(np.linspace(start, start + 2 * half_width, steps).round(3))
+
+# Read once per rerun, so the helpers above load the same model as model_version
+artifacts_key = current_fingerprint()
+model, scaler, labels, model_version = load_artifacts(artifacts_key)
 
 # Streamlit interface
 st.title('Crop Recommendation System')
@@ -23,12 +94,12 @@ rainfall = st.number_input('Rainfall (mm)', min_value=0.0)
 
 if st.button('Predict'):
     # Prepare input
-    input_data = np.array([[N, P, K, temperature, humidity, ph, rainfall]])
+    input_data = pd.DataFrame([[N, P, K, temperature, humidity, ph, rainfall]], columns=FEATURES)
     input_scaled = scaler.transform(input_data)
     
     # Predict
     prediction = model.predict(input_scaled)[0]
-    crop = le.inverse_transform([prediction])[0]
+    crop = labels[prediction]
     
     # Probability/Confidence
     probs = model.predict_proba(input_scaled)[0]
@@ -37,19 +108,73 @@ if st.button('Predict'):
     st.success(f'Recommended Crop: {crop}')
     st.info(f'Confidence Level: {confidence:.2f}%')
     
-    # Simple explanation using feature importance
-    importances = model.feature_importances_
-    features = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
-    importance_dict = dict(zip(features, importances))
-    top_features = sorted(importance_dict.items(), key=lambda x: x[1], reverse=True)[:3]
-    
-    explanation = f'This crop fits best because of high importance on: '
-    explanation += ', '.join([f'{feat} ({imp:.2f})' for feat, imp in top_features])
-    st.info(explanation)
-    
-    # Visualization: Feature Importance Bar Graph
-    st.subheader('Feature Importance')
-    fig, ax = plt.subplots()
-    pd.Series(importance_dict).plot(kind='bar', ax=ax)
-    ax.set_ylabel('Importance')
-    st.pyplot(fig)
\ No newline at end of file
+    explainer = load_explainer(model_version)
+    if explainer is not None:
+        # Per-instance explanation: how each input moved this crop's probability
+        # away from its average over the training data
+        column = np.flatnonzero(model.classes_ == prediction)
+        bias, contrib = explainer.contributions(input_data.to_numpy(np.float64), column)
+        contributions = pd.Series(contrib[0], index=FEATURES).sort_values(key=np.abs, ascending=False)
+        top_features = [f for f in contributions.index[:3] if contributions[f] > 0]
+        if top_features:
+            st.info('This crop fits best mainly because of: ' + ', '.join(
+                f'{feat} ({contributions[feat] * 100:+.1f} pts)' for feat in top_features))
+
+        st.subheader('Why this crop')
+        fig, ax = plt.subplots()
+        contributions[::-1].plot(kind='barh', ax=ax, color=np.where(contributions[::-1] > 0, 'tab:green', 'tab:red'))
+        ax.axvline(0, color='k', linewidth=0.8)
+        ax.set_xlabel(f'Contribution to P({crop})')
+        st.pyplot(fig)
+        st.caption(f'Average P({crop}) {bias[0] * 100:.1f}% + contributions = {confidence:.1f}%.')
+    else:
+        # Simple explanation using feature importance
+        importances = model.feature_importances_
+        importance_dict = dict(zip(FEATURES, importances))
+        top_features = sorted(importance_dict.items(), key=lambda x: x[1], reverse=True)[:3]
+
+        explanation = f'This crop fits best because of high importance on: '
+        explanation += ', '.join([f'{feat} ({imp:.2f})' for feat, imp in top_features])
+        st.info(explanation)
+
+        # Visualization: Feature Importance Bar Graph
+        st.subheader('Feature Importance')
+        fig, ax = plt.subplots()
+        pd.Series(importance_dict).plot(kind='bar', ax=ax)
+        ax.set_ylabel('Importance')
+        st.pyplot(fig)
+
+# What-if explorer: how the recommendation changes when one or two inputs move
+st.subheader('What-if Explorer')
+base_row = (N, P, K, temperature, humidity, ph, rainfall)
+col1, col2 = st.columns(2)
+x_feature = col1.selectbox('Vary', FEATURES, index=FEATURES.index('N'))
+y_options = ['None'] + [f for f in FEATURES if f != x_feature]
+y_choice = col2.selectbox('And (optional)', y_options, index=y_options.index('rainfall') if 'rainfall' in y_options else 0)
+spread = st.slider('Range (share of the observed feature range)', 0.1, 1.0, 0.4, 0.05)
+steps = st.slider('Grid resolution', 10, 80, 40, 5)
+
+x_values = what_if_values(x_feature, base_row[FEATURES.index(x_feature)], spread, steps)
+y_feature = None if y_choice == 'None' else y_choice
+y_values = (None,) if y_feature is None else what_if_values(y_feature, base_row[FEATURES.index(y_feature)], spread, steps)
+winners, confidence = score_grid(model_version, base_row, x_feature, x_values, y_feature, y_values)
+
+# One colour per crop that wins somewhere on the grid
+present = np.unique(winners)
+cmap = ListedColormap(plt.get_cmap('tab20', max(len(present), 2))(np.arange(len(present))))
+codes = np.searchsorted(present, winners)
+fig, ax = plt.subplots(figsize=(8, 5 if y_feature else 1.8))
+extent = [x_values[0], x_values[-1]] + ([y_values[0], y_values[-1]] if y_feature else [0, 1])
+ax.imshow(codes, origin='lower', aspect='auto', cmap=cmap, extent=extent, vmin=-0.5, vmax=len(present) - 0.5)
+if y_feature:
+    ax.plot(base_row[FEATURES.index(x_feature)], base_row[FEATURES.index(y_feature)], 'k*', markersize=14)
+    ax.set_ylabel(y_feature)
+else:
+    ax.axvline(base_row[FEATURES.index(x_feature)], color='k', linestyle='--')
+    ax.set_yticks([])
+ax.set_xlabel(x_feature)
+handles = [plt.Rectangle((0, 0), 1, 1, color=cmap(i)) for i in range(len(present))]
+ax.legend(handles, [labels[c] for c in present], loc='center left', bbox_to_anchor=(1.01, 0.5), fontsize=8)
+ax.set_title('Recommended crop across the grid (marker = your input)')
+st.pyplot(fig)
+st.caption(f'{winners.size} combinations scored in one call; mean winning confidence {confidence.mean() * 100:.1f}%.')
@@ -0,0 +1,83 @@
+"""
+Cold start, single-row latency and batch throughput of the crop inference backends.
+
+Each backend runs in a fresh interpreter (CROP_INFERENCE_BACKEND=<backend>),
+so cold start covers importing the serving stack, loading the artifacts and
+the first prediction. Export the ONNX graph first with `crop_pipeline.py --onnx`.
+
+    python bench_backends.py --backends sklearn compiled onnx
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _worker(backend, batch_rows):
+    start = time.perf_counter()
+    import numpy as np
+    import pandas as pd
+    import crop_model
+
+    model = crop_model.load_crop_model()
+    rows = pd.read_csv(os.path.join(BASE_DIR, "Crop_recommendation.csv"))[crop_model.FEATURE_COLS].to_numpy(np.float64)
+    model.predict_proba_raw(rows[:1])
+    cold_start_ms = (time.perf_counter() - start) * 1000
+
+    singles = []
+    for i in range(500):
+        t = time.perf_counter()
+        model.predict_proba_raw(rows[i % len(rows):i % len(rows) + 1])
+        singles.append(time.perf_counter() - t)
+    batch = np.tile(rows, (batch_rows // len(rows) + 1, 1))[:batch_rows]
+    t = time.perf_counter()
+    model.predict_proba_raw(batch)
+    batch_seconds = time.perf_counter() - t
+
+    served = "onnx" if model.onnx is not None else "compiled" if model.compiled is not None else "sklearn"
+    p50, p99 = np.percentile(np.array(singles) * 1000, [50, 99])
+    print(json.dumps({
+        "backend": backend,
+        "served_by": served,
+        "cold_start_ms": round(cold_start_ms, 1),
+        "single_p50_ms": round(float(p50), 4),
+        "single_p99_ms": round(float(p99), 4),
+        f"batch{batch_rows}_rows_per_s": round(batch_rows / batch_seconds),
+    }))
+
+
+def run_backend(backend, batch_rows):
+    env = dict(os.environ, CROP_INFERENCE_BACKEND=backend, CROP_USE_PREDICTION_GRID="0",
+               CROP_COMPILED_MAX_ROWS=str(10 ** 9))
+    start = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", backend, "--batch-rows", str(batch_rows)],
+        env=env, cwd=BASE_DIR, capture_output=True, text=True, check=True,
+    )
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process_wall_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=["sklearn", "compiled", "onnx"])
+    parser.add_argument("--batch-rows", type=int, default=10000)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args.worker, args.batch_rows)
+        return
+
+    import pandas as pd
+    results = [run_backend(backend, args.batch_rows) for backend in args.backends]
+    print(pd.DataFrame(results).set_index("backend").to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Load test of concurrent /chat requests against a fake LLM.
+
+The fake model blocks its calling thread for --latency seconds, like the
+Gemini SDK does, and records how many calls overlap. Each mode fires
+--requests /chat calls at once through the ASGI app, plus a /predict call
+halfway in, and reports wall time, peak overlap and the /predict latency:
+
+  inline   the model is called directly inside the handler (the old behaviour)
+  shared   common.llm_client.LLMClient with --limit worker threads
+
+    python bench_chat_concurrency.py --requests 16 --latency 0.5 --limit 1 8
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+
+import httpx
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, ".."))
+from common.llm_client import LLMClient
+
+CHAT_PAYLOAD = {
+    "message": "How much fertilizer does rice need?",
+    "context": {"recommended_crop": "rice", "confidence": "95%", "N": 90, "P": 42, "K": 43,
+                "temperature": 20.8, "humidity": 82.0, "ph": 6.5, "rainfall": 202.9},
+    "history": [],
+}
+PREDICT_PAYLOAD = {"N": 90, "P": 42, "K": 43, "temperature": 20.8, "humidity": 82.0, "ph": 6.5, "rainfall": 202.9}
+
+
+class FakeModel:
+    """Blocking stand-in for a Gemini model that tracks concurrent calls."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.latency)
+        with self._lock:
+            self.in_flight -= 1
+        return type("Response", (), {"text": f"Fake answer to a {len(prompt)}-character prompt."})()
+
+
+class InlineClient(LLMClient):
+    """The model called on the event loop thread, as the agents did before the shared client."""
+
+    async def generate(self, prompt, attempts=None):
+        return self._generate_blocking(prompt, attempts or len(self.api_keys))
+
+
+async def _burst(app, n_requests, latency):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+
+        # Both timed from when they were due, so time spent waiting for a blocked loop counts
+        async def chat():
+            response = await client.post("/chat", json=CHAT_PAYLOAD)
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        async def predict():
+            await asyncio.sleep(latency / 2)
+            due = start + latency / 2
+            (await client.post("/predict", json=PREDICT_PAYLOAD)).raise_for_status()
+            return time.perf_counter() - due
+
+        *chat_seconds, predict_seconds = await asyncio.gather(*[chat() for _ in range(n_requests)], predict())
+        return time.perf_counter() - start, chat_seconds, predict_seconds
+
+
+def run_mode(api, mode, limit, n_requests, latency):
+    fake = FakeModel(latency)
+    client_class = InlineClient if mode == "inline" else LLMClient
+    # Unlimited key budget: only the concurrency limit should shape the result
+    api.agent.llm = client_class(api_keys=["fake-key"], max_concurrency=limit,
+                                 client_factory=lambda *args: fake, rpm=1e9, burst=10 ** 6)
+    wall, chat_seconds, predict_seconds = asyncio.run(_burst(api.app, n_requests, latency))
+    return {
+        "mode": mode,
+        "limit": limit if mode == "shared" else None,
+        "requests": n_requests,
+        "llm_latency_s": latency,
+        "wall_s": round(wall, 2),
+        "peak_overlap": fake.peak,
+        "chat_mean_s": round(sum(chat_seconds) / len(chat_seconds), 2),
+        "chat_max_s": round(max(chat_seconds), 2),
+        "predict_during_burst_ms": round(predict_seconds * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per fake LLM call")
+    parser.add_argument("--limit", type=int, nargs="+", default=[1, 8], help="Concurrency limits to try")
+    args = parser.parse_args()
+
+    import api
+
+    print(json.dumps(run_mode(api, "inline", 1, args.requests, args.latency)))
+    for limit in args.limit:
+        print(json.dumps(run_mode(api, "shared", limit, args.requests, args.latency)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Prompt size and latency over a scripted 50-turn conversation, with the full
+history in every prompt versus the token-budgeted history (common/chat_history.py).
+
+The fake LLM takes --base-ms plus --ms-per-1k-tokens for every 1000 prompt
+tokens (prefill grows with the prompt) and answers with ~70 words, or ~100
+for a summary request. Turn latency includes any summary call made on that
+turn. The response cache is off so every turn reaches the fake model.
+
+    python bench_chat_history.py --turns 50 --budget 1500
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, ".."))
+from common.llm_client import LLMClient
+from common.chat_history import HistoryManager, estimate_tokens
+
+CONTEXT = {"recommended_crop": "rice", "confidence": "91.5%", "N": 90, "P": 42, "K": 43,
+           "temperature": 20.8, "humidity": 82.0, "ph": 6.5, "rainfall": 202.9}
+QUESTIONS = [
+    "How much urea should I apply per acre for rice?",
+    "When is the best time to transplant the seedlings?",
+    "My field is in Thanjavur, does that change the sowing window?",
+    "What spacing should I use between plants?",
+    "How often should I irrigate during tillering?",
+    "I see yellow leaves on some plants, what could it be?",
+    "Is neem oil enough against stem borer?",
+    "Should I split the potassium dose?",
+    "What if the monsoon is late by two weeks?",
+    "How do I know when the crop is ready to harvest?",
+    "Can I grow green gram after the rice harvest?",
+    "What yield can I expect with these soil values?",
+]
+ANSWER_WORDS = 70
+SUMMARY_WORDS = 100
+
+
+class FakeLLM:
+    def __init__(self, base_ms, ms_per_1k_tokens):
+        self.base_ms = base_ms
+        self.ms_per_1k_tokens = ms_per_1k_tokens
+        self.chat_prompt_tokens = []
+        self.summary_calls = 0
+
+    def generate_content(self, prompt, stream=False):
+        tokens = estimate_tokens(prompt)
+        time.sleep((self.base_ms + self.ms_per_1k_tokens * tokens / 1000) / 1000)
+        if prompt.startswith("You maintain a running summary"):
+            self.summary_calls += 1
+            words = SUMMARY_WORDS
+        else:
+            self.chat_prompt_tokens.append(tokens)
+            words = ANSWER_WORDS
+        return type("Response", (), {"text": " ".join(["advice"] * words)})()
+
+
+async def converse(agent, fake, turns):
+    history, rows = [], []
+    for turn in range(turns):
+        message = f"{QUESTIONS[turn % len(QUESTIONS)]} (turn {turn + 1})"
+        summaries_before = fake.summary_calls
+        start = time.perf_counter()
+        reply = await agent.generate_response(message, CONTEXT, history)
+        rows.append({
+            "turn": turn + 1,
+            "prompt_tokens": fake.chat_prompt_tokens[-1],
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+            "summarized": fake.summary_calls > summaries_before,
+        })
+        history += [{"role": "user", "content": message}, {"role": "assistant", "content": reply}]
+    return rows
+
+
+def run_mode(budget, args):
+    from agri_agent import AgriAgent
+
+    agent = AgriAgent()
+    fake = FakeLLM(args.base_ms, args.ms_per_1k_tokens)
+    agent.llm = LLMClient(api_keys=["fake-key"], client_factory=lambda *a: fake, rpm=1e9, burst=10 ** 6)
+    agent.history = HistoryManager(agent.llm, budget_tokens=budget)
+    rows = asyncio.run(converse(agent, fake, args.turns))
+    return rows, fake.summary_calls, agent.history.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--budget", type=int, default=1500, help="History token budget of the managed run")
+    parser.add_argument("--base-ms", type=float, default=40.0)
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=60.0)
+    parser.add_argument("--every", type=int, default=5, help="Print every n-th turn of the curves")
+    args = parser.parse_args()
+    os.environ["LLM_CACHE_AGRI"] = "0"
+
+    full, _, _ = run_mode(0, args)
+    managed, summary_calls, history_stats = run_mode(args.budget, args)
+
+    print(f"{'turn':>4} | {'full tokens':>11} {'full ms':>8} | {'budget tokens':>13} {'budget ms':>9}")
+    for a, b in zip(full, managed):
+        if a["turn"] == 1 or a["turn"] % args.every == 0:
+            note = "  (summary updated)" if b["summarized"] else ""
+            print(f"{a['turn']:>4} | {a['prompt_tokens']:>11} {a['latency_ms']:>8} | "
+                  f"{b['prompt_tokens']:>13} {b['latency_ms']:>9}{note}")
+    for name, rows in (("full_history", full), ("token_budget", managed)):
+        print(json.dumps({
+            "mode": name,
+            "turns": len(rows),
+            "final_prompt_tokens": rows[-1]["prompt_tokens"],
+            "max_prompt_tokens": max(r["prompt_tokens"] for r in rows),
+            "total_prompt_tokens": sum(r["prompt_tokens"] for r in rows),
+            "mean_latency_ms": round(sum(r["latency_ms"] for r in rows) / len(rows), 1),
+            "last10_mean_latency_ms": round(sum(r["latency_ms"] for r in rows[-10:]) / len(rows[-10:]), 1),
+            **({"summary_calls": summary_calls, **history_stats} if name == "token_budget" else {}),
+        }))
+
+
+if __name__ == "__main__":
+    main()
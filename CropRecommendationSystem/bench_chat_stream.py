@@ -0,0 +1,111 @@
+"""
+Time to first byte of /chat versus /chat/stream against a local fake LLM.
+
+The fake model produces --tokens pieces, the first after --first-token
+seconds and the rest every --interval seconds, either at once (plain call,
+like generate_content) or as they are produced (stream=True). The API runs
+in a real uvicorn server on a free local port, since in-process ASGI
+transports buffer the whole response. Each request sends a unique message so
+the response cache never answers.
+
+    python bench_chat_stream.py --requests 5 --first-token 0.4 --interval 0.05 --tokens 60
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import statistics
+
+import httpx
+import uvicorn
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, ".."))
+from common.llm_client import LLMClient
+
+CONTEXT = {"recommended_crop": "rice", "confidence": "95%", "N": 90, "P": 42, "K": 43,
+           "temperature": 20.8, "humidity": 82.0, "ph": 6.5, "rainfall": 202.9}
+
+
+class FakeStreamingModel:
+    def __init__(self, first_token_s, interval_s, tokens):
+        self.first_token_s = first_token_s
+        self.interval_s = interval_s
+        self.tokens = tokens
+
+    def _pieces(self):
+        time.sleep(self.first_token_s)
+        for i in range(self.tokens):
+            if i:
+                time.sleep(self.interval_s)
+            yield type("Chunk", (), {"text": f"word{i} "})()
+
+    def generate_content(self, prompt, stream=False):
+        pieces = self._pieces()
+        if stream:
+            return pieces
+        return type("Response", (), {"text": "".join(piece.text for piece in pieces)})()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(app):
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def measure(client, path, message):
+    """(seconds to the first body byte, seconds to the end of the body)."""
+    payload = {"message": message, "context": CONTEXT, "history": []}
+    start = time.perf_counter()
+    first = None
+    with client.stream("POST", path, json=payload) as response:
+        response.raise_for_status()
+        for _ in response.iter_raw():
+            if first is None:
+                first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--first-token", type=float, default=0.4, help="Seconds before the fake model's first piece")
+    parser.add_argument("--interval", type=float, default=0.05, help="Seconds between later pieces")
+    parser.add_argument("--tokens", type=int, default=60)
+    args = parser.parse_args()
+
+    import api
+
+    fake = FakeStreamingModel(args.first_token, args.interval, args.tokens)
+    api.agent.llm = LLMClient(api_keys=["fake-key"], client_factory=lambda *a: fake, rpm=1e9, burst=10 ** 6)
+    server, base_url = _start_server(api.app)
+    try:
+        with httpx.Client(base_url=base_url, timeout=None) as client:
+            for path in ("/chat", "/chat/stream"):
+                runs = [measure(client, path, f"Question {i} about {path}?") for i in range(args.requests)]
+                print(json.dumps({
+                    "endpoint": path,
+                    "requests": args.requests,
+                    "ttfb_ms": round(statistics.median(r[0] for r in runs) * 1000, 1),
+                    "total_ms": round(statistics.median(r[1] for r in runs) * 1000, 1),
+                    "fake_llm_first_token_ms": args.first_token * 1000,
+                    "fake_llm_total_ms": round((args.first_token + args.interval * (args.tokens - 1)) * 1000),
+                }))
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Peak memory of the in-memory and the --large-data training paths on a synthetic farm-record CSV.
+
+The CSV is Crop_recommendation.csv resampled with small per-feature jitter.
+Each measurement runs in a fresh interpreter, so peak RSS covers only that path:
+
+  in-memory   prepare_data() (DataFrame + split + scaled float64 copies), no model fitting
+  large-data  scan + incremental scaler, SGD and HistGradientBoosting training, streamed evaluation
+
+    python bench_large_data.py --rows 2000000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_dataset(path, rows, chunk_rows=500_000, seed=0):
+    import numpy as np
+    import pandas as pd
+    from crop_pipeline import FEATURE_COLS, TARGET_COL
+
+    base = pd.read_csv(os.path.join(BASE_DIR, "Crop_recommendation.csv"))
+    jitter = base[FEATURE_COLS].std().to_numpy() * 0.02
+    rng = np.random.default_rng(seed)
+    written = 0
+    with open(path, "w", newline="") as f:
+        while written < rows:
+            n = min(chunk_rows, rows - written)
+            sample = base.iloc[rng.integers(0, len(base), n)]
+            X = sample[FEATURE_COLS].to_numpy() + rng.normal(0, 1, (n, len(FEATURE_COLS))) * jitter
+            chunk = pd.DataFrame(np.round(np.clip(X, 0, None), 3), columns=FEATURE_COLS)
+            chunk[TARGET_COL] = sample[TARGET_COL].to_numpy()
+            chunk.to_csv(f, header=written == 0, index=False)
+            written += n
+
+
+def _worker(mode, path, chunk_size):
+    sys.path.append(os.path.join(BASE_DIR, ".."))
+    from common.model_bundle import peak_memory_mb
+    import crop_pipeline as cp
+    import large_data
+
+    baseline = peak_memory_mb()
+    start = time.perf_counter()
+    if mode == "in-memory":
+        cp.prepare_data(path)
+        accuracy = None
+    else:
+        dataset = large_data.StreamingDataset(path, cp.FEATURE_COLS, cp.TARGET_COL, cp.TEST_SIZE, cp.RANDOM_STATE,
+                                              chunk_size)
+        trained, _ = large_data.train_large_models(large_data.build_large_models(cp.RANDOM_STATE), dataset)
+        results = large_data.evaluate_streaming(trained, dataset)
+        accuracy = {name: round(r["test_accuracy"], 4) for name, r in results.items()}
+    print(json.dumps({
+        "mode": mode,
+        "seconds": round(time.perf_counter() - start, 1),
+        "import_peak_mb": round(baseline, 1),
+        "peak_rss_mb": round(peak_memory_mb(), 1),
+        "test_accuracy": accuracy,
+    }))
+
+
+def run_mode(mode, path, chunk_size):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), path, "--worker", mode, "--chunk-size", str(chunk_size)],
+        cwd=BASE_DIR, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", nargs="?", default="synthetic_farms.csv", help="CSV to use (generated if missing)")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="Rows to generate when the CSV is missing")
+    parser.add_argument("--chunk-size", type=int, default=200_000)
+    parser.add_argument("--modes", nargs="+", default=["in-memory", "large-data"])
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args.worker, args.path, args.chunk_size)
+        return
+
+    if not os.path.exists(args.path):
+        print(f"Generating {args.rows:,} rows into {args.path}...")
+        make_dataset(args.path, args.rows)
+    print(f"{args.path}: {os.path.getsize(args.path) / 1e6:.0f} MB")
+    for mode in args.modes:
+        print(json.dumps(run_mode(mode, args.path, args.chunk_size)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Load time and memory per worker: legacy pickles vs the versioned model bundle.
+
+Spawns N fresh interpreters per mode (like N uvicorn workers), loads the crop
+model through crop_model.load_crop_model, scores one row, and reports RSS and
+PSS (shared pages split across processes) once every worker has loaded.
+
+    python bench_model_load.py --workers 4
+"""
+import os
+import sys
+import argparse
+import tempfile
+import warnings
+import multiprocessing as mp
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, ".."))
+
+
+def _growth(before, after, key):
+    # None where the platform reports no current RSS / PSS
+    return after[key] - before[key] if before[key] is not None and after[key] is not None else None
+
+
+def _mean(rows, key):
+    values = [r[key] for r in rows if r[key] is not None]
+    return f"{sum(values) / len(values):>13.1f}" if values else f"{'n/a':>13}"
+
+
+def _worker(bundle_path, barrier, results):
+    os.environ["CROP_BUNDLE_PATH"] = bundle_path
+    os.environ["CROP_USE_PREDICTION_GRID"] = "0"
+    warnings.filterwarnings("ignore")
+    sys.path.insert(0, BASE_DIR)
+    from common.model_bundle import process_memory, timed
+    import crop_model
+
+    before = process_memory()
+    model, load_ms = timed(crop_model.load_crop_model)
+    model.rank_crops([[90, 42, 43, 20.8, 82, 6.5, 202.9]], 3)
+    # Measure only once every worker holds its model, so shared pages are split
+    barrier.wait()
+    after = process_memory()
+    barrier.wait()
+    results.put({
+        "load_ms": load_ms,
+        "rss_mb": _growth(before, after, "rss_mb"),
+        "pss_mb": _growth(before, after, "pss_mb"),
+        "version": model.version,
+    })
+
+
+def run_mode(bundle_path, workers):
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(bundle_path, barrier, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    rows = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return rows
+
+
+def ensure_bundle(path):
+    from common.model_bundle import bundle_exists
+    if bundle_exists(path):
+        return path
+    # No trained bundle yet: build one from the legacy pickles
+    import joblib
+    import crop_pipeline
+    from tree_engine import compile_model
+    path = os.path.join(tempfile.mkdtemp(), "crop_bundle")
+    model = joblib.load(os.path.join(BASE_DIR, "model.pkl"))
+    scaler = joblib.load(os.path.join(BASE_DIR, "scaler.pkl"))
+    le = joblib.load(os.path.join(BASE_DIR, "label_encoder.pkl"))
+    crop_pipeline.DATASET_PATH = os.path.join(BASE_DIR, crop_pipeline.DATASET_PATH)
+    crop_pipeline.save_model_bundle(model, scaler, le, compile_model(model, scaler), type(model).__name__, path=path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--bundle", default=os.path.join(BASE_DIR, "crop_bundle"))
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    sys.path.insert(0, BASE_DIR)
+    bundle_path = ensure_bundle(args.bundle)
+
+    print(f"{'mode':<8} | {'load ms (mean)':>14} | {'RSS MB/worker':>13} | {'PSS MB/worker':>13}")
+    for mode, path in (("legacy", os.path.join(BASE_DIR, "no_bundle")), ("bundle", bundle_path)):
+        rows = run_mode(path, args.workers)
+        n = len(rows)
+        print(f"{mode:<8} | {sum(r['load_ms'] for r in rows) / n:>14.1f} | "
+              f"{_mean(rows, 'rss_mb')} | {_mean(rows, 'pss_mb')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Streaming bulk scoring of farm-record CSVs against the crop model.
+
+    python bulk_score.py farms.csv scored.csv --chunk-size 50000 --workers 4
+    python bulk_score.py farms.csv scored_parquet/ --format parquet
+    python bulk_score.py farms.csv scored.csv --resume          # continue after an interruption
+
+The input is read in chunks and scored on a process pool; each worker loads
+the model once. At most 2 chunks per worker are in flight and results are
+written in input order, so memory stays bounded by the chunk size. After
+every written chunk a checkpoint (<output>.progress.json) records how many
+input rows are done and the input byte offset after them; --resume seeks
+straight there. Rows are split on line breaks, so quoted values must not
+contain newlines.
+"""
+import argparse
+import io
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from crop_model import FEATURE_COLS, load_crop_model
+from training_scheduler import resolve_jobs
+
+
+DEFAULT_CHUNK_SIZE = 50000
+IN_FLIGHT_PER_WORKER = 2
+
+# Model used by this process, loaded once by _init_worker
+_model = None
+
+
+def _init_worker():
+    global _model
+    logging.basicConfig(level=logging.WARNING)
+    _model = load_crop_model()
+
+
+def _score(X, top_k):
+    """Scores the valid rows of X. Returns (label matrix, probability matrix, model version)."""
+    valid = ~np.isnan(X).any(axis=1)
+    labels = np.full((len(X), top_k), None, dtype=object)
+    probs = np.full((len(X), top_k), np.nan)
+    if valid.any():
+        order, top_probs = _model.top_k_scores(X[valid], top_k)
+        labels[valid] = _model.labels[_model.model_classes[order]]
+        probs[valid] = top_probs
+    return labels, probs, _model.version
+
+
+def result_frame(chunk, labels, probs, version, keep_columns):
+    out = chunk[keep_columns].reset_index(drop=True) if keep_columns else pd.DataFrame(index=range(len(chunk)))
+    out["recommended_crop"] = labels[:, 0]
+    out["confidence"] = np.round(probs[:, 0], 4)
+    for k in range(1, labels.shape[1]):
+        out[f"crop_{k + 1}"] = labels[:, k]
+        out[f"probability_{k + 1}"] = np.round(probs[:, k], 4)
+    out["model_version"] = version
+    out["error"] = np.where(pd.isna(labels[:, 0]), "invalid or missing feature value", "")
+    return out
+
+
+def read_chunks(path, usecols, keep_columns, chunk_size, skip_rows=0, start_byte=None):
+    """
+    Yields (chunk, input byte offset after it). Starts at start_byte when given,
+    otherwise after skip_rows data rows, which are passed over without parsing.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        if start_byte is not None:
+            f.seek(start_byte)
+        else:
+            for _ in itertools.islice(f, skip_rows):
+                pass
+        while True:
+            lines = list(itertools.islice(f, chunk_size))
+            if not lines:
+                break
+            chunk = pd.read_csv(io.BytesIO(header + b"".join(lines)), usecols=usecols,
+                                dtype={col: str for col in keep_columns})
+            yield chunk, f.tell()
+
+
+def read_header(path):
+    columns = list(pd.read_csv(path, nrows=0).columns)
+    missing = [col for col in FEATURE_COLS if col not in columns]
+    if missing:
+        raise ValueError(f"{path} is missing required columns {missing} (expected {FEATURE_COLS})")
+    return columns
+
+
+class CsvSink:
+    """Appends chunks to one CSV file; position() is the byte offset to truncate to on resume."""
+
+    def __init__(self, path, resume_state):
+        self.path = path
+        mode = "w"
+        if resume_state is not None and os.path.exists(path):
+            # Drop anything written after the last checkpoint
+            with open(path, "r+b") as f:
+                f.truncate(resume_state["output_bytes"])
+            mode = "a"
+        self.f = open(path, mode, newline="")
+        self.header = mode == "w"
+
+    def write(self, frame):
+        frame.to_csv(self.f, header=self.header, index=False)
+        self.header = False
+        self.f.flush()
+
+    def position(self):
+        return self.f.tell()
+
+    def close(self):
+        self.f.close()
+
+
+class ParquetSink:
+    """Writes one part-NNNNN.parquet file per chunk into a directory."""
+
+    def __init__(self, path, resume_state):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.part = resume_state["output_parts"] if resume_state is not None else 0
+
+    def write(self, frame):
+        frame.to_parquet(os.path.join(self.path, f"part-{self.part:05d}.parquet"), index=False)
+        self.part += 1
+
+    def position(self):
+        return self.part
+
+    def close(self):
+        pass
+
+
+def checkpoint_path(output):
+    return f"{output.rstrip(os.sep)}.progress.json"
+
+
+def save_checkpoint(output, rows_done, input_bytes, sink, layout):
+    state = {"rows_done": rows_done, "input_bytes": input_bytes, "input_columns": FEATURE_COLS, **layout}
+    state["output_parts" if isinstance(sink, ParquetSink) else "output_bytes"] = sink.position()
+    tmp = f"{checkpoint_path(output)}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, checkpoint_path(output))
+
+
+def bulk_score(input_path, output_path, fmt="csv", chunk_size=DEFAULT_CHUNK_SIZE, workers=-1,
+               top_k=1, keep_columns=(), offset=0, resume=False):
+    columns = read_header(input_path)
+    keep_columns = [col for col in keep_columns if col in columns]
+    # Everything that shapes the output rows; a resume must not mix layouts
+    layout = {"top_k": top_k, "keep_columns": keep_columns, "format": fmt}
+
+    resume_state, start_byte = None, None
+    if resume and os.path.exists(checkpoint_path(output_path)):
+        with open(checkpoint_path(output_path), "r") as f:
+            resume_state = json.load(f)
+        changed = [name for name, value in layout.items() if resume_state.get(name) != value]
+        if changed:
+            was = ", ".join(f"{name}={resume_state.get(name)!r}" for name in changed)
+            raise ValueError(f"Cannot resume {output_path} with different options; the interrupted run used {was}")
+        offset = resume_state["rows_done"]
+        start_byte = resume_state["input_bytes"]
+        print(f"Resuming after {offset:,} rows")
+    sink = ParquetSink(output_path, resume_state) if fmt == "parquet" else CsvSink(output_path, resume_state)
+
+    reader = read_chunks(input_path, FEATURE_COLS + keep_columns, keep_columns, chunk_size,
+                         skip_rows=offset, start_byte=start_byte)
+    n_workers = resolve_jobs(workers)
+    pool = ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker) if n_workers > 1 else None
+    if pool is None:
+        _init_worker()
+
+    def submit(chunk, input_bytes):
+        X = chunk[FEATURE_COLS].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+        if pool is None:
+            return chunk, input_bytes, _score(X, top_k)
+        return chunk, input_bytes, pool.submit(_score, X, top_k)
+
+    rows_done, scored, start = offset, 0, time.perf_counter()
+    in_flight = deque()
+
+    def drain_one():
+        nonlocal rows_done, scored
+        chunk, input_bytes, result = in_flight.popleft()
+        labels, probs, version = result if pool is None else result.result()
+        sink.write(result_frame(chunk, labels, probs, version, keep_columns))
+        rows_done += len(chunk)
+        scored += len(chunk)
+        save_checkpoint(output_path, rows_done, input_bytes, sink, layout)
+        elapsed = time.perf_counter() - start
+        print(f"  {rows_done:>12,} rows done  ({scored / elapsed:,.0f} rows/s)", flush=True)
+
+    try:
+        for chunk, input_bytes in reader:
+            in_flight.append(submit(chunk, input_bytes))
+            if len(in_flight) >= n_workers * IN_FLIGHT_PER_WORKER:
+                drain_one()
+        while in_flight:
+            drain_one()
+    finally:
+        sink.close()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"Scored {scored:,} rows in {elapsed:.1f} s ({scored / max(elapsed, 1e-9):,.0f} rows/s) "
+          f"on {n_workers} worker(s) -> {output_path}")
+    return scored
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-score a farm-record CSV with the crop model")
+    parser.add_argument("input", help="CSV with a header row containing " + ", ".join(FEATURE_COLS))
+    parser.add_argument("output", help="Output CSV file, or directory for --format parquet")
+    parser.add_argument("--format", choices=["csv", "parquet"], default=None,
+                        help="Output format (default: from the output extension)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=-1, help="Scoring processes (-1 = all cores)")
+    parser.add_argument("--top-k", type=int, default=1, help="Ranked crops per row")
+    parser.add_argument("--keep", nargs="*", default=[], help="Input columns copied to the output (e.g. farm_id)")
+    parser.add_argument("--offset", type=int, default=0, help="Skip this many data rows of the input")
+    parser.add_argument("--resume", action="store_true", help="Continue from the output's checkpoint file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fmt = args.format or ("parquet" if args.output.endswith((".parquet", os.sep)) else "csv")
+    try:
+        bulk_score(args.input, args.output, fmt=fmt, chunk_size=args.chunk_size, workers=args.workers,
+                   top_k=args.top_k, keep_columns=args.keep, offset=args.offset, resume=args.resume)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,499 @@
+import os
+import sys
+import json
+import re
+import logging
+import threading
+import joblib
+import numpy as np
+import pandas as pd
+
+from tree_engine import CompiledForest, compile_model
+from prediction_grid import PredictionGrid
+from onnx_export import OnnxModel
+from amendment_search import CONTROLLABLE, search_amendments
+from similar_farms import (NEIGHBORS_DATA_PATH, CUSTOM_NEIGHBORS_DATA, ARRAY_PREFIX as NEIGHBORS_ARRAY_PREFIX,
+                           build_index, index_from_arrays)
+
+# Shared helpers live in the repo-root `common` package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.model_bundle import bundle_exists, bundle_markers, load_bundle, MANIFEST_NAME
+from common.drift_monitor import DriftMonitor, reference_stats
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Feature order expected by the scaler and model (matches crop_pipeline.FEATURE_COLS)
+FEATURE_COLS = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+
+BUNDLE_PATH = os.getenv("CROP_BUNDLE_PATH", os.path.join(BASE_DIR, "crop_bundle"))
+LEGACY_MODEL_PATH = os.path.join(BASE_DIR, "model.pkl")
+LEGACY_SCALER_PATH = os.path.join(BASE_DIR, "scaler.pkl")
+LEGACY_ENCODER_PATH = os.path.join(BASE_DIR, "label_encoder.pkl")
+COMPILED_MODEL_PATH = os.path.join(BASE_DIR, "model_compiled.npz")
+ONNX_MODEL_PATH = os.path.join(BASE_DIR, "model.onnx")
+# Name of the ONNX graph inside a bundle
+ONNX_FILE = "model.onnx"
+GRID_PREFIX = os.path.join(BASE_DIR, "prediction_grid")
+# Drift reference for legacy pickles, which carry no training statistics
+TRAINING_DATA_PATH = os.path.join(BASE_DIR, "Crop_recommendation.csv")
+
+# Inference backend: "compiled" walks flattened tree arrays on raw inputs
+# (see tree_engine.py), "onnx" runs the exported scaler+model graph with
+# onnxruntime (`crop_pipeline.py --onnx`), "sklearn" uses scaler.transform +
+# model.predict_proba. compiled/onnx fall back to sklearn when unavailable.
+INFERENCE_BACKEND = os.getenv("CROP_INFERENCE_BACKEND", "compiled").lower()
+# Large batches are faster through sklearn's native tree code
+COMPILED_MAX_ROWS = int(os.getenv("CROP_COMPILED_MAX_ROWS", "512"))
+# Precomputed lookup grid built by `crop_pipeline.py --grid-bins N`. Inputs
+# inside the grid bounds are answered from it; everything else hits the model.
+USE_PREDICTION_GRID = os.getenv("CROP_USE_PREDICTION_GRID", "1") != "0"
+
+REQUIREMENTS_PATH = os.getenv(
+    "CROP_REQUIREMENTS_PATH",
+    os.path.join(BASE_DIR, "..", "SmartCalendar", "data", "crop_requirements.json")
+)
+
+# Where each model feature lives in crop_requirements.json: (section, key)
+REQUIREMENT_KEYS = {
+    "N": ("npk", "Nitrogen"),
+    "P": ("npk", "Phosphorous"),
+    "K": ("npk", "Potassium"),
+    "temperature": ("environment", "Temperature_range"),
+    "humidity": ("environment", "Humidity_range"),
+    "ph": ("environment", "pH_range"),
+    "rainfall": ("environment", "Rainfall_ideal"),
+}
+
+# Array names used for the compiled forest inside a bundle
+COMPILED_ARRAY_PREFIX = "compiled_"
+
+# Typical inputs scored once before a reloaded model starts serving
+WARMUP_ROWS = [
+    [90, 42, 43, 20.8, 82.0, 6.5, 202.9],
+    [20, 67, 20, 25.0, 66.0, 5.7, 60.0],
+    [117, 46, 50, 26.0, 80.0, 6.3, 63.0],
+    [40, 60, 80, 18.0, 16.0, 7.3, 80.0],
+]
+
+
+def _parse_requirement(value):
+    """Parses '21.0-24.0°C' into (21.0, 24.0) and single values like '112.7mm' or 20.8 into (v, v)."""
+    numbers = [float(n) for n in re.findall(r"\d+(?:\.\d+)?", str(value))]
+    if not numbers:
+        return np.nan, np.nan
+    return min(numbers), max(numbers)
+
+
+def load_requirement_ranges(labels):
+    """
+    Loads crop_requirements.json into (low, high) arrays of shape (n_labels, n_features),
+    row-aligned with the encoded labels. Unknown crops/features are NaN.
+    """
+    low = np.full((len(labels), len(FEATURE_COLS)), np.nan)
+    high = np.full((len(labels), len(FEATURE_COLS)), np.nan)
+    try:
+        with open(REQUIREMENTS_PATH, 'r') as f:
+            requirements = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Crop requirements not loaded, gap report disabled: {e}")
+        return low, high
+
+    for i, crop in enumerate(labels):
+        crop_req = requirements.get(str(crop).lower(), {})
+        for j, col in enumerate(FEATURE_COLS):
+            section, key = REQUIREMENT_KEYS[col]
+            if key in crop_req.get(section, {}):
+                low[i, j], high[i, j] = _parse_requirement(crop_req[section][key])
+    logger.info(f"Loaded requirement ranges for {int((~np.isnan(low).all(axis=1)).sum())} crops.")
+    return low, high
+
+
+def compiled_arrays(compiled):
+    """Bundle arrays and metadata for a CompiledForest (see crop_pipeline.save_model_bundle)."""
+    arrays = {
+        f"{COMPILED_ARRAY_PREFIX}{name}": getattr(compiled, name)
+        for name in ("feature", "threshold", "children", "value", "roots", "classes", "base_margin")
+    }
+    return arrays, {"kind": compiled.kind, "max_depth": compiled.max_depth}
+
+
+class CropModel:
+    """
+    Everything /predict needs: label mapping, the inference backends and the
+    requirement ranges. Built from a versioned bundle or the legacy pickles.
+    """
+
+    def __init__(self, version, labels, model_classes, artifact_mtime,
+                 get_model, get_scaler, compiled=None, bundle=None):
+        self.version = version
+        self.labels = np.asarray(labels)
+        self.model_classes = np.asarray(model_classes)
+        self.artifact_mtime = artifact_mtime
+        self.bundle = bundle
+        self._get_model = get_model
+        self._get_scaler = get_scaler
+        self.compiled = compiled
+        self.onnx = None
+        self.grid = None
+        self._explainer = None
+        # Similar-farms index, built on first use by neighbors_loader
+        self.neighbors_loader = None
+        self._neighbors = None
+        self._neighbors_built = False
+        self._neighbors_lock = threading.Lock()
+        self.drift = None
+        self.req_low, self.req_high = load_requirement_ranges(self.labels)
+
+    @property
+    def model(self):
+        return self._get_model()
+
+    @property
+    def scaler(self):
+        return self._get_scaler()
+
+    @property
+    def neighbors(self):
+        """Similar-farms index, or None when unavailable. Built on first access, so loading stays cheap."""
+        if not self._neighbors_built:
+            with self._neighbors_lock:
+                if not self._neighbors_built:
+                    self._neighbors = self.neighbors_loader() if self.neighbors_loader is not None else None
+                    self._neighbors_built = True
+        return self._neighbors
+
+    @property
+    def n_classes(self):
+        return len(self.model_classes)
+
+    def predict_proba_raw(self, input_data):
+        """Class probabilities (columns aligned with model_classes) for raw feature rows."""
+        if self.onnx is not None:
+            return self.onnx.predict_proba(input_data)
+        if self.compiled is not None and len(input_data) <= COMPILED_MAX_ROWS:
+            return self.compiled.predict_proba(input_data)
+        return self.model.predict_proba(self.scaler.transform(input_data))
+
+    def top_k_scores(self, input_data, top_k):
+        """
+        Top-k class columns and probabilities per row. Rows inside the prediction
+        grid are looked up; the rest go through one predict_proba call.
+        """
+        n_rows = len(input_data)
+        order = np.empty((n_rows, top_k), dtype=np.intp)
+        top_probs = np.empty((n_rows, top_k))
+        live = np.ones(n_rows, dtype=bool)
+
+        if self.grid is not None and top_k <= self.grid.top_k:
+            inside, grid_classes, grid_probs = self.grid.lookup(input_data)
+            order[inside] = grid_classes[:, :top_k]
+            top_probs[inside] = grid_probs[:, :top_k]
+            live = ~inside
+
+        if live.any():
+            probs = self.predict_proba_raw(input_data[live])
+            live_order = np.argsort(-probs, axis=1)[:, :top_k]
+            order[live] = live_order
+            top_probs[live] = np.take_along_axis(probs, live_order, axis=1)
+        return order, top_probs
+
+    def explainer(self):
+        """Compiled forest used for attributions (compiled on first use for non-compiled backends)."""
+        if self.compiled is not None:
+            return self.compiled
+        if self._explainer is None:
+            self._explainer = compile_model(self.model, self.scaler)
+            self._explainer.attribution_tables()
+        return self._explainer
+
+    def label_column(self, crop):
+        """predict_proba column of a crop name, or None if the model does not know it."""
+        matches = np.flatnonzero(np.char.lower(self.labels.astype(str)) == str(crop).lower())
+        if len(matches) == 0:
+            return None
+        columns = np.flatnonzero(self.model_classes == matches[0])
+        return int(columns[0]) if len(columns) else None
+
+    def explain(self, features, crop=None):
+        """
+        Per-instance feature attributions for the recommended crop (or `crop`)
+        of every row: base value + contributions add up to its probability.
+        Raises ValueError for an unknown crop and TypeError for models without
+        averaged tree probabilities (e.g. XGBoost).
+        """
+        input_data = np.ascontiguousarray(features, dtype=np.float64)
+        forest = self.explainer()
+        probs = forest.predict_proba(input_data)
+        if crop is None:
+            columns = probs.argmax(axis=1)
+        else:
+            column = self.label_column(crop)
+            if column is None:
+                raise ValueError(f"Unknown crop '{crop}'")
+            columns = np.full(len(input_data), column, dtype=np.intp)
+        bias, contrib = forest.contributions(input_data, columns)
+        labels = self.labels[self.model_classes[columns]]
+
+        explanations = []
+        for r in range(len(input_data)):
+            order = np.argsort(-np.abs(contrib[r]))
+            explanations.append({
+                'crop': str(labels[r]),
+                'probability': round(float(probs[r, columns[r]]), 4),
+                'base_value': round(float(bias[r]), 4),
+                'contributions': {FEATURE_COLS[j]: round(float(contrib[r, j]), 4) for j in order},
+            })
+        return explanations
+
+    def similar_farms(self, features, k):
+        """The k nearest labelled records of every row (see similar_farms.SimilarFarmsIndex)."""
+        if self.neighbors is None:
+            raise RuntimeError("Similar-farms index not available. Check server logs.")
+        return self.neighbors.query(features, k)
+
+    def amendments(self, features, crop):
+        """
+        Smallest N/P/K/pH change (climate fixed) after which `crop` is the
+        model's top recommendation. Raises ValueError for an unknown crop.
+        """
+        column = self.label_column(crop)
+        if column is None:
+            raise ValueError(f"Unknown crop '{crop}'")
+        row = np.asarray(features, dtype=np.float64).ravel()
+        probs = self.predict_proba_raw(row[None])[0]
+        result = search_amendments(self.predict_proba_raw, row, column, self.scaler.scale_)
+        suggestion = result.pop("suggestion")
+
+        changes = {}
+        for name, spec in CONTROLLABLE.items():
+            current, suggested = row[spec["column"]], suggestion[spec["column"]]
+            if abs(suggested - current) >= spec["step"] / 2:
+                changes[name] = {
+                    'current': round(float(current), 2),
+                    'suggested': round(float(suggested), 2),
+                    'change': round(float(suggested - current), 2),
+                }
+        return {
+            'target_crop': str(self.labels[self.model_classes[column]]),
+            'achievable': result.pop("achieved"),
+            'current_rank': int((probs > probs[column]).sum()) + 1,
+            'current_probability': round(float(probs[column]), 4),
+            'changes': changes,
+            'suggested_input': {col: round(float(v), 2) for col, v in zip(FEATURE_COLS, suggestion)},
+            **{key: round(value, 4) if isinstance(value, float) else value for key, value in result.items()},
+        }
+
+    def rank_crops(self, features, top_k):
+        """
+        Scores a (n_rows, n_features) matrix with one predict_proba pass (or the
+        prediction grid) and returns the top-k ranked crops for every row.
+
+        Each ranked crop carries a per-feature requirement gap: 0 when the input
+        is inside the crop's range, otherwise the signed distance to the nearest
+        bound (positive = input above the requirement, negative = below).
+        """
+        input_data = np.ascontiguousarray(features, dtype=np.float64)
+        top_k = max(1, min(top_k, self.n_classes))
+        order, top_probs = self.top_k_scores(input_data, top_k)
+        class_rows = self.model_classes[order]
+        labels = self.labels[class_rows]
+
+        # Gap against requirement ranges: (n_rows, top_k, n_features)
+        x = input_data[:, None, :]
+        low, high = self.req_low[class_rows], self.req_high[class_rows]
+        gaps = np.where(x < low, x - low, np.where(x > high, x - high, 0.0))
+        gaps = np.where(np.isnan(low), np.nan, gaps)
+
+        rankings = []
+        for r in range(order.shape[0]):
+            ranked = []
+            for k in range(top_k):
+                ranked.append({
+                    'crop': str(labels[r, k]),
+                    'probability': round(float(top_probs[r, k]), 4),
+                    'requirement_gap': {
+                        col: (None if np.isnan(gaps[r, k, j]) else round(float(gaps[r, k, j]), 2))
+                        for j, col in enumerate(FEATURE_COLS)
+                    }
+                })
+            rankings.append(ranked)
+        return rankings
+
+
+def _load_from_bundle(path):
+    bundle = load_bundle(path)
+    if bundle.feature_names != FEATURE_COLS:
+        raise ValueError(f"Bundle feature schema {bundle.feature_names} does not match {FEATURE_COLS}")
+    compiled = None
+    meta = bundle.metadata.get("compiled")
+    if INFERENCE_BACKEND == "compiled" and meta:
+        compiled = CompiledForest(
+            **{name[len(COMPILED_ARRAY_PREFIX):]: array
+               for name, array in bundle.arrays.items() if name.startswith(COMPILED_ARRAY_PREFIX)},
+            **meta,
+        )
+    crop_model = CropModel(
+        version=bundle.version,
+        labels=bundle.labels,
+        model_classes=bundle.model_classes,
+        artifact_mtime=os.path.getmtime(os.path.join(bundle.path, MANIFEST_NAME)),
+        get_model=lambda: bundle.get("model"),
+        get_scaler=lambda: bundle.get("scaler"),
+        compiled=compiled,
+        bundle=bundle,
+    )
+    if INFERENCE_BACKEND == "compiled" and compiled is None:
+        crop_model.compiled = _compile(crop_model.model, crop_model.scaler)
+    if INFERENCE_BACKEND == "onnx":
+        crop_model.onnx = _load_onnx(bundle.file_path(ONNX_FILE))
+    return crop_model
+
+
+def _load_legacy():
+    model = joblib.load(LEGACY_MODEL_PATH)
+    scaler = joblib.load(LEGACY_SCALER_PATH)
+    le = joblib.load(LEGACY_ENCODER_PATH)
+    mtime = os.path.getmtime(LEGACY_MODEL_PATH)
+    crop_model = CropModel(
+        version=f"legacy-{int(mtime)}",
+        labels=le.classes_,
+        model_classes=model.classes_,
+        artifact_mtime=mtime,
+        get_model=lambda: model,
+        get_scaler=lambda: scaler,
+    )
+    if INFERENCE_BACKEND == "compiled":
+        if os.path.exists(COMPILED_MODEL_PATH) and os.path.getmtime(COMPILED_MODEL_PATH) >= mtime:
+            crop_model.compiled = CompiledForest.load(COMPILED_MODEL_PATH)
+        else:
+            crop_model.compiled = _compile(model, scaler)
+    if INFERENCE_BACKEND == "onnx" and os.path.exists(ONNX_MODEL_PATH) and os.path.getmtime(ONNX_MODEL_PATH) >= mtime:
+        crop_model.onnx = _load_onnx(ONNX_MODEL_PATH)
+    return crop_model
+
+
+def _compile(model, scaler):
+    try:
+        return compile_model(model, scaler)
+    except TypeError as e:
+        logger.warning(f"Compiled backend unavailable, falling back to sklearn: {e}")
+        return None
+
+
+def _load_onnx(path):
+    if path is None or not os.path.exists(path):
+        logger.warning("ONNX backend requested but no exported graph found, falling back to sklearn. "
+                       "Export with crop_pipeline.py --onnx.")
+        return None
+    try:
+        return OnnxModel(path)
+    except ImportError as e:
+        logger.warning(f"ONNX backend unavailable, falling back to sklearn: {e}")
+        return None
+
+
+def _load_grid(artifact_mtime):
+    """Memory-maps the prediction grid if it exists and is newer than the model artifacts."""
+    if not USE_PREDICTION_GRID or not PredictionGrid.exists(GRID_PREFIX):
+        return None
+    if PredictionGrid.mtime(GRID_PREFIX) < artifact_mtime:
+        logger.warning("Prediction grid is older than the model, ignoring it. Rebuild with crop_pipeline.py --grid-bins.")
+        return None
+    try:
+        grid = PredictionGrid.load(GRID_PREFIX)
+        logger.info(f"Prediction grid loaded: {grid.n_cells:,} cells, top_k={grid.top_k}.")
+        return grid
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Prediction grid not loaded: {e}")
+        return None
+
+
+def _drift_reference(crop_model):
+    """Training feature statistics from the bundle, else computed from the training CSV."""
+    if crop_model.bundle is not None and crop_model.bundle.metadata.get("feature_stats"):
+        return crop_model.bundle.metadata["feature_stats"]
+    try:
+        rows = pd.read_csv(TRAINING_DATA_PATH, usecols=FEATURE_COLS)[FEATURE_COLS].to_numpy(np.float64)
+    except (OSError, ValueError) as e:
+        logger.warning(f"No drift reference available: {e}")
+        return None
+    return reference_stats(rows, FEATURE_COLS)
+
+
+def _load_neighbors(crop_model):
+    """
+    Similar-farms index over the bundle's reference records, or over the CSV
+    (CROP_NEIGHBORS_DATA, legacy pickles) standardized with the bundle's
+    scaler statistics. Only legacy models without them unpickle the scaler.
+    """
+    arrays = crop_model.bundle.arrays if crop_model.bundle is not None else {}
+    if not CUSTOM_NEIGHBORS_DATA:
+        index = index_from_arrays(arrays, FEATURE_COLS)
+        if index is not None:
+            return index
+    if f"{NEIGHBORS_ARRAY_PREFIX}center" in arrays:
+        center, scale = arrays[f"{NEIGHBORS_ARRAY_PREFIX}center"], arrays[f"{NEIGHBORS_ARRAY_PREFIX}scale"]
+    else:
+        try:
+            center, scale = crop_model.scaler.mean_, crop_model.scaler.scale_
+        except AttributeError as e:
+            logger.warning(f"Similar-farms index unavailable: {e}")
+            return None
+    return build_index(center, scale, FEATURE_COLS)
+
+
+def artifact_paths():
+    """Files whose modification marks a new model (watched by the API for hot reload)."""
+    return bundle_markers(BUNDLE_PATH) + [
+        LEGACY_MODEL_PATH,
+        LEGACY_SCALER_PATH,
+        LEGACY_ENCODER_PATH,
+        ONNX_MODEL_PATH,
+        f"{GRID_PREFIX}.json",
+        NEIGHBORS_DATA_PATH,
+    ]
+
+
+def warmup(crop_model):
+    """Runs the single-row and small-batch paths once so the first real request is not slower."""
+    crop_model.rank_crops(WARMUP_ROWS[:1], 3)
+    crop_model.rank_crops(WARMUP_ROWS, 3)
+    if crop_model.compiled is not None and crop_model.compiled.kind == "mean":
+        crop_model.explain(WARMUP_ROWS[:1])
+
+
+def load_candidate_model(path):
+    """A model from another bundle directory, for shadow scoring: prediction backends only."""
+    if not bundle_exists(path):
+        raise FileNotFoundError(f"No model bundle at {path}")
+    crop_model = _load_from_bundle(path)
+    warmup(crop_model)
+    return crop_model
+
+
+def load_crop_model():
+    """Loads the versioned bundle when present, otherwise the legacy model/scaler/label_encoder pickles."""
+    if bundle_exists(BUNDLE_PATH):
+        crop_model = _load_from_bundle(BUNDLE_PATH)
+        source = BUNDLE_PATH
+    else:
+        crop_model = _load_legacy()
+        source = "legacy pickles"
+    crop_model.grid = _load_grid(crop_model.artifact_mtime)
+    if crop_model.compiled is not None and crop_model.compiled.kind == "mean":
+        # Path tables for /explain are built at load, not on the first request
+        crop_model.compiled.attribution_tables()
+    # Rebuilt for every (re)load, so a retrained scaler or new records are picked up
+    crop_model.neighbors_loader = lambda: _load_neighbors(crop_model)
+    # Input statistics of this model version, compared against its training data by /admin/drift
+    crop_model.drift = DriftMonitor(FEATURE_COLS, _drift_reference(crop_model))
+    if crop_model.onnx is not None:
+        backend = "onnx"
+    elif crop_model.compiled is not None:
+        backend = f"compiled ({crop_model.compiled.n_trees} trees)"
+    else:
+        backend = "sklearn"
+    logger.info(f"Crop model {crop_model.version} loaded from {source}, backend: {backend}.")
+    return crop_model
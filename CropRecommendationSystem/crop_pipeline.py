@@ -1,10 +1,14 @@
 import os
+import sys
+import time
+import argparse
+from contextlib import contextmanager
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-from sklearn.model_selection import train_test_split, cross_val_score, learning_curve
+from sklearn.model_selection import train_test_split, StratifiedKFold
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.linear_model import LogisticRegression
 from sklearn.tree import DecisionTreeClassifier
@@ -13,13 +17,68 @@ from sklearn.metrics import accuracy_score, classification_report, confusion_mat
 from xgboost import XGBClassifier
 import joblib
 
+from tree_engine import can_compile, compile_model
+from prediction_grid import PredictionGrid, grid_paths, snap_to_grid
+from crop_model import compiled_arrays, ONNX_FILE
+from training_scheduler import TrainingScheduler
+from hyperparameter_search import search_models, SEARCH_SPACES, LATENCY_WEIGHT, SIZE_WEIGHT
+from stage_cache import StageCache
+from model_benchmark import benchmark_models, served_predict_proba, latency_percentiles, SINGLE_ROW_REPEATS
+from onnx_export import export_onnx, OnnxModel, parity_check
+from forest_compression import supports_compression, compress_forest, forest_stats, load_time_ms, VALIDATION_SIZE
+
+# Shared helpers live in the repo-root `common` package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.model_bundle import save_bundle, file_sha256, peak_memory_mb, POINTER_NAME
+from common.drift_monitor import reference_stats
+from similar_farms import index_arrays
+from large_data import (StreamingDataset, build_large_models, train_large_models, evaluate_streaming,
+                        DEFAULT_CHUNK_SIZE, SGD_EPOCHS, HGB_MAX_ROWS)
+
 
 DATASET_PATH = "Crop_recommendation.csv"
+COMPILED_MODEL_PATH = "model_compiled.npz"
+ONNX_MODEL_PATH = "model.onnx"
+# Exported graph must pick the same class as the sklearn model on this share of test rows
+ONNX_MIN_AGREEMENT = 0.995
+BUNDLE_PATH = "crop_bundle"
+GRID_PREFIX = "prediction_grid"
+GRID_TOP_K = 3
+GRID_REPORT_BINS = [4, 6, 8, 10, 12, 16, 20]
+GRID_REPORT_PATH = "grid_resolution_report.csv"
+SEARCH_RESULTS_PATH = "hyperparameter_search.jsonl"
+SEARCH_SUMMARY_PATH = "hyperparameter_search_summary.csv"
+CACHE_DIR = ".pipeline_cache"
+BENCHMARK_PATH = "model_benchmark.csv"
+COMPACT_MODEL_PATH = "model_compact.pkl"
+COMPRESSION_REPORT_PATH = "compression_report.csv"
 FEATURE_COLS = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
 TARGET_COL = "label"
 RANDOM_STATE = 42
 TEST_SIZE = 0.2
 CV_FOLDS = 5
+# Training rows summarised into the drift-monitoring reference in --large-data mode
+DRIFT_REFERENCE_ROWS = 200_000
+LEARNING_CURVE_SIZES = np.linspace(0.1, 1.0, 10)
+
+
+@contextmanager
+def timed_stage(name, timings):
+    start = time.perf_counter()
+    yield
+    timings[name] = time.perf_counter() - start
+
+
+def print_stage_timings(timings):
+    print("\n" + "=" * 60)
+    print("PIPELINE WALL-CLOCK BY STAGE")
+    print("=" * 60)
+    for name, seconds in timings.items():
+        print(f"  {name:<28}: {seconds:8.2f} s")
+    print(f"  {'Total':<28}: {sum(timings.values()):8.2f} s")
+    peak = peak_memory_mb()
+    if peak is not None:
+        print(f"  {'Peak memory (RSS)':<28}: {peak:8.1f} MB")
 
 
 def load_dataset(path):
@@ -52,6 +111,22 @@ def scale_features(X_train, X_test):
     return X_train_scaled, X_test_scaled, scaler
 
 
+def prepare_data(path):
+    print("Loading dataset...")
+    df = load_dataset(path)
+    print(f"Dataset shape: {df.shape}")
+    print(f"Classes: {sorted(df[TARGET_COL].unique())}")
+    print(f"Class distribution:\n{df[TARGET_COL].value_counts().to_string()}")
+
+    X, y, le = preprocess(df)
+
+    X_train, X_test, y_train, y_test = split_data(X, y)
+    print(f"\nTrain size: {len(X_train)}, Test size: {len(X_test)}")
+
+    X_train_sc, X_test_sc, scaler = scale_features(X_train, X_test)
+    return X, y, le, X_train, X_test, y_train, y_test, X_train_sc, X_test_sc, scaler
+
+
 def build_models():
     return {
         "Logistic Regression": LogisticRegression(
@@ -72,31 +147,57 @@ def build_models():
     }
 
 
-def run_cross_validation(models, X_train, y_train):
+def cv_splits(X_train, y_train):
+    # Same folds cross_val_score(cv=CV_FOLDS) uses for a classifier
+    return list(StratifiedKFold(n_splits=CV_FOLDS).split(X_train, y_train))
+
+
+def schedule_training(scheduler, models, folds, n_train):
+    # Every (model x fold) fit and every final full-training-set fit is
+    # queued at once, so the pool stays busy across models.
+    fold_futures = {
+        name: [scheduler.submit(model, train_idx, val_idx) for train_idx, val_idx in folds]
+        for name, model in models.items()
+    }
+    full_futures = {name: scheduler.submit(model, np.arange(n_train)) for name, model in models.items()}
+    return fold_futures, full_futures
+
+
+def run_cross_validation(fold_futures):
     print("\n" + "=" * 60)
     print("5-FOLD CROSS-VALIDATION RESULTS (on training set)")
     print("=" * 60)
     cv_results = {}
-    for name, model in models.items():
-        scores = cross_val_score(
-            model, X_train, y_train, cv=CV_FOLDS, scoring="accuracy"
-        )
+    cv_fits = {}
+    for name, futures in fold_futures.items():
+        cv_fits[name] = [future.result() for future in futures]
+        scores = np.array([fit.val_score for fit in cv_fits[name]])
         cv_results[name] = scores
         print(f"\n{name}")
         print(f"  CV Scores  : {np.round(scores, 4)}")
         print(f"  Mean       : {scores.mean():.4f}")
         print(f"  Std Dev    : {scores.std():.4f}")
-    return cv_results
+    return cv_results, cv_fits
 
 
-def train_models(models, X_train, y_train):
+def train_models(full_futures):
     trained = {}
-    for name, model in models.items():
-        model.fit(X_train, y_train)
-        trained[name] = model
+    for name, future in full_futures.items():
+        trained[name] = future.result().estimator
     return trained
 
 
+def fit_models(scheduler, models, folds, n_train):
+    fold_futures, full_futures = schedule_training(scheduler, models, folds, n_train)
+    cv_results, cv_fits = run_cross_validation(fold_futures)
+    return cv_results, cv_fits, train_models(full_futures)
+
+
+def model_params(models):
+    # Stage-cache parameters: a changed hyperparameter invalidates training
+    return {name: {"class": type(model).__name__, **model.get_params()} for name, model in models.items()}
+
+
 def evaluate_models(trained_models, X_train, y_train, X_test, y_test, le):
     print("\n" + "=" * 60)
     print("TRAIN vs TEST SET EVALUATION RESULTS")
@@ -121,17 +222,49 @@ def evaluate_models(trained_models, X_train, y_train, X_test, y_test, le):
     return results
 
 
-def identify_best_model(cv_results):
-    best_name = max(cv_results, key=lambda n: cv_results[n].mean())
+def identify_best_model(cv_results, benchmark=None, max_p99_ms=None, max_size_mb=None):
+    # Selection policy: the most accurate model whose single-row p99 latency
+    # and pickle size fit the budget. Without a budget this is plain CV accuracy.
+    eligible = list(cv_results)
+    if benchmark is not None and (max_p99_ms is not None or max_size_mb is not None):
+        eligible = [
+            name for name in cv_results
+            if (max_p99_ms is None or benchmark.loc[name, "single_p99_ms"] <= max_p99_ms)
+            and (max_size_mb is None or benchmark.loc[name, "pickle_mb"] <= max_size_mb)
+        ]
+        if not eligible:
+            print(f"\n[WARNING] No model meets p99 <= {max_p99_ms} ms and size <= {max_size_mb} MB; "
+                  "falling back to CV accuracy alone.")
+            eligible = list(cv_results)
+
+    best_name = max(eligible, key=lambda n: cv_results[n].mean())
     print("\n" + "=" * 60)
-    print(f"BEST MODEL (by CV Mean Accuracy): {best_name}")
+    if len(eligible) < len(cv_results):
+        print(f"BEST MODEL (by CV Mean Accuracy within p99 <= {max_p99_ms} ms, size <= {max_size_mb} MB): {best_name}")
+    else:
+        print(f"BEST MODEL (by CV Mean Accuracy): {best_name}")
     print(f"  Mean CV Accuracy: {cv_results[best_name].mean():.4f}")
+    if benchmark is not None:
+        print(f"  Single-row p99  : {benchmark.loc[best_name, 'single_p99_ms']:.3f} ms")
+        print(f"  Pickle size     : {benchmark.loc[best_name, 'pickle_mb']:.3f} MB")
     print("=" * 60)
     return best_name
 
 
-def plot_confusion_matrix(model, X_test, y_test, le, model_name):
-    y_pred = model.predict(X_test)
+def run_benchmark(trained_models, scaler, X_test, cv_results):
+    print("\n" + "=" * 60)
+    print("INFERENCE BENCHMARK (served backend, test-set rows)")
+    print("=" * 60)
+    benchmark = benchmark_models(trained_models, scaler, X_test, FEATURE_COLS)
+    benchmark.insert(0, "cv_accuracy", [round(cv_results[name].mean(), 4) for name in benchmark.index])
+    print(benchmark.to_string())
+    benchmark.to_csv(BENCHMARK_PATH)
+    print(f"Benchmark table saved to {BENCHMARK_PATH}")
+    return benchmark
+
+
+def plot_confusion_matrix(y_pred, y_test, le, model_name):
+    # y_pred comes from evaluate_models, no second predict pass
     cm = confusion_matrix(y_test, y_pred)
     plt.figure(figsize=(14, 11))
     sns.heatmap(
@@ -181,17 +314,26 @@ def plot_feature_importance(model, model_name):
     print("Feature importance plot saved to feature_importance.png")
 
 
-def plot_learning_curve(model, X_train, y_train, model_name):
-    train_sizes, train_scores, val_scores = learning_curve(
-        model,
-        X_train,
-        y_train,
-        cv=CV_FOLDS,
-        scoring="accuracy",
-        train_sizes=np.linspace(0.1, 1.0, 10),
-        random_state=RANDOM_STATE,
-    )
-
+def learning_curve_scores(scheduler, model, folds, cv_fits):
+    # Mirrors sklearn.model_selection.learning_curve(cv=folds): each size
+    # trains on the first n rows of every training fold. The full-size point
+    # is exactly the cross-validation fit, so those are reused, not refitted.
+    n_max = len(folds[0][0])
+    train_sizes = np.unique(np.clip((LEARNING_CURVE_SIZES * n_max).astype(int), 1, n_max))
+    reuse_cv = train_sizes[-1] == n_max
+    futures = [
+        [scheduler.submit(model, train_idx[:size], val_idx) for train_idx, val_idx in folds]
+        for size in (train_sizes[:-1] if reuse_cv else train_sizes)
+    ]
+    fits = [[future.result() for future in row] for row in futures]
+    if reuse_cv:
+        fits.append(cv_fits)
+    train_scores = np.array([[fit.train_score for fit in row] for row in fits])
+    val_scores = np.array([[fit.val_score for fit in row] for row in fits])
+    return train_sizes, train_scores, val_scores
+
+
+def plot_learning_curve(train_sizes, train_scores, val_scores, model_name):
     train_mean = train_scores.mean(axis=1)
     train_std = train_scores.std(axis=1)
     val_mean = val_scores.mean(axis=1)
@@ -229,6 +371,34 @@ def plot_learning_curve(model, X_train, y_train, model_name):
     print("Learning curve plot saved to learning_curve.png")
 
 
+def compress_model(model, scaler, X_train_sc, y_train, X_test, X_test_sc, y_test, tolerance):
+    print("\n" + "=" * 60)
+    print(f"FOREST COMPRESSION (validation accuracy tolerance {tolerance})")
+    print("=" * 60)
+    compact, info = compress_forest(model, X_train_sc, y_train, tolerance=tolerance, random_state=RANDOM_STATE)
+    joblib.dump(compact, COMPACT_MODEL_PATH)
+
+    rows = []
+    for label, candidate in (("original", model), ("compressed", compact)):
+        load_ms, size_mb = load_time_ms(candidate)
+        _, predict_proba = served_predict_proba(candidate, scaler, FEATURE_COLS)
+        singles = [np.asarray(X_test, dtype=np.float64)[i:i + 1] for i in range(len(X_test))]
+        p50, p99 = latency_percentiles(predict_proba, singles, SINGLE_ROW_REPEATS)
+        # The test set is only scored here, after every compression choice is made
+        accuracy = accuracy_score(y_test, candidate.predict(np.asarray(X_test_sc, dtype=np.float32)))
+        rows.append({"model": label, **forest_stats(candidate), "file_mb": round(size_mb, 3),
+                     "load_ms": round(load_ms, 2), "single_p50_ms": round(p50, 4),
+                     "single_p99_ms": round(p99, 4), "test_accuracy": round(accuracy, 4)})
+    report = pd.DataFrame(rows).set_index("model")
+    print(report.to_string())
+    print(f"Chosen on a validation split: kept trees {info['trees']}, subtrees pruned below "
+          f"{info['min_samples']} samples; validation accuracy {info['baseline_accuracy']:.4f} -> "
+          f"{info['accuracy']:.4f} (compressed forest refitted on {info['fit_rows']} training rows)")
+    report.to_csv(COMPRESSION_REPORT_PATH)
+    print(f"Compact model saved to {COMPACT_MODEL_PATH}, report to {COMPRESSION_REPORT_PATH}")
+    return compact, report
+
+
 def save_artifacts(model, scaler, le):
     joblib.dump(model, 'model.pkl')
     joblib.dump(scaler, 'scaler.pkl')
@@ -236,46 +406,444 @@ def save_artifacts(model, scaler, le):
     print("\n[INFO] Best model, scaler, and label encoder successfully saved for the API!")
 
 
-def main():
-    print("Loading dataset...")
-    df = load_dataset(DATASET_PATH)
-    print(f"Dataset shape: {df.shape}")
-    print(f"Classes: {sorted(df[TARGET_COL].unique())}")
-    print(f"Class distribution:\n{df[TARGET_COL].value_counts().to_string()}")
+def export_compiled_model(model, scaler, model_name):
+    # Flattened tree arrays with the scaler folded in, served by api.py's compiled backend
+    try:
+        compiled = compile_model(model, scaler)
+    except TypeError as e:
+        print(f"\n[INFO] Skipping compiled export for {model_name}: {e}")
+        # A compiled file left by an earlier model must not be served for this one
+        if os.path.exists(COMPILED_MODEL_PATH):
+            os.remove(COMPILED_MODEL_PATH)
+        return None
+    compiled.save(COMPILED_MODEL_PATH)
+    print(f"[INFO] Compiled model saved to {COMPILED_MODEL_PATH} "
+          f"({compiled.n_trees} trees, {compiled.n_nodes} nodes)")
+    return compiled
+
+
+def export_onnx_model(model, scaler, X_test, model_name):
+    # scaler + classifier as one ONNX graph for the onnxruntime backend, with a
+    # parity check against the sklearn model before it is written.
+    try:
+        onnx_bytes = export_onnx(model, scaler, len(FEATURE_COLS))
+        parity = parity_check(OnnxModel(onnx_bytes), _raw_predict_proba(model, scaler), np.asarray(X_test, dtype=np.float64))
+    except ImportError as e:
+        print(f"\n[WARNING] Skipping ONNX export: {e}")
+        return None
+    print(f"[INFO] ONNX parity on {parity['rows']} test rows: argmax agreement {parity['argmax_agreement']:.4f}, "
+          f"max |prob diff| {parity['max_abs_prob_diff']:.4f}")
+    if parity["argmax_agreement"] < ONNX_MIN_AGREEMENT:
+        print(f"[WARNING] ONNX export of {model_name} disagrees with sklearn on too many rows; not exported.")
+        return None
+    with open(ONNX_MODEL_PATH, "wb") as f:
+        f.write(onnx_bytes)
+    print(f"[INFO] ONNX model saved to {ONNX_MODEL_PATH} ({len(onnx_bytes) / 1e6:.2f} MB)")
+    return onnx_bytes
+
+
+def save_model_bundle(model, scaler, le, compiled, model_name, path=BUNDLE_PATH, benchmark=None, onnx_bytes=None,
+                      data_path=DATASET_PATH, reference_rows=None, neighbor_records=None):
+    # One versioned bundle with everything api.py needs; the compiled tree
+    # arrays are stored as .npy so workers memory-map and share them.
+    # reference_rows (raw training features) become the drift-monitoring baseline;
+    # neighbor_records (raw features, crop names) are searched by /similar_farms.
+    arrays, metadata = {}, {"model_name": model_name}
+    if reference_rows is not None:
+        metadata["feature_stats"] = reference_stats(reference_rows, FEATURE_COLS)
+    if benchmark is not None:
+        metadata["benchmark"] = benchmark.reset_index().to_dict(orient="records")
+    if compiled is not None:
+        arrays, metadata["compiled"] = compiled_arrays(compiled)
+    arrays.update(index_arrays(*(neighbor_records or (None, None)), scaler))
+    manifest = save_bundle(
+        path,
+        objects={"model": model, "scaler": scaler},
+        feature_schema=[{"name": col, "dtype": "float"} for col in FEATURE_COLS],
+        labels=le.classes_,
+        model_classes=model.classes_,
+        arrays=arrays,
+        training_data_path=data_path,
+        metadata=metadata,
+        files={ONNX_FILE: onnx_bytes} if onnx_bytes is not None else None,
+    )
+    print(f"[INFO] Model bundle {manifest['model_version']} saved to {path}/")
+    return manifest
 
-    X, y, le = preprocess(df)
 
-    X_train, X_test, y_train, y_test = split_data(X, y)
-    print(f"\nTrain size: {len(X_train)}, Test size: {len(X_test)}")
+def export_artifacts(model, scaler, le, model_name, benchmark=None, onnx_rows=None, data_path=DATASET_PATH,
+                     reference_rows=None, neighbor_records=None):
+    # Save the artifacts for deployment; onnx_rows (test features) enables the ONNX export
+    save_artifacts(model, scaler, le)
+    compiled = export_compiled_model(model, scaler, model_name)
+    onnx_bytes = export_onnx_model(model, scaler, onnx_rows, model_name) if onnx_rows is not None else None
+    return save_model_bundle(model, scaler, le, compiled, model_name, benchmark=benchmark,
+                             onnx_bytes=onnx_bytes, data_path=data_path, reference_rows=reference_rows,
+                             neighbor_records=neighbor_records)["model_version"]
 
-    X_train_sc, X_test_sc, scaler = scale_features(X_train, X_test)
 
-    models = build_models()
+def _raw_predict_proba(model, scaler):
+    def predict_proba(rows):
+        return model.predict_proba(scaler.transform(pd.DataFrame(rows, columns=FEATURE_COLS)))
+    return predict_proba
 
-    cv_results = run_cross_validation(models, X_train_sc, y_train)
 
-    best_model_name = identify_best_model(cv_results)
+def grid_bounds(X):
+    # The grid covers the observed range of every feature in the dataset
+    X = np.asarray(X, dtype=np.float64)
+    return X.min(axis=0), X.max(axis=0)
 
-    trained_models = train_models(models, X_train_sc, y_train)
 
-    evaluate_models(trained_models, X_train_sc, y_train, X_test_sc, y_test, le)
+def build_prediction_grid(model, scaler, X, bins):
+    low, high = grid_bounds(X)
+    n_cells = int(np.prod(np.broadcast_to(bins, len(FEATURE_COLS))))
+    print(f"\nBuilding prediction grid: {bins} bins/feature, {n_cells:,} cells (this may take a moment)...")
+    grid = PredictionGrid.build(
+        _raw_predict_proba(model, scaler), low, high, bins, GRID_PREFIX, top_k=GRID_TOP_K
+    )
+    print(f"Prediction grid saved to {GRID_PREFIX}*.npy ({grid.nbytes / 1e6:.1f} MB)")
+    return grid
 
-    best_model = trained_models[best_model_name]
-    plot_confusion_matrix(best_model, X_test_sc, y_test, le, best_model_name)
 
-    # Feature importances are only available for tree-based models
-    if best_model_name in ["Random Forest", "Decision Tree", "XGBoost"]:
-        print(f"\nGenerating feature importance for the best model ({best_model_name})...")
-        plot_feature_importance(best_model, best_model_name)
-    else:
-        print(f"\nSkipping feature importances because {best_model_name} does not natively support them.")
+def grid_resolution_report(model, scaler, X, X_test, y_test, bins_options=GRID_REPORT_BINS):
+    # Scoring a row at its cell centre is exactly what the grid would serve,
+    # so the report needs no grid materialisation.
+    print("\n" + "=" * 60)
+    print("PREDICTION GRID: ACCURACY vs RESOLUTION (test set)")
+    print("=" * 60)
+    low, high = grid_bounds(X)
+    X_test = np.asarray(X_test, dtype=np.float64)
+    predict_proba = _raw_predict_proba(model, scaler)
+    live_pred = predict_proba(X_test).argmax(axis=1)
+    live_acc = accuracy_score(y_test, model.classes_[live_pred])
+    bytes_per_cell = GRID_TOP_K * (np.dtype(np.uint8).itemsize + np.dtype(np.float16).itemsize)
+
+    rows = []
+    for bins in bins_options:
+        snapped, inside = snap_to_grid(X_test, low, high, bins)
+        grid_pred = predict_proba(snapped).argmax(axis=1)
+        n_cells = bins ** len(FEATURE_COLS)
+        rows.append({
+            "bins_per_feature": bins,
+            "cells": n_cells,
+            "memory_mb": round(n_cells * bytes_per_cell / 1e6, 2),
+            "coverage": round(inside.mean(), 4),
+            "agreement_with_model": round((grid_pred == live_pred).mean(), 4),
+            "accuracy": round(accuracy_score(y_test, model.classes_[grid_pred]), 4),
+        })
+    report = pd.DataFrame(rows)
+    print(f"Live model accuracy: {live_acc:.4f}")
+    print(report.to_string(index=False))
+    report.to_csv(GRID_REPORT_PATH, index=False)
+    print(f"Grid resolution report saved to {GRID_REPORT_PATH}")
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Crop recommendation training pipeline")
+    parser.add_argument(
+        "--data", default=DATASET_PATH,
+        help="Training CSV with the feature columns and a label column",
+    )
+    parser.add_argument(
+        "--large-data", action="store_true",
+        help="Out-of-core mode for CSVs too large for memory: chunked float32 reads, incremental "
+             "scaler, SGD / histogram gradient boosting, streamed held-out evaluation",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+        help="Rows per chunk read in --large-data mode",
+    )
+    parser.add_argument(
+        "--sgd-epochs", type=int, default=SGD_EPOCHS,
+        help="Passes over the training chunks for the SGD model in --large-data mode",
+    )
+    parser.add_argument(
+        "--hgb-max-rows", type=int, default=HGB_MAX_ROWS,
+        help="Training rows (evenly strided) held in memory for HistGradientBoosting in --large-data mode",
+    )
+    parser.add_argument(
+        "--grid-bins", type=int, default=0,
+        help="Build the memory-mapped prediction lookup grid with this many bins per feature (0 = skip)",
+    )
+    parser.add_argument(
+        "--grid-report", action="store_true",
+        help="Report grid accuracy and memory for several resolutions",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=-1,
+        help="Worker processes for cross-validation and training fits (-1 = all cores)",
+    )
+    parser.add_argument(
+        "--no-plots", action="store_true",
+        help="Headless mode for CI/retraining: skip the learning curve and all plot rendering",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Recompute every stage instead of reusing unchanged outputs from the stage cache",
+    )
+    parser.add_argument(
+        "--cache-dir", default=CACHE_DIR,
+        help="Directory of the content-addressed stage cache",
+    )
+    parser.add_argument(
+        "--max-p99-ms", type=float, default=None,
+        help="Selection policy: only pick models whose single-row p99 latency is within this budget",
+    )
+    parser.add_argument(
+        "--max-size-mb", type=float, default=None,
+        help="Selection policy: only pick models whose pickle is at most this many MB",
+    )
+    parser.add_argument(
+        "--compress", action="store_true",
+        help="Drop trees and prune subtrees of the selected forest, writing model_compact.pkl",
+    )
+    parser.add_argument(
+        "--compress-tolerance", type=float, default=0.005,
+        help="Maximum validation accuracy loss allowed by --compress (validation split of the training rows)",
+    )
+    parser.add_argument(
+        "--deploy-compressed", action="store_true",
+        help="Export the compressed forest as the served model (implies --compress)",
+    )
+    parser.add_argument(
+        "--onnx", action="store_true",
+        help="Also export scaler + model as model.onnx (needs skl2onnx; served with CROP_INFERENCE_BACKEND=onnx)",
+    )
+    parser.add_argument(
+        "--search", action="store_true",
+        help="Tune every model family with successive halving before the final CV/training",
+    )
+    parser.add_argument(
+        "--search-candidates", type=int, default=27,
+        help="Hyperparameter candidates per model family in the first halving rung",
+    )
+    parser.add_argument(
+        "--search-results", default=SEARCH_RESULTS_PATH,
+        help="JSON-lines results file; evaluations already in it are reused (resume)",
+    )
+    parser.add_argument(
+        "--latency-weight", type=float, default=LATENCY_WEIGHT,
+        help="Search objective penalty per ms of single-row latency",
+    )
+    parser.add_argument(
+        "--size-weight", type=float, default=SIZE_WEIGHT,
+        help="Search objective penalty per MB of serialized model",
+    )
+    return parser.parse_args(argv)
 
-    print(f"\nGenerating learning curve for the best model ({best_model_name}) (this may take a moment)...")
-    plot_learning_curve(best_model, X_train_sc, y_train, best_model_name)
-    
-    # Save the artifacts for deployment
-    save_artifacts(best_model, scaler, le)
 
+def run_search(scheduler, models, folds, args):
+    print("\n" + "=" * 60)
+    print("SUCCESSIVE-HALVING HYPERPARAMETER SEARCH")
+    print("=" * 60)
+    tuned, summary = search_models(
+        scheduler, models, folds, args.search_results,
+        n_candidates=args.search_candidates,
+        random_state=RANDOM_STATE,
+        latency_weight=args.latency_weight,
+        size_weight=args.size_weight,
+    )
+    print("\nBest configuration per model family:")
+    print(summary.to_string(index=False))
+    summary.to_csv(SEARCH_SUMMARY_PATH, index=False)
+    print(f"Search summary saved to {SEARCH_SUMMARY_PATH} (all evaluations in {args.search_results})")
+    return tuned
+
+
+def run_large_data(args, timings):
+    # Out-of-core variant of the pipeline: the CSV is never held as a
+    # DataFrame. One pass fits the scaler and collects the classes, training
+    # streams scaled float32 chunks and evaluation streams the held-out rows.
+    print(f"Large-data mode: streaming {args.data} in chunks of {args.chunk_size:,} rows")
+    with timed_stage("Scan + incremental scaler", timings):
+        dataset = StreamingDataset(args.data, FEATURE_COLS, TARGET_COL, TEST_SIZE, RANDOM_STATE, args.chunk_size)
+    print(f"Train rows: {dataset.n_train:,}, Test rows: {dataset.n_test:,}, Classes: {len(dataset.classes)}")
+    print(f"Class distribution:\n{dataset.class_counts.to_string()}")
+
+    print("\n" + "=" * 60)
+    print("OUT-OF-CORE TRAINING")
+    print("=" * 60)
+    with timed_stage("Training", timings):
+        trained_models, _ = train_large_models(
+            build_large_models(RANDOM_STATE), dataset, epochs=args.sgd_epochs, hgb_max_rows=args.hgb_max_rows
+        )
+
+    print("\n" + "=" * 60)
+    print("STREAMED HELD-OUT EVALUATION")
+    print("=" * 60)
+    with timed_stage("Evaluation", timings):
+        results = evaluate_streaming(trained_models, dataset)
+    for name, result in results.items():
+        print(f"\n--- {name} ---")
+        print(f"Test Accuracy  : {result['test_accuracy']:.4f}")
+        print(result["report"])
+
+    best_model_name = max(results, key=lambda n: results[n]["test_accuracy"])
+    print("\n" + "=" * 60)
+    print(f"BEST MODEL (by held-out accuracy): {best_model_name}")
+    print("=" * 60)
+
+    le = LabelEncoder()
+    le.classes_ = dataset.classes
+    with timed_stage("Export artifacts", timings):
+        export_artifacts(trained_models[best_model_name], dataset.scaler, le, best_model_name,
+                         onnx_rows=dataset.raw_rows("test", 2000) if args.onnx else None, data_path=args.data,
+                         reference_rows=dataset.raw_rows("train", DRIFT_REFERENCE_ROWS))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    timings = {}
+    if args.large_data:
+        run_large_data(args, timings)
+        print_stage_timings(timings)
+        print("\n✅ Pipeline completed.")
+        return
+
+    # Every stage is keyed on the CSV hash, its parameters and the digests of
+    # the stages it reads from, so a rerun only recomputes what changed.
+    cache = StageCache(args.cache_dir, enabled=not args.no_cache)
+    dataset_hash = file_sha256(args.data)
+
+    with timed_stage("Load + preprocess", timings):
+        data = cache.run(
+            "data",
+            {"dataset": dataset_hash, "features": FEATURE_COLS, "target": TARGET_COL,
+             "test_size": TEST_SIZE, "random_state": RANDOM_STATE},
+            [],
+            lambda: prepare_data(args.data),
+        )
+    X, y, le, X_train, X_test, y_train, y_test, X_train_sc, X_test_sc, scaler = data.value
+
+    models = build_models()
+    folds = cv_splits(X_train_sc, y_train)
+    upstream = [data.digest]
+
+    with TrainingScheduler(X_train_sc, y_train, n_jobs=args.jobs) as scheduler:
+        if args.search:
+            with timed_stage("Hyperparameter search", timings):
+                search = cache.run(
+                    "search",
+                    {"spaces": SEARCH_SPACES, "candidates": args.search_candidates,
+                     "latency_weight": args.latency_weight, "size_weight": args.size_weight,
+                     "models": model_params(models)},
+                    upstream,
+                    lambda: run_search(scheduler, models, folds, args),
+                )
+            models = search.value
+            upstream = upstream + [search.digest]
+
+        with timed_stage("Cross-validation + training", timings):
+            training = cache.run(
+                "train",
+                {"models": model_params(models), "cv_folds": CV_FOLDS},
+                upstream,
+                lambda: fit_models(scheduler, models, folds, len(X_train_sc)),
+            )
+        cv_results, cv_fits, trained_models = training.value
+
+        with timed_stage("Inference benchmark", timings):
+            benchmark = cache.run(
+                "benchmark", {}, [data.digest, training.digest],
+                lambda: run_benchmark(trained_models, scaler, X_test, cv_results),
+                outputs=[BENCHMARK_PATH],
+            )
+
+        best_model_name = identify_best_model(
+            cv_results, benchmark.value, max_p99_ms=args.max_p99_ms, max_size_mb=args.max_size_mb
+        )
+        best_model = trained_models[best_model_name]
+        trained = [data.digest, training.digest]
+
+        with timed_stage("Evaluation", timings):
+            evaluation = cache.run(
+                "evaluate", {}, trained,
+                lambda: evaluate_models(trained_models, X_train_sc, y_train, X_test_sc, y_test, le),
+            )
+        eval_results = evaluation.value
+
+        if args.no_plots:
+            print("\nHeadless mode: skipping plots and learning curve.")
+        else:
+            with timed_stage("Plots", timings):
+                cache.run(
+                    "confusion_matrix", {"model": best_model_name}, [evaluation.digest],
+                    lambda: plot_confusion_matrix(eval_results[best_model_name]["y_pred"], y_test, le, best_model_name),
+                    outputs=["confusion_matrix.png"],
+                )
+
+                # Feature importances are only available for tree-based models
+                if best_model_name in ["Random Forest", "Decision Tree", "XGBoost"]:
+                    print(f"\nGenerating feature importance for the best model ({best_model_name})...")
+                    cache.run(
+                        "feature_importance", {"model": best_model_name}, trained,
+                        lambda: plot_feature_importance(best_model, best_model_name),
+                        outputs=["feature_importance.png"],
+                    )
+                else:
+                    print(f"\nSkipping feature importances because {best_model_name} does not natively support them.")
+
+            with timed_stage("Learning curve", timings):
+                print(f"\nGenerating learning curve for the best model ({best_model_name}) (this may take a moment)...")
+                curve = cache.run(
+                    "learning_curve_scores",
+                    {"model": best_model_name, "train_sizes": LEARNING_CURVE_SIZES.tolist()},
+                    trained,
+                    lambda: learning_curve_scores(scheduler, models[best_model_name], folds, cv_fits[best_model_name]),
+                )
+                cache.run(
+                    "learning_curve", {"model": best_model_name}, [curve.digest],
+                    lambda: plot_learning_curve(*curve.value, best_model_name),
+                    outputs=["learning_curve.png"],
+                )
+
+    deployed_model, deployed = best_model, trained
+    if (args.compress or args.deploy_compressed) and supports_compression(best_model):
+        with timed_stage("Forest compression", timings):
+            compression = cache.run(
+                "compress",
+                {"model": best_model_name, "tolerance": args.compress_tolerance, "val_size": VALIDATION_SIZE},
+                trained,
+                lambda: compress_model(best_model, scaler, X_train_sc, y_train, X_test, X_test_sc, y_test,
+                                       args.compress_tolerance),
+                outputs=[COMPACT_MODEL_PATH, COMPRESSION_REPORT_PATH],
+            )
+        if args.deploy_compressed:
+            deployed_model, deployed = compression.value[0], trained + [compression.digest]
+    elif args.compress or args.deploy_compressed:
+        print(f"\nSkipping compression: {best_model_name} is not a tree forest.")
+
+    with timed_stage("Export artifacts", timings):
+        # Skipped when unchanged, so the API's watcher does not reload an identical model
+        export = cache.run(
+            "export", {"model": best_model_name, "onnx": args.onnx, "feature_stats": True, "neighbors": True},
+            deployed + [benchmark.digest],
+            lambda: export_artifacts(deployed_model, scaler, le, best_model_name, benchmark.value,
+                                     onnx_rows=X_test if args.onnx else None, data_path=args.data,
+                                     reference_rows=X_train, neighbor_records=(X, le.inverse_transform(y))),
+            outputs=["model.pkl", "scaler.pkl", "label_encoder.pkl", os.path.join(BUNDLE_PATH, POINTER_NAME)]
+            + ([COMPILED_MODEL_PATH] if can_compile(deployed_model) else [])
+            + ([ONNX_MODEL_PATH] if args.onnx else []),
+        )
+
+    if args.grid_report:
+        with timed_stage("Grid report", timings):
+            cache.run(
+                "grid_report", {"bins": GRID_REPORT_BINS}, deployed + [export.digest],
+                lambda: grid_resolution_report(deployed_model, scaler, X, X_test, y_test),
+                outputs=[GRID_REPORT_PATH],
+            )
+    if args.grid_bins > 0:
+        with timed_stage("Prediction grid", timings):
+            cache.run(
+                "prediction_grid", {"bins": args.grid_bins, "top_k": GRID_TOP_K}, deployed + [export.digest],
+                lambda: build_prediction_grid(deployed_model, scaler, X, args.grid_bins).n_cells,
+                outputs=list(grid_paths(GRID_PREFIX)),
+            )
+
+    print_stage_timings(timings)
     print("\n✅ Pipeline completed.")
 
 
@@ -0,0 +1,125 @@
+import copy
+import os
+import tempfile
+import time
+
+import joblib
+import numpy as np
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+
+
+# Minimum node sample counts tried when pruning subtrees, smallest first
+PRUNE_THRESHOLDS = [2, 3, 4, 6, 8, 12, 16, 24, 32, 48, 64]
+# Share of the training rows held out to choose trees and the pruning threshold
+VALIDATION_SIZE = 0.2
+
+
+def supports_compression(model):
+    return hasattr(model, "estimators_") and all(hasattr(est, "tree_") for est in model.estimators_)
+
+
+def forest_stats(model):
+    trees = [est.tree_ for est in model.estimators_]
+    return {"trees": len(trees), "nodes": int(sum(t.node_count for t in trees))}
+
+
+def select_trees(tree_probs, y, classes, target_accuracy, min_trees=1):
+    """
+    Forward greedy selection: repeatedly add the tree that most improves the
+    accuracy of the averaged probabilities (ties: highest mean probability on
+    the true class) until the subset reaches target_accuracy.
+    tree_probs has shape (n_trees, n_rows, n_classes).
+    """
+    n_trees = tree_probs.shape[0]
+    y_col = np.searchsorted(classes, y)
+    rows = np.arange(len(y))
+    selected = []
+    total = np.zeros(tree_probs.shape[1:])
+    remaining = list(range(n_trees))
+    while remaining:
+        # Score every candidate subset selected + [t] at once
+        candidates = (total[None] + tree_probs[remaining]) / (len(selected) + 1)
+        accuracy = (candidates.argmax(axis=2) == y_col).mean(axis=1)
+        margin = candidates[:, rows, y_col].mean(axis=1)
+        best = max(range(len(remaining)), key=lambda i: (accuracy[i], margin[i]))
+        tree = remaining.pop(best)
+        selected.append(tree)
+        total += tree_probs[tree]
+        if len(selected) >= min_trees and accuracy[best] >= target_accuracy:
+            break
+    return selected
+
+
+def build_forest(forest, selected):
+    """Copy of a fitted forest restricted to the selected trees."""
+    compact = copy.copy(forest)
+    compact.estimators_ = [forest.estimators_[i] for i in selected]
+    compact.n_estimators = len(selected)
+    return compact
+
+
+def compress_forest(model, X_train, y_train, tolerance=0.005, min_trees=10, val_size=VALIDATION_SIZE,
+                    random_state=0):
+    """
+    Greedily drops trees, then prunes low-sample subtrees, keeping accuracy
+    within `tolerance` of the full forest. Choices are made on a validation
+    split of the training rows, never on the test set: a copy of `model` is
+    refitted on the rest, and the compact model is taken from that copy. At
+    least `min_trees` are kept so the subset is not fitted to a handful of rows.
+
+    Pruning refits the copy with min_samples_split raised: with a fixed
+    random_state tree i draws the same bootstrap sample and seed, so it is
+    the same tree grown only until nodes hold fewer than that many samples.
+    Returns (compact model, {"baseline_accuracy", "accuracy" (both on the
+    validation split), "fit_rows", "trees", "min_samples"}).
+    """
+    X_fit, X_val, y_fit, y_val = train_test_split(
+        np.asarray(X_train, dtype=np.float32), y_train,
+        test_size=val_size, random_state=random_state, stratify=y_train,
+    )
+    reference = clone(model)
+    if reference.get_params().get("random_state") is None:
+        reference.set_params(random_state=random_state)
+    forest = clone(reference).fit(X_fit, y_fit)
+    baseline = accuracy_score(y_val, forest.predict(X_val))
+    target = baseline - tolerance
+
+    tree_probs = np.stack([est.predict_proba(X_val) for est in forest.estimators_])
+    selected = select_trees(tree_probs, y_val, forest.classes_, target,
+                            min_trees=min(min_trees, len(forest.estimators_)))
+    compact = build_forest(forest, selected)
+    accuracy = accuracy_score(y_val, compact.predict(X_val))
+
+    # Largest subtree-pruning threshold that still meets the target
+    best_min_samples = None
+    for min_samples in PRUNE_THRESHOLDS:
+        pruned = clone(reference).set_params(min_samples_split=min_samples).fit(X_fit, y_fit)
+        candidate = build_forest(pruned, selected)
+        candidate_accuracy = accuracy_score(y_val, candidate.predict(X_val))
+        if candidate_accuracy < target:
+            break
+        compact, accuracy, best_min_samples = candidate, candidate_accuracy, min_samples
+
+    return compact, {
+        "baseline_accuracy": baseline,
+        "accuracy": accuracy,
+        "fit_rows": len(y_fit),
+        "trees": selected,
+        "min_samples": best_min_samples,
+    }
+
+
+def load_time_ms(model, repeats=3):
+    """Median joblib.load time of the model written to a temporary file, and the file size in MB."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.pkl")
+        joblib.dump(model, path)
+        size_mb = os.path.getsize(path) / 1e6
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            joblib.load(path)
+            timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000), size_mb
@@ -0,0 +1,212 @@
+import hashlib
+import json
+import math
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.model_selection import ParameterGrid, ParameterSampler
+
+from tree_engine import compile_model
+
+
+# Hyperparameters explored per model family (keys match crop_pipeline.build_models)
+SEARCH_SPACES = {
+    "Logistic Regression": {
+        "C": [0.1, 1.0, 10.0, 100.0],
+    },
+    "Decision Tree": {
+        "max_depth": [5, 8, 10, 15, None],
+        "min_samples_leaf": [1, 2, 5],
+    },
+    "Random Forest": {
+        "n_estimators": [10, 25, 50, 100, 200],
+        "max_depth": [None, 8, 12, 16],
+        "max_features": ["sqrt", 0.5],
+        "min_samples_leaf": [1, 2],
+    },
+    "XGBoost": {
+        "n_estimators": [25, 50, 100, 200],
+        "max_depth": [3, 4, 6],
+        "learning_rate": [0.05, 0.1, 0.3],
+    },
+}
+
+HALVING_FACTOR = 3
+# Smallest training subset a rung may use (every class needs a few rows)
+MIN_RESOURCES = 200
+LATENCY_REPEATS = 50
+
+# Objective = CV accuracy - LATENCY_WEIGHT * single-row ms - SIZE_WEIGHT * MB,
+# i.e. by default 1 ms of latency costs 0.2 accuracy points, 1 MB costs 0.1.
+LATENCY_WEIGHT = 0.002
+SIZE_WEIGHT = 0.001
+
+
+def candidate_params(space, n_candidates, random_state):
+    """Every combination when the grid is small enough, otherwise a seeded sample (stable across resumes)."""
+    grid = ParameterGrid(space)
+    if len(grid) <= n_candidates:
+        return list(grid)
+    return list(ParameterSampler(space, n_iter=n_candidates, random_state=random_state))
+
+
+def halving_schedule(n_candidates, n_max, factor=HALVING_FACTOR, min_resources=MIN_RESOURCES):
+    """Training rows per rung; the last rung always uses the full training fold."""
+    n_rungs = 1 + max(0, math.ceil(math.log(max(n_candidates, 1), factor)))
+    # Drop early rungs that would go below min_resources
+    while n_rungs > 1 and n_max / factor ** (n_rungs - 1) < min_resources:
+        n_rungs -= 1
+    return [int(n_max / factor ** (n_rungs - 1 - i)) for i in range(n_rungs)]
+
+
+def single_row_latency_ms(model, X, repeats=LATENCY_REPEATS):
+    """Median single-row latency of the backend api.py would serve (compiled trees when possible)."""
+    try:
+        predict_proba = compile_model(model).predict_proba
+    except TypeError:
+        predict_proba = model.predict_proba
+    rows = X[np.arange(repeats) % len(X)][:, None, :]
+    predict_proba(rows[0])
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        predict_proba(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def model_size_mb(model):
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)) / 1e6
+
+
+def objective(accuracy, latency_ms, size_mb, latency_weight=LATENCY_WEIGHT, size_weight=SIZE_WEIGHT):
+    return accuracy - latency_weight * latency_ms - size_weight * size_mb
+
+
+def data_fingerprint(X, y, folds):
+    """Hash of the training matrix, labels and fold indices; results are only reused for the same data."""
+    digest = hashlib.sha256()
+    for array in (X, y, *(idx for fold in folds for idx in fold)):
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype}{array.shape}".encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _record_key(family, params, resources, data):
+    return family, json.dumps(params, sort_keys=True), int(resources), data
+
+
+class SearchResults:
+    """
+    Append-only JSON-lines log of evaluated (family, params, resources, data
+    fingerprint); lets a search resume. Records of other data are ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.records[self._key(record)] = record
+
+    @staticmethod
+    def _key(record):
+        return _record_key(record["family"], record["params"], record["resources"], record.get("data"))
+
+    def get(self, family, params, resources, data):
+        return self.records.get(_record_key(family, params, resources, data))
+
+    def add(self, record):
+        self.records[self._key(record)] = record
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+
+def successive_halving(scheduler, family, estimator, folds, results, n_candidates=27,
+                       random_state=42, latency_weight=LATENCY_WEIGHT, size_weight=SIZE_WEIGHT, data=None):
+    """
+    Evaluates candidates on growing training subsets and keeps the best
+    1/HALVING_FACTOR at each rung. All (candidate x fold) fits of a rung run
+    on the scheduler's pool at once; latencies are measured one model at a
+    time once the rung's fits are done, so they do not compete with fits for
+    CPU. `data` is the data_fingerprint results are stored and resumed under.
+    Returns the rung records of the winner.
+    """
+    candidates = candidate_params(SEARCH_SPACES[family], n_candidates, random_state)
+    schedule = halving_schedule(len(candidates), len(folds[0][0]))
+    print(f"\n{family}: {len(candidates)} candidates, rungs of {schedule} training rows")
+
+    for rung, resources in enumerate(schedule):
+        pending = {}
+        rung_records = []
+        for i, params in enumerate(candidates):
+            cached = results.get(family, params, resources, data)
+            if cached is not None:
+                rung_records.append(cached)
+                continue
+            model = clone(estimator).set_params(**params)
+            pending[i] = [scheduler.submit(model, train_idx[:resources], val_idx) for train_idx, val_idx in folds]
+
+        rung_fits = {i: [future.result() for future in futures] for i, futures in pending.items()}
+        for i, fits in rung_fits.items():
+            accuracy = float(np.mean([fit.val_score for fit in fits]))
+            latency_ms = single_row_latency_ms(fits[0].estimator, scheduler.X)
+            size_mb = model_size_mb(fits[0].estimator)
+            record = {
+                "family": family,
+                "params": candidates[i],
+                "data": data,
+                "rung": rung,
+                "resources": int(resources),
+                "cv_accuracy": round(accuracy, 5),
+                "latency_ms": round(latency_ms, 4),
+                "size_mb": round(size_mb, 4),
+                "fit_seconds": round(sum(fit.fit_seconds for fit in fits), 3),
+            }
+            results.add(record)
+            rung_records.append(record)
+
+        for record in rung_records:
+            record["objective"] = objective(record["cv_accuracy"], record["latency_ms"], record["size_mb"],
+                                            latency_weight, size_weight)
+        rung_records.sort(key=lambda r: r["objective"], reverse=True)
+        resumed = len(candidates) - len(pending)
+        best = rung_records[0]
+        print(f"  rung {rung} ({resources} rows, {len(candidates)} candidates, {resumed} resumed): "
+              f"best acc {best['cv_accuracy']:.4f}, {best['latency_ms']:.3f} ms, {best['size_mb']:.3f} MB")
+        if rung < len(schedule) - 1:
+            keep = max(1, math.ceil(len(candidates) / HALVING_FACTOR))
+            candidates = [r["params"] for r in rung_records[:keep]]
+
+    return rung_records
+
+
+def search_models(scheduler, models, folds, results_path, n_candidates=27, random_state=42,
+                  latency_weight=LATENCY_WEIGHT, size_weight=SIZE_WEIGHT):
+    """
+    Runs successive halving for every family in `models` and returns
+    ({name: estimator with the winning params}, summary DataFrame).
+    """
+    results = SearchResults(results_path)
+    data = data_fingerprint(scheduler.X, scheduler.y, folds)
+    tuned, rows = {}, []
+    for family, estimator in models.items():
+        if family not in SEARCH_SPACES:
+            tuned[family] = estimator
+            continue
+        finalists = successive_halving(scheduler, family, estimator, folds, results, n_candidates,
+                                       random_state, latency_weight, size_weight, data)
+        best = finalists[0]
+        tuned[family] = clone(estimator).set_params(**best["params"])
+        rows.append({"model": family, **{k: best[k] for k in
+                     ("params", "cv_accuracy", "latency_ms", "size_mb", "objective")}})
+    return tuned, pd.DataFrame(rows)
@@ -0,0 +1,209 @@
+import time
+import itertools
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+from sklearn.linear_model import SGDClassifier
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.metrics import classification_report
+
+
+DEFAULT_CHUNK_SIZE = 200_000
+# Passes of SGD partial_fit over the training chunks
+SGD_EPOCHS = 3
+# Training rows kept in memory for the histogram-based booster (evenly strided
+# over the file). Its gradients take rows x classes x 16 bytes, so this bounds
+# peak memory; the rest of the file only feeds the scaler and SGD.
+HGB_MAX_ROWS = 250_000
+
+
+def chunk_offsets(path, chunk_size):
+    """
+    Byte offset of the first row of every chunk_size-row block below the
+    header, so chunks can be read in any order. Assumes one line per row
+    (no quoted line breaks), as in the numeric crop CSVs.
+    """
+    offsets = []
+    with open(path, "rb") as f:
+        f.readline()
+        for row in itertools.count():
+            pos = f.tell()
+            if not f.readline():
+                break
+            if row % chunk_size == 0:
+                offsets.append(pos)
+    return offsets
+
+
+def _parse_chunk(chunk, start, feature_cols, target_col, classes):
+    ids = np.arange(start, start + len(chunk), dtype=np.int64)
+    keep = chunk.notna().all(axis=1).to_numpy()
+    X = chunk[list(feature_cols)].to_numpy(np.float32)[keep]
+    labels = chunk[target_col][keep]
+    if classes is not None:
+        labels = pd.Categorical(labels, categories=classes).codes.astype(np.int16)
+    return ids[keep], X, labels
+
+
+def read_chunks(path, feature_cols, target_col, chunk_size, classes=None, order=None, offsets=None):
+    """
+    Yields (row ids, float32 features, labels) per chunk. Labels are read as a
+    pandas categorical; with `classes` they come back as int16 codes into it.
+    Rows with missing values are dropped. With `order` (chunk indices) and the
+    matching chunk_offsets(), chunks are read in that order instead of file order.
+    """
+    dtypes = {col: np.float32 for col in feature_cols}
+    dtypes[target_col] = "category"
+    usecols = list(feature_cols) + [target_col]
+    if order is None:
+        start = 0
+        for chunk in pd.read_csv(path, usecols=usecols, dtype=dtypes, chunksize=chunk_size):
+            yield _parse_chunk(chunk, start, feature_cols, target_col, classes)
+            start += len(chunk)
+        return
+    names = list(pd.read_csv(path, nrows=0).columns)
+    with open(path, "rb") as f:
+        for index in order:
+            f.seek(offsets[index])
+            chunk = pd.read_csv(f, header=None, names=names, usecols=usecols, dtype=dtypes, nrows=chunk_size)
+            yield _parse_chunk(chunk, index * chunk_size, feature_cols, target_col, classes)
+
+
+def is_test_row(row_ids, test_size, seed):
+    """
+    Deterministic held-out split on the row position (multiplicative hash), so
+    every pass over the file sees the same split without storing it.
+    """
+    h = (row_ids.astype(np.uint64) * np.uint64(2654435761) + np.uint64(seed)) % np.uint64(2 ** 32)
+    return h < np.uint64(int(test_size * 2 ** 32))
+
+
+class StreamingDataset:
+    """
+    A labelled CSV too large to hold as a DataFrame: one pass collects the
+    classes, split sizes and an incrementally fitted scaler, and later passes
+    stream scaled float32 chunks of the train or test split.
+    """
+
+    def __init__(self, path, feature_cols, target_col, test_size, seed, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.path = path
+        self.feature_cols = list(feature_cols)
+        self.target_col = target_col
+        self.test_size = test_size
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self._offsets = None
+
+        self.scaler = StandardScaler()
+        labels, counts = set(), {}
+        self.n_train = self.n_test = 0
+        for ids, X, y in read_chunks(path, self.feature_cols, target_col, chunk_size):
+            test = is_test_row(ids, test_size, seed)
+            if (~test).any():
+                self.scaler.partial_fit(X[~test])
+            self.n_train += int((~test).sum())
+            self.n_test += int(test.sum())
+            for label, count in y.value_counts().items():
+                counts[label] = counts.get(label, 0) + int(count)
+            labels.update(y.cat.categories)
+        self.classes = np.array(sorted(label for label in labels if counts.get(label)))
+        self.class_counts = pd.Series({label: counts[label] for label in self.classes})
+
+    @property
+    def offsets(self):
+        if self._offsets is None:
+            self._offsets = chunk_offsets(self.path, self.chunk_size)
+        return self._offsets
+
+    def chunks(self, split, order=None):
+        """
+        Yields (scaled float32 features, int16 label codes) of the "train" or
+        "test" split, in file order or in the given order of chunk indices
+        (0 .. len(self.offsets) - 1).
+        """
+        offsets = self.offsets if order is not None else None
+        for ids, X, y in read_chunks(self.path, self.feature_cols, self.target_col, self.chunk_size, self.classes,
+                                     order, offsets):
+            test = is_test_row(ids, self.test_size, self.seed)
+            rows = test if split == "test" else ~test
+            if rows.any():
+                yield self.scaler.transform(X[rows]).astype(np.float32), y[rows]
+
+    def raw_rows(self, split, n_rows):
+        """The first n_rows unscaled rows of the "train" or "test" split (export checks, drift reference)."""
+        collected, total = [], 0
+        for ids, X, _ in read_chunks(self.path, self.feature_cols, self.target_col, self.chunk_size):
+            test = is_test_row(ids, self.test_size, self.seed)
+            rows = X[test if split == "test" else ~test]
+            collected.append(rows[:n_rows - total])
+            total += len(collected[-1])
+            if total >= n_rows:
+                break
+        return np.concatenate(collected) if collected else np.empty((0, len(self.feature_cols)), np.float32)
+
+
+def build_large_models(seed):
+    return {
+        "SGD Logistic Regression": SGDClassifier(loss="log_loss", alpha=1e-5, random_state=seed),
+        "HistGradientBoosting": HistGradientBoostingClassifier(max_iter=100, early_stopping=False, random_state=seed),
+    }
+
+
+def fit_sgd(model, dataset, epochs=SGD_EPOCHS):
+    # Files are often sorted by label; in file order SGD drifts toward the last
+    # classes it sees, so every epoch visits the chunks and their rows in a new
+    # (seeded) order
+    rng = np.random.default_rng(dataset.seed)
+    codes = np.arange(len(dataset.classes))
+    for _ in range(epochs):
+        for X, y in dataset.chunks("train", order=rng.permutation(len(dataset.offsets))):
+            rows = rng.permutation(len(X))
+            model.partial_fit(X[rows], y[rows], classes=codes)
+    return model
+
+
+def fit_hist_gradient_boosting(model, dataset, max_rows=HGB_MAX_ROWS):
+    # Every stride-th training row, at most max_rows of them, as one float32 matrix
+    stride = max(1, int(np.ceil(dataset.n_train / max_rows)))
+    X_parts, y_parts, seen = [], [], 0
+    for X, y in dataset.chunks("train"):
+        take = (np.arange(seen, seen + len(X)) % stride) == 0
+        seen += len(X)
+        X_parts.append(X[take])
+        y_parts.append(y[take])
+    X, y = np.concatenate(X_parts), np.concatenate(y_parts)
+    del X_parts, y_parts
+    print(f"  HistGradientBoosting on {len(X):,} of {dataset.n_train:,} training rows (stride {stride})")
+    return model.fit(X, y)
+
+
+def train_large_models(models, dataset, epochs=SGD_EPOCHS, hgb_max_rows=HGB_MAX_ROWS):
+    trained, fit_seconds = {}, {}
+    for name, model in models.items():
+        start = time.perf_counter()
+        if hasattr(model, "partial_fit"):
+            trained[name] = fit_sgd(model, dataset, epochs)
+        else:
+            trained[name] = fit_hist_gradient_boosting(model, dataset, hgb_max_rows)
+        fit_seconds[name] = time.perf_counter() - start
+        print(f"  {name:<26}: fitted in {fit_seconds[name]:.1f} s")
+    return trained, fit_seconds
+
+
+def evaluate_streaming(trained_models, dataset):
+    """Test accuracy and classification report of every model, over one streamed pass of the held-out split."""
+    y_true, y_pred = [], {name: [] for name in trained_models}
+    for X, y in dataset.chunks("test"):
+        y_true.append(y)
+        for name, model in trained_models.items():
+            y_pred[name].append(model.predict(X).astype(np.int16))
+    y_true = np.concatenate(y_true)
+    labels = np.arange(len(dataset.classes))
+    results = {}
+    for name, parts in y_pred.items():
+        pred = np.concatenate(parts)
+        results[name] = {
+            "test_accuracy": float((pred == y_true).mean()),
+            "report": classification_report(y_true, pred, labels=labels, target_names=dataset.classes, zero_division=0),
+        }
+    return results
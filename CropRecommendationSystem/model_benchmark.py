@@ -0,0 +1,98 @@
+import importlib
+import os
+import sys
+import pickle
+import tempfile
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from tree_engine import compile_model
+
+# Shared helpers live in the repo-root `common` package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.model_bundle import process_memory
+
+
+SINGLE_ROW_REPEATS = 300
+BATCH_SIZE = 256
+BATCH_REPEATS = 30
+
+
+def served_predict_proba(model, scaler, feature_cols):
+    """
+    The scoring path api.py would use for this model: the compiled forest on
+    raw rows for tree models, scaler + predict_proba otherwise.
+    """
+    try:
+        return "compiled", compile_model(model, scaler).predict_proba
+    except TypeError:
+        def predict_proba(rows):
+            return model.predict_proba(scaler.transform(pd.DataFrame(rows, columns=feature_cols)))
+        return "sklearn", predict_proba
+
+
+def latency_percentiles(predict_proba, batches, repeats):
+    """p50/p99 milliseconds of predict_proba over `repeats` calls cycling through `batches`."""
+    predict_proba(batches[0])
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        batch = batches[i % len(batches)]
+        start = time.perf_counter()
+        predict_proba(batch)
+        timings[i] = time.perf_counter() - start
+    p50, p99 = np.percentile(timings * 1000, [50, 99])
+    return float(p50), float(p99)
+
+
+def _loaded_rss(path, module):
+    # Import the estimator's module first so only the model itself is counted
+    importlib.import_module(module)
+    before = process_memory()["rss_mb"]
+    model = joblib.load(path)
+    after = process_memory()["rss_mb"]
+    del model
+    # None where the platform has no current-RSS figure
+    return after - before if before is not None and after is not None else None
+
+
+def loaded_rss_mb(model):
+    """RSS growth of a fresh interpreter when it loads the pickled model."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.pkl")
+        joblib.dump(model, path)
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as pool:
+            return pool.submit(_loaded_rss, path, type(model).__module__).result()
+
+
+def _round(value, digits):
+    return round(value, digits) if value is not None else None
+
+
+def benchmark_models(models, scaler, X_raw, feature_cols):
+    """One row per model: backend, p50/p99 single-row and batch latency, pickle size, loaded RSS."""
+    X_raw = np.asarray(X_raw, dtype=np.float64)
+    singles = [X_raw[i:i + 1] for i in range(len(X_raw))]
+    reps = int(np.ceil(BATCH_SIZE / len(X_raw)))
+    batches = [np.tile(X_raw, (reps, 1))[:BATCH_SIZE]]
+
+    rows = []
+    for name, model in models.items():
+        backend, predict_proba = served_predict_proba(model, scaler, feature_cols)
+        single_p50, single_p99 = latency_percentiles(predict_proba, singles, SINGLE_ROW_REPEATS)
+        batch_p50, batch_p99 = latency_percentiles(predict_proba, batches, BATCH_REPEATS)
+        rows.append({
+            "model": name,
+            "backend": backend,
+            "single_p50_ms": round(single_p50, 4),
+            "single_p99_ms": round(single_p99, 4),
+            f"batch{BATCH_SIZE}_p50_ms": round(batch_p50, 3),
+            f"batch{BATCH_SIZE}_p99_ms": round(batch_p99, 3),
+            "pickle_mb": round(len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)) / 1e6, 3),
+            "loaded_rss_mb": _round(loaded_rss_mb(model), 2),
+        })
+    return pd.DataFrame(rows).set_index("model")
@@ -0,0 +1,79 @@
+import os
+import numpy as np
+
+
+# Optional dependencies: skl2onnx (+ onnxmltools for XGBoost) to export,
+# onnxruntime to serve. Neither is needed by the default backends.
+ONNX_OPSET = {"": 17, "ai.onnx.ml": 3}
+INPUT_NAME = "input"
+PROBA_OUTPUT = "probabilities"
+# Threads per ONNX session; 1 suits several uvicorn workers per host
+ONNX_THREADS = int(os.getenv("CROP_ONNX_THREADS", "1"))
+
+
+def _register_xgboost():
+    from onnxmltools.convert.xgboost.operator_converters.XGBoost import convert_xgboost
+    from skl2onnx import update_registered_converter
+    from skl2onnx.common.shape_calculator import calculate_linear_classifier_output_shapes
+    from xgboost import XGBClassifier
+
+    update_registered_converter(
+        XGBClassifier, "XGBoostXGBClassifier",
+        calculate_linear_classifier_output_shapes, convert_xgboost,
+        options={"nocl": [True, False], "zipmap": [True, False, "columns"]},
+    )
+
+
+def export_onnx(model, scaler, n_features):
+    """
+    Converts scaler + classifier into one ONNX graph that takes raw float32
+    feature rows and outputs `label` and `probabilities` (columns = model.classes_).
+    Returns the serialized graph.
+    """
+    try:
+        from skl2onnx import convert_sklearn
+        from skl2onnx.common.data_types import FloatTensorType
+        from sklearn.pipeline import Pipeline
+    except ImportError as e:
+        raise ImportError("ONNX export needs skl2onnx: pip install skl2onnx onnxmltools") from e
+    if hasattr(model, "get_booster"):
+        _register_xgboost()
+
+    pipeline = Pipeline([("scaler", scaler), ("model", model)])
+    graph = convert_sklearn(
+        pipeline,
+        initial_types=[(INPUT_NAME, FloatTensorType([None, n_features]))],
+        options={id(model): {"zipmap": False}},
+        target_opset=ONNX_OPSET,
+    )
+    return graph.SerializeToString()
+
+
+class OnnxModel:
+    """onnxruntime CPU session scoring raw feature rows."""
+
+    def __init__(self, model_bytes_or_path):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("The onnx backend needs onnxruntime: pip install onnxruntime") from e
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(
+            model_bytes_or_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+
+    def predict_proba(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return self.session.run([PROBA_OUTPUT], {INPUT_NAME: X})[0].astype(np.float64)
+
+
+def parity_check(onnx_model, reference_predict_proba, X):
+    """Argmax agreement and largest probability difference between ONNX and the reference model."""
+    expected = reference_predict_proba(X)
+    actual = onnx_model.predict_proba(X)
+    return {
+        "rows": len(X),
+        "argmax_agreement": float((expected.argmax(axis=1) == actual.argmax(axis=1)).mean()),
+        "max_abs_prob_diff": float(np.abs(expected - actual).max()),
+    }
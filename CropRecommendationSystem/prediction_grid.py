@@ -0,0 +1,128 @@
+import json
+import os
+import numpy as np
+
+
+# A grid is stored as three files sharing a prefix:
+#   <prefix>.json          bounds, bins per feature and top_k
+#   <prefix>_classes.npy   (n_cells, top_k) class column indices, best first
+#   <prefix>_probs.npy     (n_cells, top_k) float16 probabilities
+# The .npy files are opened memory-mapped, so every worker shares the same pages.
+
+
+def grid_paths(prefix):
+    """The grid's metadata, class and probability files for `prefix`."""
+    return f"{prefix}.json", f"{prefix}_classes.npy", f"{prefix}_probs.npy"
+
+
+def _as_bins(bins, n_features):
+    bins = np.broadcast_to(np.asarray(bins, dtype=np.int64), (n_features,))
+    if (bins < 1).any():
+        raise ValueError("Every feature needs at least one bin.")
+    return bins.copy()
+
+
+def _span(low, high):
+    # Constant features collapse to a single cell instead of dividing by zero
+    return np.where(high > low, high - low, 1.0)
+
+
+def cell_coordinates(X, low, high, bins):
+    """Per-feature bin index of every row, and whether the row lies inside the grid bounds."""
+    X = np.asarray(X, dtype=np.float64)
+    inside = ((X >= low) & (X <= high)).all(axis=1)
+    coords = np.floor((X - low) / _span(low, high) * bins).astype(np.int64)
+    # The upper bound belongs to the last bin
+    coords = np.clip(coords, 0, bins - 1)
+    return coords, inside
+
+
+def cell_centers(coords, low, high, bins):
+    """Feature values at the centre of each cell."""
+    return low + (coords + 0.5) * _span(low, high) / bins
+
+
+def snap_to_grid(X, low, high, bins):
+    """Replaces every in-range row by its cell centre, i.e. what the grid would have scored."""
+    coords, inside = cell_coordinates(X, low, high, bins)
+    snapped = np.array(X, dtype=np.float64)
+    snapped[inside] = cell_centers(coords[inside], low, high, bins)
+    return snapped, inside
+
+
+class PredictionGrid:
+    """Precomputed top-k predictions over a quantized grid of the model inputs."""
+
+    def __init__(self, low, high, bins, classes, probs):
+        self.low = np.asarray(low, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.bins = _as_bins(bins, len(self.low))
+        self.classes = classes
+        self.probs = probs
+        self.top_k = classes.shape[1]
+
+    @property
+    def n_cells(self):
+        return int(np.prod(self.bins))
+
+    @property
+    def nbytes(self):
+        return self.classes.nbytes + self.probs.nbytes
+
+    def lookup(self, X):
+        """
+        Returns (inside, classes, probs) where `inside` flags the rows covered
+        by the grid and classes/probs hold the top-k entries for those rows only.
+        """
+        coords, inside = cell_coordinates(X, self.low, self.high, self.bins)
+        flat = np.ravel_multi_index(coords[inside].T, self.bins)
+        return inside, np.asarray(self.classes[flat], dtype=np.intp), self.probs[flat].astype(np.float64)
+
+    @classmethod
+    def build(cls, predict_proba, low, high, bins, prefix, top_k=3, chunk_size=65536):
+        """
+        Evaluates `predict_proba` (raw rows -> class probabilities) at the centre
+        of every cell and writes the memory-mapped grid files under `prefix`.
+        """
+        low = np.asarray(low, dtype=np.float64)
+        high = np.asarray(high, dtype=np.float64)
+        bins = _as_bins(bins, len(low))
+        n_cells = int(np.prod(bins))
+        meta_path, classes_path, probs_path = grid_paths(prefix)
+
+        classes = probs = None
+        for start in range(0, n_cells, chunk_size):
+            flat = np.arange(start, min(start + chunk_size, n_cells))
+            coords = np.stack(np.unravel_index(flat, bins), axis=1)
+            scores = predict_proba(cell_centers(coords, low, high, bins))
+            if classes is None:
+                top_k = min(top_k, scores.shape[1])
+                dtype = np.uint8 if scores.shape[1] <= 256 else np.uint16
+                classes = np.lib.format.open_memmap(classes_path, mode="w+", dtype=dtype, shape=(n_cells, top_k))
+                probs = np.lib.format.open_memmap(probs_path, mode="w+", dtype=np.float16, shape=(n_cells, top_k))
+            order = np.argsort(-scores, axis=1)[:, :top_k]
+            classes[flat] = order
+            probs[flat] = np.take_along_axis(scores, order, axis=1)
+
+        classes.flush()
+        probs.flush()
+        with open(meta_path, "w") as f:
+            json.dump({"low": low.tolist(), "high": high.tolist(), "bins": bins.tolist(), "top_k": int(top_k)}, f, indent=2)
+        return cls(low, high, bins, classes, probs)
+
+    @classmethod
+    def load(cls, prefix):
+        meta_path, classes_path, probs_path = grid_paths(prefix)
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        classes = np.load(classes_path, mmap_mode="r")
+        probs = np.load(probs_path, mmap_mode="r")
+        return cls(meta["low"], meta["high"], meta["bins"], classes, probs)
+
+    @staticmethod
+    def exists(prefix):
+        return all(os.path.exists(p) for p in grid_paths(prefix))
+
+    @staticmethod
+    def mtime(prefix):
+        return min(os.path.getmtime(p) for p in grid_paths(prefix))
@@ -0,0 +1,279 @@
+"""
+Shadow scoring of a candidate crop model on live traffic.
+
+The candidate runs in its own (niced) process, started as
+`python shadow_scoring.py --worker <bundle>` and fed JSON lines over a pipe.
+Request handlers only call ShadowScorer.offer(), which samples the request
+and puts it on a bounded in-memory queue without blocking; when the queue is
+full the sample is dropped. A feeder thread writes queued samples to the
+worker, which scores them and answers with agreement, probability delta and
+latency; a reader thread folds those into ShadowStats. Nothing on the
+response path waits for the candidate.
+
+Both sides are measured on the same operation: before a sample is sent, the
+feeder thread re-scores it with the primary model's predict_proba_raw (never
+the prediction grid), so latencies and probabilities are like-for-like.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Share of /predict requests also scored by the candidate
+SAMPLE_RATE = float(os.getenv("CROP_SHADOW_SAMPLE_RATE", "0.1"))
+# Samples waiting for the candidate; beyond this they are dropped, never queued on the request
+QUEUE_SIZE = int(os.getenv("CROP_SHADOW_QUEUE_SIZE", "1000"))
+# Scheduling priority of the worker process relative to the API (higher = lower priority)
+WORKER_NICE = 10
+# Upper edges (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100]
+# Edges of the candidate-minus-primary probability histogram
+DELTA_BUCKETS = [-1.0, -0.5, -0.2, -0.1, -0.05, -0.01, 0.01, 0.05, 0.1, 0.2, 0.5, 1.0]
+
+
+def _send(message):
+    sys.stdout.write(json.dumps(message) + "\n")
+    sys.stdout.flush()
+
+
+def _worker(bundle_path):
+    try:
+        os.nice(WORKER_NICE)
+    except (AttributeError, OSError):
+        pass
+    logging.basicConfig(level=logging.WARNING)
+    from crop_model import load_candidate_model
+
+    try:
+        candidate = load_candidate_model(bundle_path)
+    except Exception as e:
+        _send({"kind": "error", "error": f"{type(e).__name__}: {e}"})
+        return
+    _send({"kind": "ready", "version": candidate.version})
+
+    try:
+        for line in sys.stdin:
+            _score(candidate, *json.loads(line))
+    except (BrokenPipeError, KeyboardInterrupt):
+        # The API process went away
+        return
+
+
+def _score(candidate, features, primary_crop, primary_prob, primary_ms):
+    try:
+        start = time.perf_counter()
+        probs = candidate.predict_proba_raw(np.asarray([features], dtype=np.float64))[0]
+        candidate_ms = (time.perf_counter() - start) * 1000
+        candidate_crop = str(candidate.labels[candidate.model_classes[int(probs.argmax())]])
+        column = candidate.label_column(primary_crop)
+        candidate_prob = float(probs[column]) if column is not None else 0.0
+    except Exception as e:
+        _send({"kind": "failed", "error": f"{type(e).__name__}: {e}"})
+        return
+    _send({"kind": "sample", "agreed": candidate_crop == primary_crop,
+           "delta": candidate_prob - primary_prob, "primary_ms": primary_ms, "candidate_ms": candidate_ms})
+
+
+def _primary_sample(features, primary_model):
+    """[features, crop, exact probability, ms] of the primary, scored the way _score() scores the candidate."""
+    start = time.perf_counter()
+    probs = primary_model.predict_proba_raw(np.asarray([features], dtype=np.float64))[0]
+    primary_ms = (time.perf_counter() - start) * 1000
+    column = int(probs.argmax())
+    crop = str(primary_model.labels[primary_model.model_classes[column]])
+    return [features, crop, float(probs[column]), primary_ms]
+
+
+class LatencyHistogram:
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total_ms = 0.0
+
+    def add(self, ms):
+        self.counts[int(np.searchsorted(self.buckets, ms))] += 1
+        self.total_ms += ms
+
+    def summary(self):
+        n = sum(self.counts)
+        labels = [f"<={edge}ms" for edge in self.buckets] + [f">{self.buckets[-1]}ms"]
+        return {
+            "count": n,
+            "mean_ms": round(self.total_ms / n, 4) if n else None,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class ShadowStats:
+    """Aggregates of the candidate-vs-primary comparisons (updated by the reader thread only)."""
+
+    def __init__(self):
+        self.compared = 0
+        self.agreed = 0
+        self.failed = 0
+        self.delta_sum = 0.0
+        self.abs_delta_sum = 0.0
+        self.max_abs_delta = 0.0
+        self.delta_counts = [0] * (len(DELTA_BUCKETS) + 1)
+        self.primary_latency = LatencyHistogram()
+        self.candidate_latency = LatencyHistogram()
+        self.last_error = None
+
+    def add(self, agreed, delta, primary_ms, candidate_ms):
+        self.compared += 1
+        self.agreed += int(agreed)
+        self.delta_sum += delta
+        self.abs_delta_sum += abs(delta)
+        self.max_abs_delta = max(self.max_abs_delta, abs(delta))
+        self.delta_counts[int(np.searchsorted(DELTA_BUCKETS, delta))] += 1
+        self.primary_latency.add(primary_ms)
+        self.candidate_latency.add(candidate_ms)
+
+    def summary(self):
+        n = self.compared
+        labels = ([f"<{DELTA_BUCKETS[0]}"]
+                  + [f"[{lo}, {hi})" for lo, hi in zip(DELTA_BUCKETS, DELTA_BUCKETS[1:])]
+                  + [f">={DELTA_BUCKETS[-1]}"])
+        return {
+            "compared": n,
+            "failed": self.failed,
+            "agreement_rate": round(self.agreed / n, 4) if n else None,
+            "probability_delta": {
+                "mean": round(self.delta_sum / n, 4) if n else None,
+                "mean_abs": round(self.abs_delta_sum / n, 4) if n else None,
+                "max_abs": round(self.max_abs_delta, 4),
+                "histogram": dict(zip(labels, self.delta_counts)),
+            },
+            "latency": {
+                "primary": self.primary_latency.summary(),
+                "candidate": self.candidate_latency.summary(),
+            },
+            "last_error": self.last_error,
+        }
+
+
+class ShadowScorer:
+    """
+    Candidate model from a bundle directory, scored in a worker process on a
+    `sample_rate` share of the requests passed to offer().
+    """
+
+    def __init__(self, bundle_path, sample_rate=SAMPLE_RATE, queue_size=QUEUE_SIZE):
+        self.bundle_path = bundle_path
+        self.sample_rate = sample_rate
+        self.state = "starting"
+        self.candidate_version = None
+        self.started_at = time.time()
+        # Plain counters, incremented without a lock: approximate under concurrency
+        self.offered = 0
+        self.sampled = 0
+        self.dropped = 0
+        self.stats = ShadowStats()
+        self._pending = queue.Queue(maxsize=queue_size)
+        self._process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker", bundle_path],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1,
+        )
+        threading.Thread(target=self._feed, name="shadow-feeder", daemon=True).start()
+        threading.Thread(target=self._read, name="shadow-reader", daemon=True).start()
+
+    def offer(self, features, primary_model):
+        """Queues a sampled request for the candidate; never blocks."""
+        self.offered += 1
+        if self.state != "running" or random.random() >= self.sample_rate:
+            return
+        try:
+            self._pending.put_nowait((list(features), primary_model))
+            self.sampled += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _feed(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            try:
+                sample = _primary_sample(*item)
+            except Exception as e:
+                self.stats.failed += 1
+                self.stats.last_error = f"primary: {type(e).__name__}: {e}"
+                continue
+            try:
+                self._process.stdin.write(json.dumps(sample) + "\n")
+                self._process.stdin.flush()
+            except (BrokenPipeError, OSError, ValueError):
+                break
+        try:
+            self._process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+
+    def _read(self):
+        for line in self._process.stdout:
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                # Stray output of the libraries the worker imports
+                continue
+            kind = message.get("kind")
+            if kind == "sample":
+                self.stats.add(message["agreed"], message["delta"], message["primary_ms"], message["candidate_ms"])
+            elif kind == "ready":
+                self.candidate_version = message["version"]
+                self.state = "running"
+                logger.info(f"Shadow candidate {message['version']} running on {self.sample_rate:.0%} of requests.")
+            elif kind == "failed":
+                self.stats.failed += 1
+                self.stats.last_error = message["error"]
+            elif kind == "error":
+                self.state = "failed"
+                self.stats.last_error = message["error"]
+                logger.error(f"Shadow candidate {self.bundle_path} failed to load: {message['error']}")
+        if self.state in ("starting", "running"):
+            self.state = "failed"
+            self.stats.last_error = self.stats.last_error or f"worker exited with code {self._process.wait()}"
+
+    def stop(self):
+        self.state = "stopped"
+        # Unsent samples are discarded; the worker exits once its input is closed
+        while True:
+            try:
+                self._pending.get_nowait()
+            except queue.Empty:
+                break
+        self._pending.put(None)
+        try:
+            self._process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self._process.terminate()
+
+    def status(self):
+        return {
+            "state": self.state,
+            "candidate_bundle": self.bundle_path,
+            "candidate_version": self.candidate_version,
+            "sample_rate": self.sample_rate,
+            "since": self.started_at,
+            "offered": self.offered,
+            "sampled": self.sampled,
+            "dropped": self.dropped,
+            **self.stats.summary(),
+        }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--worker":
+        _worker(sys.argv[2])
+    else:
+        sys.exit("usage: python shadow_scoring.py --worker <bundle directory>")
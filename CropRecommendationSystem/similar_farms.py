@@ -0,0 +1,110 @@
+import os
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Labelled records searched by /similar_farms: the training CSV, or a larger
+# farm-record table with the same feature columns and a `label` column
+NEIGHBORS_DATA_PATH = os.getenv("CROP_NEIGHBORS_DATA", os.path.join(BASE_DIR, "Crop_recommendation.csv"))
+# Without an explicit table, a bundle's own reference records are searched
+CUSTOM_NEIGHBORS_DATA = "CROP_NEIGHBORS_DATA" in os.environ
+# "kd_tree" suits the 7 low-dimensional features; "ball_tree" is the alternative
+NEIGHBORS_INDEX = os.getenv("CROP_NEIGHBORS_INDEX", "kd_tree")
+# Leaf size of the tree; small leaves favour single-row queries
+LEAF_SIZE = 16
+# Bundle arrays holding the reference records (see index_arrays)
+ARRAY_PREFIX = "neighbors_"
+
+
+class SimilarFarmsIndex:
+    """
+    Nearest labelled records to a feature row, measured in the scaler's
+    standardized space so that e.g. rainfall in mm does not dominate pH.
+    The scaler enters as its mean (center) and scale, an affine map, so
+    neither building nor querying needs the fitted scaler object.
+    """
+
+    def __init__(self, features, crops, center, scale, feature_cols, kind=NEIGHBORS_INDEX, scaled=None):
+        # Imported here: sklearn is only loaded once an index is actually built
+        from sklearn.neighbors import BallTree, KDTree
+
+        self.feature_cols = list(feature_cols)
+        self.features = np.ascontiguousarray(features, dtype=np.float64)
+        self.crops = np.asarray(crops).astype(str)
+        self.center = np.asarray(center, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        if scaled is None:
+            scaled = (self.features - self.center) / self.scale
+        tree_cls = BallTree if kind == "ball_tree" else KDTree
+        self.tree = tree_cls(np.asarray(scaled, dtype=np.float64), leaf_size=LEAF_SIZE)
+
+    def __len__(self):
+        return len(self.crops)
+
+    def query(self, rows, k=5):
+        """
+        The k nearest records of every row, closest first:
+        [[{'crop', 'distance', <feature>: value, ...}, ...], ...].
+        """
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(self.feature_cols))
+        k = min(k, len(self))
+        distances, indices = self.tree.query((rows - self.center) / self.scale, k=k)
+        results = []
+        for dist_row, idx_row in zip(distances, indices):
+            results.append([
+                {
+                    'crop': self.crops[i],
+                    'distance': round(float(d), 4),
+                    **{col: float(v) for col, v in zip(self.feature_cols, self.features[i])},
+                }
+                for d, i in zip(dist_row, idx_row)
+            ])
+        return results
+
+
+def index_arrays(features, crops, scaler):
+    """
+    Bundle arrays for an index over (features, crops): the raw and scaled
+    reference matrix, the crops and the scaler's mean/scale. Without
+    features only the scaler statistics are stored.
+    """
+    center = np.asarray(scaler.mean_, dtype=np.float64)
+    scale = np.asarray(scaler.scale_, dtype=np.float64)
+    arrays = {f"{ARRAY_PREFIX}center": center, f"{ARRAY_PREFIX}scale": scale}
+    if features is not None:
+        features = np.asarray(features, dtype=np.float64)
+        arrays.update({
+            f"{ARRAY_PREFIX}features": features,
+            f"{ARRAY_PREFIX}scaled": (features - center) / scale,
+            f"{ARRAY_PREFIX}crops": np.asarray(crops).astype(str),
+        })
+    return arrays
+
+
+def index_from_arrays(arrays, feature_cols):
+    """Index over the reference records stored in a bundle; None when it holds none."""
+    if f"{ARRAY_PREFIX}scaled" not in arrays:
+        return None
+    index = SimilarFarmsIndex(
+        arrays[f"{ARRAY_PREFIX}features"], arrays[f"{ARRAY_PREFIX}crops"], arrays[f"{ARRAY_PREFIX}center"],
+        arrays[f"{ARRAY_PREFIX}scale"], feature_cols, scaled=arrays[f"{ARRAY_PREFIX}scaled"],
+    )
+    logger.info(f"Similar-farms index built over {len(index):,} records from the model bundle.")
+    return index
+
+
+def build_index(center, scale, feature_cols, path=NEIGHBORS_DATA_PATH):
+    """Index over the labelled records at `path`; None (with a warning) if they cannot be read."""
+    try:
+        df = pd.read_csv(path, usecols=list(feature_cols) + ["label"]).dropna()
+        index = SimilarFarmsIndex(df[list(feature_cols)].to_numpy(np.float64), df["label"], center, scale,
+                                  feature_cols)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Similar-farms index unavailable ({path}): {e}")
+        return None
+    logger.info(f"Similar-farms index built over {len(index):,} records from {path}.")
+    return index
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+import sys
+from collections import namedtuple
+
+import joblib
+
+# Shared helpers live in the repo-root `common` package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.model_bundle import file_sha256
+
+
+# value  : what the stage function returned (loaded from disk on a cache hit)
+# digest : SHA-256 of the stored output; downstream stages put it in their key
+# cached : True when the stage was skipped
+StageOutput = namedtuple("StageOutput", "value digest cached")
+
+
+def stage_key(name, params, upstream):
+    """Content address of a stage run: its name, parameters and the digests of its inputs."""
+    payload = json.dumps({"stage": name, "params": params, "upstream": list(upstream)},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class StageCache:
+    """
+    On-disk cache of pipeline stage outputs under <root>/<stage>/<key>.joblib.
+
+    A stage is skipped when an entry for its key exists and every file it is
+    expected to write (`outputs`, e.g. a plot) is on disk with the content
+    that run wrote, recorded in <key>.outputs.json. Another run may have
+    overwritten the shared files (model.pkl) since, in which case the stage
+    runs again. Entries are never evicted; delete the directory to reclaim space.
+    """
+
+    def __init__(self, root, enabled=True):
+        self.root = root
+        self.enabled = enabled
+
+    def _path(self, name, key, suffix=".joblib"):
+        return os.path.join(self.root, name, f"{key}{suffix}")
+
+    def _outputs_match(self, name, key, outputs):
+        """True when every output file still has the digest recorded by the run that wrote entry `key`."""
+        try:
+            with open(self._path(name, key, ".outputs.json")) as f:
+                recorded = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return all(os.path.exists(p) and recorded.get(p) == file_sha256(p) for p in outputs)
+
+    def run(self, name, params, upstream, fn, outputs=()):
+        key = stage_key(name, params, upstream)
+        path = self._path(name, key)
+        if self.enabled and os.path.exists(path) and self._outputs_match(name, key, outputs):
+            print(f"[CACHE] {name}: unchanged, reusing {key[:12]}")
+            return StageOutput(joblib.load(path), file_sha256(path), True)
+
+        value = fn()
+        if not self.enabled:
+            return StageOutput(value, key, False)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_suffix = f".tmp-{os.getpid()}"
+        outputs_path = self._path(name, key, ".outputs.json")
+        with open(outputs_path + tmp_suffix, "w") as f:
+            json.dump({p: file_sha256(p) for p in outputs}, f, indent=2)
+        os.replace(outputs_path + tmp_suffix, outputs_path)
+        joblib.dump(value, path + tmp_suffix)
+        os.replace(path + tmp_suffix, path)
+        return StageOutput(value, file_sha256(path), False)
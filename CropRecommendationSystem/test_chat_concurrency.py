@@ -0,0 +1,59 @@
+import os
+import sys
+import asyncio
+import threading
+
+import httpx
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import LLMClient
+import api
+
+CHAT_PAYLOAD = {"message": "How much fertilizer does rice need?",
+                "context": {"recommended_crop": "rice", "confidence": "95%"}, "history": []}
+PREDICT_PAYLOAD = {"N": 90, "P": 42, "K": 43, "temperature": 20.8, "humidity": 82.0, "ph": 6.5, "rainfall": 202.9}
+N_CHATS = 8
+
+
+class GatedModel:
+    """Blocks every call until released, and counts how many are blocked at once."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        self.release.wait(timeout=10)
+        with self._lock:
+            self.in_flight -= 1
+        return type("Response", (), {"text": "Fake answer."})()
+
+
+async def _burst(fake):
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        chats = [asyncio.ensure_future(client.post("/chat", json=CHAT_PAYLOAD)) for _ in range(N_CHATS)]
+        for _ in range(500):
+            if fake.in_flight == N_CHATS:
+                break
+            await asyncio.sleep(0.01)
+        # Every chat is inside the model call now; the loop must still serve /predict
+        blocked = fake.in_flight
+        predict = await client.post("/predict", json=PREDICT_PAYLOAD)
+        fake.release.set()
+        return blocked, predict, await asyncio.gather(*chats)
+
+
+def test_chats_wait_on_the_llm_off_the_event_loop(monkeypatch):
+    fake = GatedModel()
+    monkeypatch.setattr(api.agent, "llm", LLMClient(api_keys=["fake-key"], max_concurrency=N_CHATS, cache=None,
+                                                    client_factory=lambda *args: fake, rpm=1e9, burst=10 ** 6))
+    blocked, predict, chats = asyncio.run(_burst(fake))
+    assert blocked == fake.peak == N_CHATS
+    assert predict.status_code == 200
+    assert [chat.json()["reply"] for chat in chats] == ["Fake answer."] * N_CHATS
@@ -0,0 +1,94 @@
+import os
+import sys
+import asyncio
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import LLMClient
+from common.llm_cache import ResponseCache
+from common.chat_history import HistoryManager, estimate_tokens, message_tokens
+from agri_agent import AgriAgent
+
+CONTEXT = {"recommended_crop": "rice", "confidence": "91.5%", "N": 90, "P": 42, "K": 43,
+           "temperature": 20.8, "humidity": 82.0, "ph": 6.5, "rainfall": 202.9}
+
+
+def _is_summary(prompt):
+    return prompt.startswith("You maintain a running summary")
+
+
+class FakeModel:
+    """Answers with a fixed number of words per kind of prompt and records what it was asked."""
+
+    def __init__(self, words=70, summary_words=100):
+        self.words = words
+        self.summary_words = summary_words
+        self.prompts = []
+
+    @property
+    def summary_calls(self):
+        return sum(_is_summary(prompt) for prompt in self.prompts)
+
+    def generate_content(self, prompt, stream=False):
+        self.prompts.append(prompt)
+        words = self.summary_words if _is_summary(prompt) else self.words
+        return type("Response", (), {"text": " ".join(["advice"] * words)})()
+
+
+def _agent(fake, budget=800, cache=None):
+    agent = AgriAgent()
+    agent.llm = LLMClient(api_keys=["fake-key"], client_factory=lambda *args: fake, cache=cache,
+                          rpm=1e9, burst=10 ** 6)
+    agent.history = HistoryManager(agent.llm, budget_tokens=budget, keep_turns=4, summary_every=4)
+    return agent
+
+
+def _converse(agent, turns):
+    async def run():
+        history = []
+        for turn in range(turns):
+            message = f"How should I irrigate the rice this week? (turn {turn + 1})"
+            reply = await agent.generate_response(message, CONTEXT, history)
+            history += [{"role": "user", "content": message}, {"role": "assistant", "content": reply}]
+        return history
+
+    return asyncio.run(run())
+
+
+def test_summary_advances_every_four_turns():
+    fake = FakeModel()
+    agent = _agent(fake)
+    _converse(agent, 20)
+    # Summaries cover 8, 16 and 24 messages; the turns in between reuse them
+    assert fake.summary_calls == agent.history.summaries_computed == 3
+    assert agent.history.summaries_reused == 9
+    # Each step rolls the previous summary forward instead of re-reading the conversation
+    summary_prompts = [prompt for prompt in fake.prompts if _is_summary(prompt)]
+    assert all("SUMMARY SO FAR:" in prompt for prompt in summary_prompts[1:])
+    assert "(turn 1)" not in summary_prompts[-1]
+
+
+def test_history_stays_within_token_budget():
+    fake = FakeModel(words=200)
+    agent = _agent(fake, budget=600)
+    history = _converse(agent, 12)
+    summary, recent = asyncio.run(agent.history.prepare(history))
+    assert summary
+    assert estimate_tokens(summary) + message_tokens(recent) <= 600
+    # The newest turn is always kept word for word
+    assert recent[-2:] == history[-2:]
+
+
+def test_cached_summary_keeps_the_prompt_stable(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite3")
+    first = FakeModel()
+    history = _converse(_agent(first, cache=ResponseCache("agri", 3600, path=path)), 12)
+    message = "When should I harvest?"
+    reply = asyncio.run(_agent(first, cache=ResponseCache("agri", 3600, path=path))
+                        .generate_response(message, CONTEXT, history))
+
+    # A fresh process has no summaries in memory, but the summary call and the
+    # reply itself both come back from the response cache unchanged
+    second = FakeModel()
+    restarted = _agent(second, cache=ResponseCache("agri", 3600, path=path))
+    assert asyncio.run(restarted.generate_response(message, CONTEXT, history)) == reply
+    assert second.prompts == []
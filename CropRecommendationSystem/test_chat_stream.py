@@ -0,0 +1,85 @@
+import os
+import sys
+import asyncio
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.llm_client import LLMClient
+from common.sse import sse_chat_events
+
+
+class Chunk:
+    def __init__(self, text=None):
+        self._text = text
+
+    @property
+    def text(self):
+        if self._text is None:
+            raise ValueError("The candidate has no parts.")
+        return self._text
+
+
+class BlockedChunk:
+    """google-genai style: no text, and the candidate's finish reason says why."""
+    text = None
+    candidates = [type("Candidate", (), {"finish_reason": "SAFETY"})()]
+
+
+class StreamingModel:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def generate_content(self, prompt, stream=False):
+        return iter(self.chunks)
+
+
+class BrokenCache:
+    def key(self, prompt, model_name, generation_config):
+        return prompt
+
+    def get(self, key):
+        return None
+
+    def put(self, key, response):
+        raise RuntimeError("disk full")
+
+
+class RecordingCache(BrokenCache):
+    def __init__(self):
+        self.stored = {}
+
+    def put(self, key, response):
+        self.stored[key] = response
+
+
+def _events(chunks, cache=None):
+    client = LLMClient(api_keys=["fake-key"], client_factory=lambda *args: StreamingModel(chunks), cache=cache)
+
+    async def collect():
+        return [event async for event in sse_chat_events(client.stream("prompt"))]
+
+    return asyncio.run(asyncio.wait_for(collect(), timeout=5))
+
+
+def test_stream_skips_chunks_without_text():
+    events = _events([Chunk("Plant "), Chunk(None), Chunk("in June.")])
+    assert events[-1].startswith("event: done")
+    assert '"reply": "Plant in June."' in events[-1]
+
+
+def test_stream_finishes_when_cache_write_fails():
+    events = _events([Chunk("Plant in June.")], cache=BrokenCache())
+    assert events[-1].startswith("event: done")
+
+
+def test_blocked_stream_ends_with_error():
+    events = _events([Chunk(None)])
+    assert events[-1].startswith("event: error")
+
+
+def test_blocked_reply_is_not_cached():
+    cache = RecordingCache()
+    events = _events([Chunk("Plant "), BlockedChunk()], cache=cache)
+    assert events[-1].startswith("event: done")
+    assert cache.stored == {}
+    _events([Chunk("Plant in June.")], cache=cache)
+    assert cache.stored == {"prompt": "Plant in June."}
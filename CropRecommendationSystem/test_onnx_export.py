@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from xgboost import XGBClassifier
+
+from test_tree_engine import load_data
+
+pytest.importorskip("skl2onnx")
+pytest.importorskip("onnxruntime")
+
+from onnx_export import OnnxModel, export_onnx, parity_check
+
+
+def onnx_parity(model, scaler, X):
+    onnx_model = OnnxModel(export_onnx(model, scaler, X.shape[1]))
+    return parity_check(onnx_model, lambda rows: model.predict_proba(scaler.transform(rows)), X)
+
+
+def test_deployed_model_onnx_parity():
+    model, scaler, X, _ = load_data()
+    parity = onnx_parity(model, scaler, X)
+    assert parity["argmax_agreement"] == 1.0
+    # The graph scales in float32, which can flip single trees at split boundaries
+    assert parity["max_abs_prob_diff"] <= 0.05 + 1e-6
+
+
+def test_xgboost_onnx_parity():
+    pytest.importorskip("onnxmltools")
+    _, scaler, X, y = load_data()
+    model = XGBClassifier(n_estimators=30, random_state=42, verbosity=0).fit(scaler.transform(X), y)
+    parity = onnx_parity(model, scaler, X)
+    assert parity["argmax_agreement"] >= 0.995
+    assert parity["max_abs_prob_diff"] < 0.05
+
+
+def test_onnx_model_from_file(tmp_path):
+    model, scaler, X, _ = load_data()
+    path = tmp_path / "model.onnx"
+    path.write_bytes(export_onnx(model, scaler, X.shape[1]))
+    probs = OnnxModel(str(path)).predict_proba(X[:3])
+    assert probs.shape == (3, len(model.classes_))
+    np.testing.assert_allclose(probs.sum(axis=1), 1.0, atol=1e-5)
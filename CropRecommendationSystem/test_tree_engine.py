@@ -0,0 +1,117 @@
+import os
+import time
+import warnings
+import joblib
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.tree import DecisionTreeClassifier
+from xgboost import XGBClassifier
+
+from tree_engine import CompiledForest, compile_model
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FEATURE_COLS = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+
+
+def load_data():
+    df = pd.read_csv(os.path.join(BASE_DIR, "Crop_recommendation.csv"))
+    model = joblib.load(os.path.join(BASE_DIR, "model.pkl"))
+    scaler = joblib.load(os.path.join(BASE_DIR, "scaler.pkl"))
+    le = joblib.load(os.path.join(BASE_DIR, "label_encoder.pkl"))
+    X = df[FEATURE_COLS].to_numpy(dtype=np.float64)
+    y = le.transform(df["label"])
+    return model, scaler, X, y
+
+
+def assert_parity(model, scaler, X, atol):
+    compiled = compile_model(model, scaler)
+    expected = model.predict_proba(scaler.transform(X))
+    # Exercise both the small-batch and the compacting walk
+    for rows in (X[:5], X):
+        actual = compiled.predict_proba(rows)
+        np.testing.assert_allclose(actual, expected[:len(rows)], atol=atol)
+        assert (compiled.predict(rows) == model.predict(scaler.transform(rows))).all()
+    return compiled
+
+
+def test_deployed_model_parity():
+    model, scaler, X, _ = load_data()
+    assert_parity(model, scaler, X, atol=1e-12)
+
+
+def test_decision_tree_parity():
+    _, scaler, X, y = load_data()
+    model = DecisionTreeClassifier(max_depth=10, random_state=42).fit(scaler.transform(X), y)
+    assert_parity(model, scaler, X, atol=1e-12)
+
+
+def test_xgboost_parity():
+    _, scaler, X, y = load_data()
+    model = XGBClassifier(n_estimators=30, random_state=42, verbosity=0).fit(scaler.transform(X), y)
+    # XGBoost accumulates margins in float32
+    assert_parity(model, scaler, X, atol=1e-5)
+
+
+def test_pruned_xgboost_parity():
+    _, scaler, X, y = load_data()
+    X_sc = scaler.transform(X)
+    model = XGBClassifier(n_estimators=10, random_state=42, verbosity=0).fit(X_sc, y)
+    # A pruning pass deletes split nodes in place, leaving gaps in the dumped node ids
+    params = {"process_type": "update", "updater": "prune", "gamma": 5.0,
+              "objective": "multi:softprob", "num_class": len(model.classes_)}
+    model._Booster = xgb.train(params, xgb.DMatrix(X_sc, label=y), num_boost_round=10, xgb_model=model.get_booster())
+    node_ids = [[int(line.strip().split(":")[0]) for line in dump.splitlines()]
+                for dump in model.get_booster().get_dump()]
+    assert any(sorted(ids) != list(range(len(ids))) for ids in node_ids)
+    assert_parity(model, scaler, X, atol=1e-5)
+
+
+def test_save_load_roundtrip(tmp_path):
+    model, scaler, X, _ = load_data()
+    compiled = compile_model(model, scaler)
+    path = os.path.join(tmp_path, "compiled.npz")
+    compiled.save(path)
+    restored = CompiledForest.load(path)
+    np.testing.assert_array_equal(restored.predict_proba(X), compiled.predict_proba(X))
+
+
+def test_contributions_add_up_to_probability():
+    model, scaler, X, _ = load_data()
+    compiled = compile_model(model, scaler)
+    probs = compiled.predict_proba(X)
+    columns = probs.argmax(axis=1)
+    bias, contrib = compiled.contributions(X, columns, chunk_size=500)
+    np.testing.assert_allclose(bias + contrib.sum(axis=1), probs[np.arange(len(X)), columns], atol=1e-12)
+
+
+def benchmark(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def latency_comparison():
+    model, scaler, X, _ = load_data()
+    compiled = compile_model(model, scaler)
+    print(f"Model: {type(model).__name__} | {compiled.n_trees} trees | {compiled.n_nodes} nodes")
+    print(f"{'rows':>6} | {'sklearn p50/p99 (ms)':>22} | {'compiled p50/p99 (ms)':>22} | speedup")
+    for rows in (1, 10, 100, 500, len(X)):
+        batch = X[:rows]
+        repeats = 200 if rows <= 100 else 20
+        sk = benchmark(lambda: model.predict_proba(scaler.transform(batch)), repeats)
+        cp = benchmark(lambda: compiled.predict_proba(batch), repeats)
+        print(f"{rows:>6} | {sk[0]:>10.3f} / {sk[1]:>9.3f} | {cp[0]:>10.3f} / {cp[1]:>9.3f} | {sk[0] / cp[0]:6.1f}x")
+
+
+if __name__ == "__main__":
+    # scaler.pkl was fitted on a DataFrame; silence the per-call feature-name warning
+    warnings.filterwarnings("ignore", category=UserWarning)
+    test_deployed_model_parity()
+    test_decision_tree_parity()
+    test_xgboost_parity()
+    print("Parity checks passed.\n")
+    latency_comparison()
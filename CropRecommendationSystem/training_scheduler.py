@@ -0,0 +1,87 @@
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score
+
+
+# Outcome of one fit: the fitted estimator plus its scores on the rows it was
+# trained on and on the held-out rows (None when there were none).
+FitResult = namedtuple("FitResult", "estimator train_score val_score val_pred fit_seconds")
+
+# Training data shared by every job in a worker, set once by _init_worker
+_X = None
+_Y = None
+
+
+def _init_worker(X, y):
+    global _X, _Y
+    _X, _Y = X, y
+
+
+def _fit(estimator, train_idx, val_idx, single_threaded):
+    estimator = clone(estimator)
+    params = estimator.get_params()
+    # Pool workers already use every core; nested threads only oversubscribe
+    threaded = {k: params[k] for k in ("n_jobs",) if k in params} if single_threaded else {}
+    if threaded:
+        estimator.set_params(**{k: 1 for k in threaded})
+
+    start = time.perf_counter()
+    estimator.fit(_X[train_idx], _Y[train_idx])
+    fit_seconds = time.perf_counter() - start
+
+    train_score = accuracy_score(_Y[train_idx], estimator.predict(_X[train_idx]))
+    val_score = val_pred = None
+    if val_idx is not None:
+        val_pred = estimator.predict(_X[val_idx])
+        val_score = accuracy_score(_Y[val_idx], val_pred)
+    if threaded:
+        estimator.set_params(**threaded)
+    return FitResult(estimator, train_score, val_score, val_pred, fit_seconds)
+
+
+def resolve_jobs(n_jobs):
+    """-1 means one worker per core, like sklearn's n_jobs."""
+    if n_jobs is None or n_jobs < 0:
+        return os.cpu_count() or 1
+    return max(1, n_jobs)
+
+
+class TrainingScheduler:
+    """
+    Runs independent estimator fits on a process pool. The training matrix is
+    sent to each worker once; a job only carries the estimator and row indices.
+    With n_jobs=1 jobs run in-process and submit() returns finished futures.
+    """
+
+    def __init__(self, X, y, n_jobs=-1):
+        self.X = np.asarray(X)
+        self.y = np.asarray(y)
+        self.n_jobs = resolve_jobs(n_jobs)
+        self._pool = None
+
+    def __enter__(self):
+        if self.n_jobs > 1:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.n_jobs, initializer=_init_worker, initargs=(self.X, self.y)
+            )
+        else:
+            _init_worker(self.X, self.y)
+        return self
+
+    def __exit__(self, *exc):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=exc[0] is not None)
+            self._pool = None
+
+    def submit(self, estimator, train_idx, val_idx=None):
+        """Fits a clone of `estimator` on rows train_idx; returns a Future of FitResult."""
+        if self._pool is not None:
+            return self._pool.submit(_fit, estimator, train_idx, val_idx, True)
+        future = Future()
+        future.set_result(_fit(estimator, train_idx, val_idx, False))
+        return future
@@ -0,0 +1,313 @@
+import json
+import numpy as np
+
+
+# Tree ensembles are flattened into one set of node arrays. Every tree is
+# stored back to back; `roots` holds the index of each tree's first node and
+# `children` holds (left, right) pairs, so the next node is children[2 * i + go_right].
+# Leaves point to themselves, so walking past a leaf is a no-op.
+ARRAY_NAMES = ["feature", "threshold", "children", "value", "roots", "classes", "base_margin"]
+
+# Below this many rows a fixed-depth walk beats compacting the active set
+SMALL_BATCH_ROWS = 32
+
+
+class CompiledForest:
+    """
+    Array-backed tree ensemble that scores raw (unscaled) feature rows.
+
+    kind="mean"    : RandomForest / DecisionTree, averages leaf class probabilities.
+    kind="softmax" : XGBoost, sums leaf margins and applies softmax.
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, classes,
+                 base_margin, kind, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.classes = classes
+        self.base_margin = base_margin
+        self.kind = kind
+        self.max_depth = int(max_depth)
+        self.is_leaf = children[0::2] == np.arange(len(feature))
+        self._attribution = None
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def leaf_indices(self, X):
+        """Returns the leaf node reached in every tree, shape (n_trees, n_rows)."""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        n_rows, n_features = X.shape
+        flat_x = X.ravel()
+        # Offset of each (tree, row) pair's feature vector inside flat_x
+        offsets = np.tile(np.arange(n_rows) * n_features, self.n_trees)
+        nodes = np.repeat(self.roots, n_rows)
+
+        if n_rows <= SMALL_BATCH_ROWS:
+            for _ in range(self.max_depth):
+                go_right = flat_x[offsets + self.feature[nodes]] > self.threshold[nodes]
+                nodes = self.children[2 * nodes + go_right]
+            return nodes.reshape(self.n_trees, n_rows)
+
+        # Larger batches: only keep walking the (tree, row) pairs not yet on a leaf
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        current = nodes[active]
+        offsets = offsets[active]
+        while active.size:
+            go_right = flat_x[offsets + self.feature[current]] > self.threshold[current]
+            current = self.children[2 * current + go_right]
+            nodes[active] = current
+            keep = ~self.is_leaf[current]
+            active, current, offsets = active[keep], current[keep], offsets[keep]
+        return nodes.reshape(self.n_trees, n_rows)
+
+    def predict_proba(self, X, chunk_size=2048):
+        """Class probabilities for raw feature rows, columns aligned with `classes`."""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        out = np.empty((X.shape[0], self.value.shape[1]))
+        for start in range(0, X.shape[0], chunk_size):
+            leaves = self.leaf_indices(X[start:start + chunk_size])
+            scores = np.zeros((leaves.shape[1], self.value.shape[1]))
+            for tree_leaves in leaves:
+                scores += self.value[tree_leaves]
+            if self.kind == "mean":
+                scores /= self.n_trees
+            else:
+                scores += self.base_margin
+                scores -= scores.max(axis=1, keepdims=True)
+                np.exp(scores, out=scores)
+                scores /= scores.sum(axis=1, keepdims=True)
+            out[start:start + chunk_size] = scores
+        return out
+
+    def predict(self, X):
+        return self.classes[np.argmax(self.predict_proba(X), axis=1)]
+
+    def attribution_tables(self):
+        """
+        Per node: the feature its parent split on and the change in class
+        probabilities from parent to node. Built once, then reused by contributions().
+        """
+        if self._attribution is None:
+            parent = np.full(self.n_nodes, -1)
+            internal = np.flatnonzero(~self.is_leaf)
+            parent[self.children[2 * internal]] = internal
+            parent[self.children[2 * internal + 1]] = internal
+            has_parent = parent >= 0
+            parent_feature = np.where(has_parent, self.feature[parent], 0)
+            delta = np.where(has_parent[:, None], self.value - self.value[parent], 0.0)
+            self._attribution = (parent_feature, delta)
+        return self._attribution
+
+    def contributions(self, X, class_columns, chunk_size=2048):
+        """
+        Path-based (Saabas) attribution of one class column per row: every
+        split on the path moves the class probability from the parent's value
+        to the child's, and that change is credited to the split feature.
+        Returns (bias, contributions) with bias + contributions.sum(axis=1)
+        equal to the predicted probability of that class.
+        """
+        if self.kind != "mean":
+            raise TypeError("Path attributions need averaged tree probabilities (RandomForest / DecisionTree).")
+        parent_feature, delta = self.attribution_tables()
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        class_columns = np.asarray(class_columns, dtype=np.intp)
+        n_features = X.shape[1]
+        contrib = np.zeros(X.shape)
+        for start in range(0, X.shape[0], chunk_size):
+            chunk = X[start:start + chunk_size]
+            n_rows = chunk.shape[0]
+            flat_x = chunk.ravel()
+            rows = np.tile(np.arange(n_rows), self.n_trees)
+            offsets = rows * n_features
+            columns = class_columns[start:start + chunk_size][rows]
+            nodes = np.repeat(self.roots, n_rows)
+            totals = np.zeros(n_rows * n_features)
+            for _ in range(self.max_depth):
+                go_right = flat_x[offsets + self.feature[nodes]] > self.threshold[nodes]
+                nxt = self.children[2 * nodes + go_right]
+                moved = nxt != nodes
+                target = nxt[moved]
+                totals += np.bincount(offsets[moved] + parent_feature[target],
+                                      weights=delta[target, columns[moved]], minlength=totals.size)
+                nodes = nxt
+            contrib[start:start + chunk_size] = totals.reshape(n_rows, n_features) / self.n_trees
+        bias = self.value[self.roots].mean(axis=0)[class_columns]
+        return bias, contrib
+
+    def save(self, path):
+        meta = {"kind": self.kind, "max_depth": self.max_depth}
+        np.savez(
+            path,
+            meta=np.array(json.dumps(meta)),
+            **{name: getattr(self, name) for name in ARRAY_NAMES},
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            arrays = {name: data[name] for name in ARRAY_NAMES}
+        return cls(**arrays, **meta)
+
+
+def _scaler_params(scaler, n_features):
+    """Mean and scale of a fitted StandardScaler, or identity when no scaler is given."""
+    mean = np.zeros(n_features)
+    scale = np.ones(n_features)
+    if scaler is not None:
+        if getattr(scaler, "mean_", None) is not None:
+            mean = np.asarray(scaler.mean_, dtype=np.float64)
+        if getattr(scaler, "scale_", None) is not None:
+            scale = np.asarray(scaler.scale_, dtype=np.float64)
+    return mean, scale
+
+
+def _flatten_sklearn_trees(trees, n_classes):
+    """Concatenates fitted sklearn tree_ objects into global node arrays."""
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for tree in trees:
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+        local = np.arange(n)
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, 0.0, tree.threshold))
+        left.append(np.where(is_leaf, local, tree.children_left) + offset)
+        right.append(np.where(is_leaf, local, tree.children_right) + offset)
+        v = tree.value[:, 0, :n_classes].astype(np.float64)
+        value.append(v / v.sum(axis=1, keepdims=True))
+        max_depth = max(max_depth, tree.max_depth)
+        offset += n
+    return (np.concatenate(feature), np.concatenate(threshold), np.concatenate(left),
+            np.concatenate(right), np.vstack(value), np.array(roots), max_depth)
+
+
+def _flatten_xgboost_trees(model):
+    """Parses the XGBoost JSON dump into global node arrays with margins per class column."""
+    booster = model.get_booster()
+    n_classes = int(model.n_classes_)
+    names = booster.feature_names
+    dumps = [json.loads(d) for d in booster.get_dump(dump_format="json")]
+
+    feature, threshold, left, right, leaf_value, tree_class, roots = [], [], [], [], [], [], []
+    max_depth = 0
+    for t, tree in enumerate(dumps):
+        nodes = {}
+        stack = [(tree, 0)]
+        while stack:
+            node, depth = stack.pop()
+            nodes[node["nodeid"]] = node
+            max_depth = max(max_depth, depth)
+            stack.extend((child, depth + 1) for child in node.get("children", []))
+        # Pruned trees keep the ids of their surviving nodes, so ids can have gaps
+        offset = len(feature)
+        position = {node_id: offset + i for i, node_id in enumerate(sorted(nodes))}
+        roots.append(position[tree["nodeid"]])
+        for node_id in sorted(nodes):
+            node = nodes[node_id]
+            if "leaf" in node:
+                feature.append(0)
+                threshold.append(0.0)
+                left.append(position[node_id])
+                right.append(position[node_id])
+                leaf_value.append(node["leaf"])
+            else:
+                split = node["split"]
+                feature.append(names.index(split) if names else int(split.lstrip("f")))
+                threshold.append(node["split_condition"])
+                left.append(position[node["yes"]])
+                right.append(position[node["no"]])
+                leaf_value.append(0.0)
+            # Binary models grow one tree per round scoring the positive class
+            tree_class.append(t % n_classes if n_classes > 2 else 1)
+
+    value = np.zeros((len(feature), n_classes))
+    value[np.arange(len(feature)), tree_class] = leaf_value
+    return (np.array(feature), np.array(threshold, dtype=np.float64), np.array(left),
+            np.array(right), value, np.array(roots), max_depth)
+
+
+def _float32_boundary(threshold, strict):
+    """
+    Maps split thresholds to float64 cut points that reproduce the float32
+    comparisons done by sklearn (x32 <= t) and XGBoost (x32 < t32), so that
+    a plain float64 `x <= cut` takes the same branch for every input.
+    """
+    t32 = threshold.astype(np.float32)
+    if strict:
+        # x32 < t32  <=>  x32 <= previous float32 below t32
+        low = np.nextafter(t32, np.float32(-np.inf))
+    else:
+        # x32 <= t  <=>  x32 <= largest float32 not above t
+        low = np.where(t32.astype(np.float64) > threshold, np.nextafter(t32, np.float32(-np.inf)), t32)
+    high = np.nextafter(low, np.float32(np.inf))
+    # Any float64 below the midpoint rounds down to `low` or less
+    return (low.astype(np.float64) + high.astype(np.float64)) / 2
+
+
+def can_compile(model):
+    """True for the tree models compile_model() flattens (XGBoost, sklearn forests and single trees)."""
+    return any(hasattr(model, attr) for attr in ("get_booster", "estimators_", "tree_"))
+
+
+def compile_model(model, scaler=None):
+    """
+    Flattens a fitted DecisionTree, RandomForest or XGBoost classifier into a
+    CompiledForest. When a StandardScaler is given it is folded into the split
+    thresholds (x_scaled <= t  <=>  x <= t * scale + mean), so the result
+    scores raw feature rows directly.
+    """
+    n_features = int(model.n_features_in_)
+    n_classes = len(model.classes_)
+    mean, scale = _scaler_params(scaler, n_features)
+
+    if hasattr(model, "get_booster"):
+        arrays = _flatten_xgboost_trees(model)
+        kind, strict = "softmax", True
+    elif hasattr(model, "estimators_"):
+        arrays = _flatten_sklearn_trees([est.tree_ for est in model.estimators_], n_classes)
+        kind, strict = "mean", False
+    elif hasattr(model, "tree_"):
+        arrays = _flatten_sklearn_trees([model.tree_], n_classes)
+        kind, strict = "mean", False
+    else:
+        raise TypeError(f"Cannot compile {type(model).__name__}: only tree ensembles are supported.")
+
+    feature, threshold, left, right, value, roots, max_depth = arrays
+    is_leaf = left == np.arange(len(left))
+    cut = _float32_boundary(threshold, strict)
+    threshold = np.where(is_leaf, 0.0, cut * scale[feature] + mean[feature])
+
+    compiled = CompiledForest(
+        feature=feature.astype(np.intp),
+        threshold=threshold,
+        children=np.column_stack([left, right]).ravel().astype(np.intp),
+        value=value,
+        roots=roots.astype(np.intp),
+        classes=np.asarray(model.classes_),
+        base_margin=np.zeros(n_classes),
+        kind=kind,
+        max_depth=max_depth,
+    )
+
+    if kind == "softmax":
+        # Recover the global bias by comparing XGBoost's raw margin with the
+        # summed tree output at the scaled origin (raw input == scaler mean).
+        margin = np.asarray(model.predict(np.zeros((1, n_features)), output_margin=True), dtype=np.float64)
+        tree_sum = value[compiled.leaf_indices(mean[None, :])[:, 0]].sum(axis=0)
+        if n_classes == 2:
+            margin = np.array([0.0, margin.ravel()[0]])
+        compiled.base_margin = margin.ravel() - tree_sum
+
+    return compiled
@@ -1,5 +1,7 @@
 
 import io
+import os
+import sys
 from PIL import Image
 import torch
 from transformers import ViTForImageClassification, ViTImageProcessor
@@ -11,6 +13,11 @@ import logging
 import uvicorn
 from plant_agent import PlantAgent
 
+# Shared helpers live in the repo-root `common` package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.sse import sse_chat_response
+from common.admin import llm_admin_router
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -100,6 +107,8 @@ app.add_middleware(
 
 # Initialize Agent
 agent = PlantAgent()
+app.include_router(llm_admin_router(agent))
+
 
 class ChatInput(BaseModel):
     message: str
@@ -166,13 +175,24 @@ async def chat(data: ChatInput):
         raise HTTPException(status_code=400, detail="Message cannot be empty")
         
     try:
-        reply = agent.generate_response(data.message, data.context, data.history)
+        reply = await agent.generate_response(data.message, data.context, data.history)
         return {'reply': reply}
     except Exception as e:
         logger.error(f"Chat Error: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+@app.post("/chat/stream")
+async def chat_stream(data: ChatInput):
+    """
+    /chat as Server-Sent Events: `data: {"delta": ...}` per piece of the reply
+    as Gemini produces it, then `event: done` with the full reply.
+    """
+    if not data.message:
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    return sse_chat_response(agent.stream_response(data.message, data.context, data.history))
+
+
 # -----------------------------
 # RUN APP
 # -----------------------------
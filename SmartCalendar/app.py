@@ -1,5 +1,6 @@
 
 import os
+import sys
 import json
 import uuid
 import logging
@@ -14,6 +15,11 @@ from datetime import datetime, date
 
 from calendar_agent import CalendarAgent
 
+# Shared helpers live in the repo-root `common` package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.sse import sse_chat_response
+from common.admin import llm_admin_router
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -30,6 +36,8 @@ app.add_middleware(
 
 # Initialize the Calendar Agent
 agent = CalendarAgent()
+app.include_router(llm_admin_router(agent))
+
 
 # ─── File-Based Persistence ────────────────────────────────────────────────────
 
@@ -213,7 +221,7 @@ async def generate_schedule(data: ScheduleInput):
         crop_id = f"crop_{uuid.uuid4().hex[:8]}"
 
         # Generate schedule — agent handles retry logic internally
-        tasks = agent.generate_farming_schedule(
+        tasks = await agent.generate_farming_schedule(
             crop=crop_clean,
             location=location_clean,
             planting_date=data.planting_date,
@@ -497,12 +505,22 @@ async def chat(data: ChatInput):
         raise HTTPException(status_code=400, detail="Message cannot be empty")
 
     try:
-        reply = agent.generate_response(data.message, data.context, data.history)
+        reply = await agent.generate_response(data.message, data.context, data.history)
         return {'reply': reply}
     except Exception as e:
         logger.error(f"Chat Endpoint Error: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+@app.post("/chat/stream")
+async def chat_stream(data: ChatInput):
+    """
+    /chat as Server-Sent Events: `data: {"delta": ...}` per piece of the reply
+    as Gemini produces it, then `event: done` with the full reply.
+    """
+    if not data.message or not data.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    return sse_chat_response(agent.stream_response(data.message, data.context, data.history))
+
 if __name__ == '__main__':
     logger.info("Starting Smart Farming Calendar Service on Port 5004")
     uvicorn.run(app, host="0.0.0.0", port=5004)
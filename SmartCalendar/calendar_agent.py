@@ -1,6 +1,6 @@
 
 import os
-import google.generativeai as genai
+import sys
 import json
 import logging
 from dotenv import load_dotenv, find_dotenv
@@ -9,6 +9,10 @@ from datetime import datetime
 # Load environment variables from the project root .env file
 load_dotenv(find_dotenv())
 
+# Shared helpers live in the repo-root `common` package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.chat_agent import ChatAgent
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -21,71 +25,27 @@ GENERATION_CONFIG = {
 
 MAX_RETRIES = 2
 MIN_TASKS = 10
+# Schedules and answers are deterministic (temperature 0) and dated by today's date in the prompt
+CACHE_TTL_S = 24 * 3600
+
+class CalendarAgent(ChatAgent):
+    cache_namespace = "calendar"
+    cache_ttl_s = CACHE_TTL_S
+    generation_config = GENERATION_CONFIG
+    attempts = MAX_RETRIES
+    inactive_reply = "I'm sorry, but I cannot connect to my AI brain right now. Please check if the API keys are configured correctly."
 
-class CalendarAgent:
     def __init__(self):
-        # API Key Pool
-        self.api_keys = [
-            os.getenv('GOOGLE_API_KEY_1'),
-            os.getenv('GOOGLE_API_KEY_2'),
-            os.getenv('GOOGLE_API_KEY_3')
-        ]
-        # Filter out None values and placeholders
-        self.api_keys = [
-            key for key in self.api_keys
-            if key and not key.startswith('your_') and not key.startswith('PASTE_')
-        ]
-
-        self.current_key_index = 0
-        self.model = None
-        self.is_active = False
+        super().__init__()
 
         # Load Crop Requirements Data
         self.crop_data = {}
         self.yield_patterns = {}
         self._load_crop_data()
 
-        if self.api_keys:
-            self._configure_current_key()
-        else:
+        if not self.llm.is_active:
             logger.warning("No valid API keys found. AI features will be disabled.")
 
-    def _configure_current_key(self):
-        """Configures Gemini with the current active key and deterministic generation config."""
-        if not self.api_keys:
-            logger.error("No API keys available.")
-            self.is_active = False
-            return
-
-        current_key = self.api_keys[self.current_key_index]
-        try:
-            genai.configure(api_key=current_key)
-            self.model = genai.GenerativeModel(
-                'gemini-2.5-flash',
-                generation_config=GENERATION_CONFIG
-            )
-            self.is_active = True
-            logger.info(f"Switched to API Key Index: {self.current_key_index}")
-        except Exception as e:
-            logger.error(f"Error configuring key index {self.current_key_index}: {e}")
-            self.is_active = False
-            self._rotate_key()
-
-    def _rotate_key(self):
-        """Rotates to the next available API key. Only called on API-level errors."""
-        if not self.api_keys:
-            return
-
-        start_index = self.current_key_index
-        self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-        logger.warning(f"Rotating API Key... New Index: {self.current_key_index}")
-
-        if self.current_key_index != start_index:
-            self._configure_current_key()
-        else:
-            logger.error("All API keys failed.")
-            self.is_active = False
-
     def _load_crop_data(self):
         """Loads crop requirements from the JSON file."""
         try:
@@ -144,8 +104,11 @@ class CalendarAgent:
 
         return valid
 
-    def _build_schedule_prompt(self, crop, location, planting_date, soil_fertility, target_crop_id):
-        """Constructs the deterministic, structured prompt for schedule generation."""
+    def _build_schedule_prompt(self, crop, location, planting_date, soil_fertility):
+        """
+        Constructs the deterministic, structured prompt for schedule generation.
+        It holds no per-request IDs, so the same inputs on the same day hit the response cache.
+        """
         today = datetime.now().date()
         planting_date_obj = datetime.strptime(planting_date, '%Y-%m-%d').date()
         earliest_date = max(today, planting_date_obj)
@@ -165,7 +128,6 @@ INPUTS:
 - Location: {location}
 - Soil Fertility: {soil_fertility}
 - Planting Date: {planting_date}
-- Crop ID: {target_crop_id}
 - Today's Date: {today.strftime('%Y-%m-%d')}
 - Earliest Task Date: {earliest_date.strftime('%Y-%m-%d')}
 {crop_context}
@@ -191,7 +153,7 @@ Each element must follow this exact schema:
 }}"""
         return prompt
 
-    def generate_farming_schedule(self, crop, location, planting_date, soil_fertility="Unknown", crop_id=None):
+    async def generate_farming_schedule(self, crop, location, planting_date, soil_fertility="Unknown", crop_id=None):
         """
         Generates a deterministic farming schedule for a specific crop.
         Retries up to MAX_RETRIES times on parse failure or insufficient tasks.
@@ -208,18 +170,13 @@ Each element must follow this exact schema:
             return []
 
         target_crop_id = crop_id or f"crop_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        prompt = self._build_schedule_prompt(crop, location, planting_date, soil_fertility, target_crop_id)
+        prompt = self._build_schedule_prompt(crop, location, planting_date, soil_fertility)
 
         for attempt in range(MAX_RETRIES):
             try:
-                if not self.model:
-                    self._configure_current_key()
-                    if not self.is_active:
-                        return []
-
                 logger.info(f"Schedule generation attempt {attempt + 1}/{MAX_RETRIES} for '{crop}'")
-                response = self.model.generate_content(prompt)
-                response_text = response.text.strip()
+                # A single attempt: a failing key loses health and is avoided next time
+                response_text = (await self.llm.generate(prompt, attempts=1)).strip()
 
                 # Strip markdown fences if the model ignores the no-markdown rule
                 if "```json" in response_text:
@@ -232,6 +189,7 @@ Each element must follow this exact schema:
 
                 if not isinstance(raw_tasks, list):
                     logger.error(f"Expected JSON array, got {type(raw_tasks)}. Retrying...")
+                    self.llm.forget(prompt)
                     continue
 
                 # Validate task schema and filter invalid entries
@@ -247,6 +205,8 @@ Each element must follow this exact schema:
                         f"Only {len(valid_tasks)} valid tasks generated (minimum {MIN_TASKS}). "
                         f"Attempt {attempt + 1}/{MAX_RETRIES}."
                     )
+                    # Not worth serving again: the retry (and later requests) ask the model afresh
+                    self.llm.forget(prompt)
                     if attempt < MAX_RETRIES - 1:
                         continue  # Retry — same key, same prompt
                     else:
@@ -259,6 +219,7 @@ Each element must follow this exact schema:
             except json.JSONDecodeError as e:
                 # Parse failure is an OUTPUT problem, not a key problem — retry without rotating
                 logger.error(f"JSON parse error on attempt {attempt + 1}: {e}")
+                self.llm.forget(prompt)
                 if attempt < MAX_RETRIES - 1:
                     logger.info("Retrying with same key...")
                     continue
@@ -267,9 +228,8 @@ Each element must follow this exact schema:
                     return []
 
             except Exception as e:
-                # True API/connection error — rotate key, do not retry
-                logger.error(f"API Error with Key Index {self.current_key_index}: {e}")
-                self._rotate_key()
+                # True API/connection error (recorded against the key by the pool) — do not retry
+                logger.error(f"Schedule generation failed: {e}")
                 return []
 
         return []
@@ -308,30 +268,3 @@ RULES:
 - Provide region-specific advice when possible.
 """
         return prompt
-
-    def generate_response(self, user_message, context_data, history=[]):
-        """Generates a response from Gemini based on user message, context, and history."""
-        if not self.is_active:
-            return "I'm sorry, but I cannot connect to my AI brain right now. Please check if the API keys are configured correctly."
-
-        system_instruction = self.construct_chat_prompt(context_data)
-        full_prompt = f"{system_instruction}\n\n"
-        for msg in history:
-            role = "User" if msg.get('role') == 'user' else "Assistant"
-            content = msg.get('content', '')
-            full_prompt += f"{role}: {content}\n"
-        full_prompt += f"User: {user_message}\nAssistant:"
-
-        for attempt in range(MAX_RETRIES):
-            try:
-                if not self.model:
-                    self._configure_current_key()
-                    if not self.is_active:
-                        break
-                response = self.model.generate_content(full_prompt)
-                return response.text
-            except Exception as e:
-                logger.error(f"API Error with Key Index {self.current_key_index}: {e}")
-                self._rotate_key()
-
-        return "I am having trouble connecting to the knowledge base. Please try again later."
@@ -1,5 +1,5 @@
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
@@ -7,9 +7,19 @@ from typing import Optional
 import pandas as pd
 import joblib
 import numpy as np
+import os
+import sys
 import uvicorn
 from soil_agent import SoilAgent
 
+# Shared helpers live in the repo-root `common` package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.model_bundle import bundle_exists, bundle_markers, load_bundle
+from common.hot_reload import ModelSlot, artifacts_fingerprint
+from common.drift_monitor import DriftMonitor, reference_stats
+from common.sse import sse_chat_response
+from common.admin import check_admin, llm_admin_router
+
 app = FastAPI(title="AgriMitraAI - Soil Testing")
 
 app.add_middleware(
@@ -24,35 +34,122 @@ app.add_middleware(
 # 1. LOAD ARTIFACTS
 # =====================================================
 BASE_DIR = r"E:\SRI PROJECT\AgriMitraAI\SoilTesting"
-MODELS_LOADED = False
-
-try:
-    model_output = joblib.load(f"{BASE_DIR}\\soil_model.pkl")
-    scaler = joblib.load(f"{BASE_DIR}\\scaler.pkl")
-    feature_cols = joblib.load(f"{BASE_DIR}\\model_columns.pkl")
-    medians = joblib.load(f"{BASE_DIR}\\medians.pkl")
-    print("ALL Artifacts loaded successfully!")
-    MODELS_LOADED = True
-except Exception as e:
-    print(f"Error loading artifacts: {e}")
+BUNDLE_PATH = os.getenv("SOIL_BUNDLE_PATH", f"{BASE_DIR}\\soil_bundle")
+LEGACY_PATHS = [
+    f"{BASE_DIR}\\soil_model.pkl",
+    f"{BASE_DIR}\\scaler.pkl",
+    f"{BASE_DIR}\\model_columns.pkl",
+    f"{BASE_DIR}\\medians.pkl",
+]
+# Drift reference for legacy pickles, which carry no training statistics
+TRAINING_DATA_PATH = f"{BASE_DIR}\\data\\dataset1.csv"
+
+class SoilArtifacts:
+    """One consistent set of soil model artifacts; swapped as a whole on reload."""
+
+    def __init__(self, version, model_output, scaler, feature_cols, medians, fertility_labels=None,
+                 feature_stats=None):
+        self.version = version
+        self.model_output = model_output
+        self.scaler = scaler
+        self.feature_cols = feature_cols
+        self.medians = medians
+        self.fertility_labels = fertility_labels
+        # Statistics of the inputs this model version receives (before imputation)
+        self.drift = DriftMonitor(feature_cols, feature_stats)
+
+def legacy_feature_stats(feature_cols):
+    try:
+        df = pd.read_csv(TRAINING_DATA_PATH, usecols=feature_cols)
+    except (OSError, ValueError) as e:
+        print(f"No drift reference available: {e}")
+        return None
+    return reference_stats(df[feature_cols].to_numpy(np.float64), feature_cols)
+
+def load_artifacts():
+    if bundle_exists(BUNDLE_PATH):
+        # Versioned bundle written by train.py (model, scaler, schema + imputation defaults)
+        bundle = load_bundle(BUNDLE_PATH)
+        artifacts = SoilArtifacts(
+            version=bundle.version,
+            model_output=bundle.get("model"),
+            scaler=bundle.get("scaler"),
+            feature_cols=bundle.feature_names,
+            medians={f["name"]: f.get("default", 0.0) for f in bundle.manifest["feature_schema"]},
+            fertility_labels=dict(zip(bundle.model_classes.tolist(), bundle.labels)),
+            feature_stats=bundle.metadata.get("feature_stats"),
+        )
+        print(f"Model bundle {bundle.version} loaded successfully!")
+    else:
+        model_path, scaler_path, columns_path, medians_path = LEGACY_PATHS
+        feature_cols = joblib.load(columns_path)
+        artifacts = SoilArtifacts(
+            version=f"legacy-{int(os.path.getmtime(model_path))}",
+            model_output=joblib.load(model_path),
+            scaler=joblib.load(scaler_path),
+            feature_cols=feature_cols,
+            medians=joblib.load(medians_path),
+            feature_stats=legacy_feature_stats(feature_cols),
+        )
+        print("ALL Artifacts loaded successfully!")
+    return artifacts
+
+def warmup(artifacts):
+    # One prediction from the imputation defaults exercises scaler and model
+    predict_fertility(artifacts, {})
+
+# Artifacts are swapped in by POST /admin/reload or the file watcher, no restart needed
+soil_models = ModelSlot(
+    "soil-model",
+    loader=load_artifacts,
+    warmup=warmup,
+    fingerprint=lambda: artifacts_fingerprint(bundle_markers(BUNDLE_PATH) + LEGACY_PATHS),
+)
+
 
 # =====================================================
 # 2. HELPER FUNCTIONS
 # =====================================================
-def get_fertility_from_output(output_class):
+def get_fertility_from_output(output_class, fertility_labels=None):
     # Logic strictly aligned with dataset: 
     # 0 -> Low
     # 1 -> Medium
     # 2 -> High
-    mapping = {
+    mapping = fertility_labels or {
         0: 'Low',
         1: 'Medium',
         2: 'High'
     }
     return mapping.get(int(output_class), "Unknown")
 
+def predict_fertility(artifacts, input_dict):
+    """Imputes missing values, scales and predicts. Returns (output class, fertility label)."""
+    # 1. Prepare Input DataFrame
+    input_data = {}
+    for col in artifacts.feature_cols:
+         val = input_dict.get(col)
+         if val is None:
+             val = artifacts.medians.get(col, 0.0)
+         input_data[col] = val
+
+    input_df = pd.DataFrame([input_data])
+
+    # 2. Scale Features
+    input_scaled = artifacts.scaler.transform(input_df)
+
+    # 3. Predict Output (Fertility)
+    pred_output = artifacts.model_output.predict(input_scaled)[0]
+
+    # 4. Determine Fertility (Derived from Output)
+    return pred_output, get_fertility_from_output(pred_output, artifacts.fertility_labels)
+
+if not soil_models.load():
+    print("Error loading artifacts, /predict_soil disabled until a reload succeeds.")
+soil_models.watch(float(os.getenv("MODEL_WATCH_INTERVAL", "0")))
+
 # initialize agent
 agent = SoilAgent()
+app.include_router(llm_admin_router(agent))
 
 # Pydantic Models for Input Validation
 class SoilInput(BaseModel):
@@ -78,41 +175,49 @@ class ChatInput(BaseModel):
 
 @app.post('/predict_soil')
 async def predict_soil(data: SoilInput):
-    if not MODELS_LOADED:
+    # Read once so a concurrent reload cannot change the model mid-request
+    artifacts = soil_models.current
+    if artifacts is None:
         raise HTTPException(status_code=500, detail="Models not loaded. Check server logs.")
 
     try:
-        # 1. Prepare Input DataFrame
-        input_data = {}
-        input_dict = data.dict()
-        
-        for col in feature_cols:
-             val = input_dict.get(col)
-             if val is None:
-                 val = medians.get(col, 0.0)
-             input_data[col] = val
+        inputs = data.dict()
+        artifacts.drift.update([np.nan if inputs.get(col) is None else inputs[col] for col in artifacts.feature_cols])
+        pred_output, fertility = predict_fertility(artifacts, inputs)
 
-        input_df = pd.DataFrame([input_data])
-        
-        # 2. Scale Features
-        input_scaled = scaler.transform(input_df)
-        
-        # 3. Predict Output (Fertility)
-        pred_output = model_output.predict(input_scaled)[0]
-        
-        # 4. Determine Fertility (Derived from Output)
-        fertility = get_fertility_from_output(pred_output)
-        
         return {
             'prediction': int(pred_output),
             'soil_type': data.soil_type,
-            'fertility': fertility
+            'fertility': fertility,
+            'model_version': artifacts.version
         }
 
     except Exception as e:
         print(f"Prediction Error: {e}")
         raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
 
+# Plain def: wait=true joins the loader thread, which must not block the event loop
+@app.post("/admin/reload")
+def reload_model(wait: bool = False, x_admin_token: str = Header(None)):
+    """Loads and warms the current artifacts in the background, then swaps them in."""
+    check_admin(x_admin_token)
+    started = soil_models.reload(wait=wait)
+    return {'started': started, **soil_models.status}
+
+@app.get("/admin/model")
+async def model_status(x_admin_token: str = Header(None)):
+    check_admin(x_admin_token)
+    return soil_models.status
+
+@app.get("/admin/drift")
+async def drift_report(x_admin_token: str = Header(None)):
+    """Statistics of the /predict_soil inputs since the model was loaded, with PSI against its training data."""
+    check_admin(x_admin_token)
+    artifacts = soil_models.current
+    if artifacts is None:
+        raise HTTPException(status_code=500, detail="Models not loaded. Check server logs.")
+    return {**artifacts.drift.report(), 'model_version': artifacts.version}
+
 @app.post("/chat")
 async def chat(data: ChatInput):
     """
@@ -123,11 +228,21 @@ async def chat(data: ChatInput):
         raise HTTPException(status_code=400, detail="Message cannot be empty")
         
     try:
-        reply = agent.generate_response(data.message, data.context, data.history)
+        reply = await agent.generate_response(data.message, data.context, data.history)
         return {'reply': reply}
     except Exception as e:
         print(f"Chat Error: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+@app.post("/chat/stream")
+async def chat_stream(data: ChatInput):
+    """
+    /chat as Server-Sent Events: `data: {"delta": ...}` per piece of the reply
+    as Gemini produces it, then `event: done` with the full reply.
+    """
+    if not data.message:
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    return sse_chat_response(agent.stream_response(data.message, data.context, data.history))
+
 if __name__ == '__main__':
     uvicorn.run(app, host="0.0.0.0", port=5002)
@@ -1,53 +1,32 @@
 
 import os
-import google.generativeai as genai
+import sys
 import logging
 from dotenv import load_dotenv, find_dotenv
 
 # Load environment variables from the project root .env file
 load_dotenv(find_dotenv())
 
+# Shared helpers live in the repo-root `common` package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.chat_agent import ChatAgent
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class SoilAgent:
-    def __init__(self):
-        # API Key Pool
-        # You can add more keys here to distribute the load
-        self.api_keys = [
-            os.getenv('GOOGLE_API_KEY_1'),
-            os.getenv('GOOGLE_API_KEY_2'),
-            os.getenv('GOOGLE_API_KEY_3')
-        ]
-        # Filter out None values in case some keys are missing
-        self.api_keys = [key for key in self.api_keys if key]
-        self.current_key_index = 0
-        self.model = None
-        self._configure_current_key()
-    
-    def _configure_current_key(self):
-        """Configures Gemini with the current active key."""
-        if not self.api_keys:
-            logger.error("No API keys available.")
-            return
-
-        current_key = self.api_keys[self.current_key_index]
-        try:
-            genai.configure(api_key=current_key)
-            logger.info(f"Switched to API Key Index: {self.current_key_index}")
-            # Standard free tier model
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
-        except Exception as e:
-            logger.error(f"Error configuring key index {self.current_key_index}: {e}")
+# Identical questions on the same context reuse the cached answer for this long
+CACHE_TTL_S = 6 * 3600
 
-    def _rotate_key(self):
-        """Rotates to the next available API key."""
-        self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-        logger.warning(f"Rotating API Key... New Index: {self.current_key_index}")
-        self._configure_current_key()
+class SoilAgent(ChatAgent):
+    cache_namespace = "soil"
+    cache_ttl_s = CACHE_TTL_S
+    fallback_reply = "I am unable to connect to the knowledge base at the moment. All keys exhausted. Error: {error}"
+    summary_heading = "*** EARLIER CONVERSATION (SUMMARY) ***"
+    history_heading = "*** CONVERSATION HISTORY ***"
+    message_heading = "*** NEW MESSAGE ***"
 
-    def construct_system_prompt(self, context_data):
+    def construct_chat_prompt(self, context_data):
         """
         Constructs the strict system prompt for Soil Testing Advisory.
         """
@@ -96,41 +75,3 @@ RULES:
 """
 
         return prompt
-
-    def generate_response(self, user_message, context_data, history=[]):
-        """
-        Generates a response from Gemini.
-        Retries with different keys on failure.
-        """
-        system_instruction = self.construct_system_prompt(context_data)
-            
-        # Combine Prompt + History + Current Message
-        full_prompt = f"{system_instruction}\n\n*** CONVERSATION HISTORY ***\n"
-        
-        for msg in history:
-            role = "User" if msg.get('role') == 'user' else "Assistant"
-            content = msg.get('content', '')
-            full_prompt += f"{role}: {content}\n"
-        
-        full_prompt += f"\n*** NEW MESSAGE ***\nUser: {user_message}\nAssistant:"
-
-        # Try up to the number of keys available (one full rotation)
-        attempts = len(self.api_keys)
-        last_error = None
-
-        for _ in range(attempts):
-            try:
-                if not self.model:
-                     self._configure_current_key()
-                
-                response = self.model.generate_content(full_prompt)
-                return response.text
-            except Exception as e:
-                logger.error(f"API Error with Key Index {self.current_key_index}: {e}")
-                last_error = e
-                # Rotate and retry
-                self._rotate_key()
-
-        # If all keys failed
-        logger.error("All API keys exhausted.")
-        return f"I am unable to connect to the knowledge base at the moment. All keys exhausted. Error: {str(last_error)}"
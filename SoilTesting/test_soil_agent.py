@@ -1,6 +1,7 @@
 
 import sys
 import os
+import asyncio
 
 # Add the directory to sys.path to import modules
 sys.path.append(r"e:\SRI PROJECT\AgriMitraAI\SoilTesting")
@@ -30,7 +31,7 @@ def test_soil_agent():
     print(f"Context: {context}")
     
     try:
-        response = agent.generate_response(user_message, context)
+        response = asyncio.run(agent.generate_response(user_message, context))
         print("\n--- Agent Response ---")
         print(response)
         print("\n----------------------")
@@ -1,3 +1,5 @@
+import os
+import sys
 import pandas as pd
 import joblib
 import numpy as np
@@ -6,6 +8,11 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import accuracy_score, classification_report
 
+# Shared helpers live in the repo-root `common` package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.model_bundle import save_bundle
+from common.drift_monitor import reference_stats
+
 # 1. Load Data
 DATA_PATH = r"E:\SRI PROJECT\AgriMitraAI\SoilTesting\data\dataset1.csv"
 print(f"Loading data from: {DATA_PATH}")
@@ -77,4 +84,17 @@ joblib.dump(scaler, f"{SAVE_DIR}\\scaler.pkl")                 # Scaler
 joblib.dump(feature_cols, f"{SAVE_DIR}\\model_columns.pkl")    # Columns list
 joblib.dump(medians, f"{SAVE_DIR}\\medians.pkl")                # Medians for Imputation
 
+# Versioned bundle (model + scaler + schema with imputation defaults) used by app.py
+manifest = save_bundle(
+    f"{SAVE_DIR}\\soil_bundle",
+    objects={"model": model_output, "scaler": scaler},
+    feature_schema=[{"name": col, "dtype": "float", "default": medians[col]} for col in feature_cols],
+    labels=["Low", "Medium", "High"],
+    model_classes=model_output.classes_,
+    training_data_path=DATA_PATH,
+    # Training feature statistics: the baseline for drift monitoring in app.py
+    metadata={"model_name": "Random Forest", "feature_stats": reference_stats(X_train_raw, feature_cols)},
+)
+print(f"Model bundle {manifest['model_version']} saved to {SAVE_DIR}\\soil_bundle")
+
 print("\nAll models and artifacts saved successfully!")
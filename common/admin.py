@@ -0,0 +1,35 @@
+"""
+Admin endpoint guard shared by the services.
+
+Admin routes take the shared secret in the X-Admin-Token header and compare
+it with MODEL_ADMIN_TOKEN; without a configured token they stay closed.
+"""
+import hmac
+import os
+
+from fastapi import APIRouter, Header, HTTPException
+
+
+def check_admin(token):
+    # Read per call so a .env loaded after import still applies
+    admin_token = os.getenv("MODEL_ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set MODEL_ADMIN_TOKEN.")
+    if not hmac.compare_digest(token or '', admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+
+def llm_admin_router(agent):
+    """GET /admin/llm for a ChatAgent, to mount with app.include_router()."""
+    router = APIRouter()
+
+    @router.get("/admin/llm")
+    async def llm_status(x_admin_token: str = Header(None)):
+        """
+        Request budget, health, cooldown and error counts of every Gemini API key
+        used by the agent, plus response cache and history summary counters.
+        """
+        check_admin(x_admin_token)
+        return {**agent.llm.stats(), 'history': agent.history.stats()}
+
+    return router
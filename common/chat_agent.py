@@ -0,0 +1,103 @@
+"""
+Chat flow shared by the service agents.
+
+Each agent subclasses ChatAgent, sets its cache namespace and fallback reply,
+and implements construct_chat_prompt(context_data). Prompt assembly, history
+budgeting, key fallback and streaming live here.
+"""
+import logging
+
+from common.llm_client import LLMClient, LLMError
+from common.llm_cache import response_cache
+from common.chat_history import HistoryManager
+
+logger = logging.getLogger(__name__)
+
+
+class ChatAgent:
+    # Response cache namespace and how long identical questions reuse an answer
+    cache_namespace = None
+    cache_ttl_s = 6 * 3600
+    generation_config = None
+    # Keys tried per request (None = every key in the pool)
+    attempts = None
+    # Reply when every key failed; may use {error}
+    fallback_reply = "I am having trouble connecting to the knowledge base. Please try again later."
+    # Reply when no API keys are configured (None = try anyway and fall back)
+    inactive_reply = None
+    # Prompt section headings; history/message headings are optional
+    summary_heading = "EARLIER CONVERSATION (summary):"
+    history_heading = None
+    message_heading = None
+
+    def __init__(self):
+        # Gemini calls (key pool, worker threads, concurrency limit) go through the shared client
+        self.llm = LLMClient(generation_config=self.generation_config,
+                             cache=response_cache(self.cache_namespace, self.cache_ttl_s))
+        # Recent turns verbatim, older ones as a rolling summary, within a token budget
+        self.history = HistoryManager(self.llm)
+
+    @property
+    def is_active(self):
+        return self.llm.is_active
+
+    def construct_chat_prompt(self, context_data):
+        """System prompt for one request, built from the prediction context."""
+        raise NotImplementedError
+
+    def build_prompt(self, user_message, context_data, history=None, summary=None):
+        """System prompt, summary of earlier turns, recent history and the new message as one prompt."""
+        full_prompt = f"{self.construct_chat_prompt(context_data)}\n\n"
+        if summary:
+            full_prompt += f"{self.summary_heading}\n{summary}\n\n"
+        if self.history_heading:
+            full_prompt += f"{self.history_heading}\n"
+        for msg in history or []:
+            role = "User" if msg.get('role') == 'user' else "Assistant"
+            content = msg.get('content', '')
+            full_prompt += f"{role}: {content}\n"
+        if self.message_heading:
+            full_prompt += f"\n{self.message_heading}\n"
+        full_prompt += f"User: {user_message}\nAssistant:"
+        return full_prompt
+
+    def _fallback(self, error):
+        logger.error("All API keys exhausted.")
+        return self.fallback_reply.format(error=error.last_error)
+
+    async def generate_response(self, user_message, context_data, history=None):
+        """
+        Generates a response from Gemini based on user message, context, and history.
+        Retries with different keys on failure.
+        """
+        if self.inactive_reply and not self.is_active:
+            return self.inactive_reply
+
+        summary, history = await self.history.prepare(history)
+        full_prompt = self.build_prompt(user_message, context_data, history, summary)
+        try:
+            return await self.llm.generate(full_prompt, attempts=self.attempts)
+        except LLMError as e:
+            return self._fallback(e)
+
+    async def stream_response(self, user_message, context_data, history=None):
+        """
+        generate_response() delivered in pieces as Gemini produces them. Until
+        the first piece arrives, failures fall back to other keys and finally
+        to the same error reply.
+        """
+        if self.inactive_reply and not self.is_active:
+            yield self.inactive_reply
+            return
+
+        summary, history = await self.history.prepare(history)
+        full_prompt = self.build_prompt(user_message, context_data, history, summary)
+        started = False
+        try:
+            async for piece in self.llm.stream(full_prompt, attempts=self.attempts):
+                started = True
+                yield piece
+        except LLMError as e:
+            if started:
+                raise
+            yield self._fallback(e)
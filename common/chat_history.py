@@ -0,0 +1,154 @@
+"""
+Token-budgeted conversation history for the chat agents.
+
+Clients send the whole conversation with every /chat request. Instead of
+pasting all of it into the prompt, prepare() keeps the most recent turns
+verbatim and folds everything before them into a rolling summary. The
+summary boundary only advances every `summary_every` turns, and each new
+summary is built from the previous one plus the turns it now also covers,
+so most requests reuse a cached summary and none re-read the whole
+conversation. Summaries are cached in memory by a hash of the history prefix
+they cover; the summarization call itself also goes through the agent's
+response cache when it has one.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+from collections import OrderedDict
+
+from common.llm_client import LLMError
+
+logger = logging.getLogger(__name__)
+
+# Tokens the summary plus verbatim history may take in a prompt (0 = send the full history)
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+# Most recent turns (user message + reply) always kept word for word, budget permitting
+KEEP_TURNS = int(os.getenv("CHAT_HISTORY_KEEP_TURNS", "4"))
+# The summary moves forward in steps of this many turns
+SUMMARY_EVERY_TURNS = int(os.getenv("CHAT_HISTORY_SUMMARY_EVERY", "4"))
+# Cached summaries per process
+SUMMARY_CACHE_SIZE = 1024
+SUMMARY_MAX_WORDS = 120
+# Rough Gemini ratio for English text; good enough for budgeting without an API round-trip
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def message_tokens(messages):
+    # Role label and line break of every message included
+    return sum(estimate_tokens(str(msg.get('content', ''))) + 3 for msg in messages)
+
+
+def _prefix_key(messages):
+    payload = json.dumps([[msg.get('role'), msg.get('content', '')] for msg in messages], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def summary_prompt(previous_summary, messages):
+    lines = "\n".join(f"{'User' if msg.get('role') == 'user' else 'Assistant'}: {msg.get('content', '')}"
+                      for msg in messages)
+    previous = f"SUMMARY SO FAR:\n{previous_summary}\n\n" if previous_summary else ""
+    return f"""You maintain a running summary of a farmer's conversation with an agricultural advisory assistant.
+
+{previous}NEW TURNS:
+{lines}
+
+Write the updated summary of the whole conversation in at most {SUMMARY_MAX_WORDS} words.
+Keep facts the farmer gave (crop, location, soil and weather values, dates, problems) and advice already given or decided.
+Plain sentences only. No preamble."""
+
+
+class HistoryManager:
+    """
+    llm           : the agent's LLMClient, used for summaries
+    budget_tokens : limit for summary + verbatim history (0 = no limit, history passed through)
+    keep_turns    : turns always kept verbatim while the budget allows
+    summary_every : turns the summary boundary advances at a time
+    """
+
+    def __init__(self, llm, budget_tokens=HISTORY_TOKEN_BUDGET, keep_turns=KEEP_TURNS,
+                 summary_every=SUMMARY_EVERY_TURNS):
+        self.llm = llm
+        self.budget_tokens = budget_tokens
+        self.keep_messages = 2 * keep_turns
+        self.step = 2 * max(1, summary_every)
+        self._summaries = OrderedDict()
+        self.summaries_computed = 0
+        self.summaries_reused = 0
+        self.summary_failures = 0
+        self.messages_dropped = 0
+
+    def _cached(self, messages):
+        key = _prefix_key(messages)
+        summary = self._summaries.get(key)
+        if summary is not None:
+            self._summaries.move_to_end(key)
+        return summary
+
+    def _store(self, messages, summary):
+        self._summaries[_prefix_key(messages)] = summary
+        while len(self._summaries) > SUMMARY_CACHE_SIZE:
+            self._summaries.popitem(last=False)
+
+    async def _summary_until(self, history, cover):
+        """Summary of history[:cover], rolled forward from the newest cached earlier boundary."""
+        summary = self._cached(history[:cover])
+        if summary is not None:
+            self.summaries_reused += 1
+            return summary
+        previous, start = None, 0
+        for boundary in range(cover - self.step, 0, -self.step):
+            previous = self._cached(history[:boundary])
+            if previous is not None:
+                start = boundary
+                break
+        summary = (await self.llm.generate(summary_prompt(previous, history[start:cover]))).strip()
+        self.summaries_computed += 1
+        self._store(history[:cover], summary)
+        return summary
+
+    async def prepare(self, history):
+        """
+        (summary or None, recent messages) to put in the prompt in place of
+        `history`, together within budget_tokens.
+        """
+        history = [msg for msg in history or [] if isinstance(msg, dict)]
+        if not self.budget_tokens or (len(history) <= self.keep_messages
+                                      and message_tokens(history) <= self.budget_tokens):
+            return None, history
+
+        # Largest step boundary that leaves at least keep_turns verbatim
+        cover = max(0, len(history) - self.keep_messages) // self.step * self.step
+        summary = None
+        if cover > 0:
+            try:
+                summary = await self._summary_until(history, cover)
+            except LLMError as e:
+                # Without a summary the older turns are simply left out
+                self.summary_failures += 1
+                logger.warning(f"History summary failed, dropping {cover} older messages: {e}")
+        recent = history[cover:]
+
+        # Still over budget (long messages): drop the oldest verbatim ones, never the last turn
+        budget = self.budget_tokens - estimate_tokens(summary or "")
+        while len(recent) > 2 and message_tokens(recent) > budget:
+            recent = recent[1:]
+            self.messages_dropped += 1
+        return summary, recent
+
+    def stats(self):
+        return {
+            "budget_tokens": self.budget_tokens,
+            "keep_turns": self.keep_messages // 2,
+            "summary_every_turns": self.step // 2,
+            "summaries_cached": len(self._summaries),
+            "summaries_computed": self.summaries_computed,
+            "summaries_reused": self.summaries_reused,
+            "summary_failures": self.summary_failures,
+            "messages_dropped": self.messages_dropped,
+        }
@@ -0,0 +1,192 @@
+import threading
+import time
+import numpy as np
+
+
+# Reference bins per feature (training-set quantiles, so each holds ~1/DEFAULT_BINS of the rows)
+DEFAULT_BINS = 10
+# Floor for empty bins in the PSI formula
+PSI_EPSILON = 1e-4
+# Conventional PSI bands: < 0.1 stable, 0.1-0.25 moderate shift, > 0.25 major shift
+PSI_MODERATE = 0.1
+PSI_MAJOR = 0.25
+# Below this many observed values a feature's PSI is reported but not judged
+MIN_SAMPLES = 100
+
+
+def reference_stats(X, feature_names, bins=DEFAULT_BINS):
+    """
+    Training-set statistics stored with the model artifacts: count, mean, std,
+    quantile bin edges and the share of rows in each bin, per feature.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    stats = {}
+    for j, name in enumerate(feature_names):
+        values = X[:, j][~np.isnan(X[:, j])]
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1])) if len(values) else np.array([])
+        counts = np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1)
+        stats[name] = {
+            "count": int(len(values)),
+            "mean": float(values.mean()) if len(values) else None,
+            "std": float(values.std()) if len(values) else None,
+            "edges": edges.tolist(),
+            "proportions": (counts / max(len(values), 1)).tolist(),
+        }
+    return stats
+
+
+def psi(expected, actual):
+    """Population stability index between two bin-share vectors."""
+    expected = np.maximum(np.asarray(expected, dtype=np.float64), PSI_EPSILON)
+    actual = np.maximum(np.asarray(actual, dtype=np.float64), PSI_EPSILON)
+    return float(((actual - expected) * np.log(actual / expected)).sum())
+
+
+class _Shard:
+    """Running statistics written by one thread only."""
+
+    def __init__(self, n_features, n_bins):
+        self.rows = 0
+        self.count = np.zeros(n_features)
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.missing = np.zeros(n_features)
+        self.hist = np.zeros(n_features * n_bins)
+
+
+class DriftMonitor:
+    """
+    Running per-feature mean/variance (Welford, merged with Chan's formula for
+    batches) and fixed-bin histograms of the inputs a model actually receives,
+    compared against the training-set reference on demand.
+
+    update() is O(features) per call and takes no lock: every thread writes to
+    its own shard, and report() merges the shards.
+    """
+
+    def __init__(self, feature_names, reference=None):
+        self.feature_names = list(feature_names)
+        self.reference = reference or {}
+        n_features = len(self.feature_names)
+        edge_lists = [self.reference.get(name, {}).get("edges", []) for name in self.feature_names]
+        self.n_bins = max(len(edges) for edges in edge_lists) + 1 if edge_lists else 1
+        # Padded with +inf so one comparison bins every feature at once
+        self.edges = np.full((n_features, self.n_bins - 1), np.inf)
+        for j, edges in enumerate(edge_lists):
+            self.edges[j, :len(edges)] = edges
+        self.bin_offsets = np.arange(n_features) * self.n_bins
+        self.started_at = time.time()
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = _Shard(len(self.feature_names), self.n_bins)
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def update(self, rows):
+        """Adds one feature row or a batch of rows (NaN = missing value)."""
+        X = np.asarray(rows, dtype=np.float64).reshape(-1, len(self.feature_names))
+        shard = self._shard()
+        shard.rows += len(X)
+        if len(X) == 1:
+            self._update_row(shard, X[0])
+            return
+        valid = ~np.isnan(X)
+        n_b = valid.sum(axis=0)
+        shard.missing += len(X) - n_b
+        if not n_b.any():
+            return
+        filled = np.where(valid, X, 0.0)
+        mean_b = filled.sum(axis=0) / np.maximum(n_b, 1)
+        m2_b = (np.where(valid, X - mean_b, 0.0) ** 2).sum(axis=0)
+        n = shard.count + n_b
+        delta = mean_b - shard.mean
+        shard.mean += delta * n_b / np.maximum(n, 1)
+        shard.m2 += m2_b + delta ** 2 * shard.count * n_b / np.maximum(n, 1)
+        shard.count = n
+
+        bins = (X[:, :, None] >= self.edges[None]).sum(axis=2) + self.bin_offsets
+        shard.hist += np.bincount(bins[valid], minlength=shard.hist.size)
+
+    def _update_row(self, shard, x):
+        # Welford's single-observation step, the common /predict case
+        valid = ~np.isnan(x)
+        shard.missing += ~valid
+        n = shard.count + valid
+        delta = np.where(valid, x - shard.mean, 0.0)
+        shard.mean += delta / np.maximum(n, 1)
+        shard.m2 += delta * np.where(valid, x - shard.mean, 0.0)
+        shard.count = n
+        bins = (x[:, None] >= self.edges).sum(axis=1) + self.bin_offsets
+        shard.hist[bins[valid]] += 1
+
+    def _merged(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+        n_features = len(self.feature_names)
+        count, mean, m2 = np.zeros(n_features), np.zeros(n_features), np.zeros(n_features)
+        missing, hist = np.zeros(n_features), np.zeros(n_features * self.n_bins)
+        rows = 0
+        for shard in shards:
+            rows += shard.rows
+            n_b, mean_b = shard.count.copy(), shard.mean.copy()
+            n = count + n_b
+            delta = mean_b - mean
+            mean = mean + delta * n_b / np.maximum(n, 1)
+            m2 = m2 + shard.m2 + delta ** 2 * count * n_b / np.maximum(n, 1)
+            count = n
+            missing += shard.missing
+            hist += shard.hist
+        return rows, count, mean, m2, missing, hist.reshape(n_features, self.n_bins)
+
+    def report(self):
+        """Per-feature live statistics, shift against the reference and PSI."""
+        rows, count, mean, m2, missing, hist = self._merged()
+        features = {}
+        for j, name in enumerate(self.feature_names):
+            ref = self.reference.get(name)
+            std = float(np.sqrt(m2[j] / count[j])) if count[j] else None
+            entry = {
+                "count": int(count[j]),
+                "missing": int(missing[j]),
+                "mean": round(float(mean[j]), 4) if count[j] else None,
+                "std": round(std, 4) if std is not None else None,
+            }
+            if ref and ref.get("proportions"):
+                n_ref_bins = len(ref["proportions"])
+                observed = hist[j, :n_ref_bins] / count[j] if count[j] else np.zeros(n_ref_bins)
+                score = psi(ref["proportions"], observed) if count[j] else None
+                entry.update({
+                    "reference_mean": round(ref["mean"], 4),
+                    "reference_std": round(ref["std"], 4),
+                    "mean_shift_std": round(float((mean[j] - ref["mean"]) / ref["std"]), 4) if count[j] and ref["std"] else None,
+                    "psi": round(score, 4) if score is not None else None,
+                    "status": _status(score, count[j]),
+                })
+            features[name] = entry
+
+        scores = {name: f["psi"] for name, f in features.items() if f.get("psi") is not None}
+        return {
+            "since": self.started_at,
+            "observations": rows,
+            "has_reference": bool(self.reference),
+            "max_psi": max(scores.values()) if scores else None,
+            "drifted_features": [name for name, f in features.items() if f.get("status") in ("moderate", "major")],
+            "features": features,
+        }
+
+
+def _status(score, count):
+    if score is None or count < MIN_SAMPLES:
+        return "insufficient_data"
+    if score >= PSI_MAJOR:
+        return "major"
+    if score >= PSI_MODERATE:
+        return "moderate"
+    return "stable"
@@ -0,0 +1,136 @@
+"""
+Zero-downtime model reloading for the prediction services.
+
+A ModelSlot holds the model object currently serving requests. Reloads build
+and warm the replacement on a background thread and then swap the reference
+in one assignment, so requests never see a half-loaded model and never wait
+on a reload. Handlers should read `slot.current` once per request and use
+that object throughout.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+
+def artifacts_fingerprint(paths):
+    """(path, mtime) of every existing artifact path; changes when any of them is rewritten."""
+    fingerprint = []
+    for path in paths:
+        try:
+            fingerprint.append((path, os.path.getmtime(path)))
+        except OSError:
+            continue
+    return tuple(fingerprint)
+
+
+class ModelSlot:
+    """
+    loader      : () -> model, raises on failure
+    warmup      : (model) -> None, a few predictions run before the swap
+    fingerprint : () -> hashable, polled by the watcher to detect new artifacts
+    version_of  : (model) -> str, reported in status and responses
+    """
+
+    def __init__(self, name, loader, warmup=None, fingerprint=None, version_of=None):
+        self.name = name
+        self._loader = loader
+        self._warmup = warmup
+        self._fingerprint = fingerprint
+        self._version_of = version_of or (lambda model: getattr(model, "version", None))
+        self.current = None
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+        self._seen_fingerprint = None
+        self.status = {
+            "state": "empty",
+            "version": None,
+            "loaded_at": None,
+            "load_ms": None,
+            "last_error": None,
+            "reloads": 0,
+        }
+
+    @property
+    def version(self):
+        model = self.current
+        return self._version_of(model) if model is not None else None
+
+    def _load_and_swap(self):
+        fingerprint = self._fingerprint() if self._fingerprint else None
+        start = time.perf_counter()
+        try:
+            model = self._loader()
+            if self._warmup is not None:
+                self._warmup(model)
+        except Exception as e:
+            logger.error(f"{self.name}: reload failed, keeping version {self.version}: {e}")
+            self.status.update(state="failed" if self.current is None else "serving", last_error=str(e))
+            # Do not retry the same broken artifacts on every watcher tick
+            self._seen_fingerprint = fingerprint
+            return False
+
+        previous = self.version
+        self.current = model
+        self._seen_fingerprint = fingerprint
+        self.status.update(
+            state="serving",
+            version=self._version_of(model),
+            loaded_at=datetime.now(timezone.utc).isoformat(),
+            load_ms=round((time.perf_counter() - start) * 1000, 1),
+            last_error=None,
+            reloads=self.status["reloads"] + (previous is not None),
+        )
+        logger.info(f"{self.name}: serving version {self.status['version']} (was {previous}).")
+        return True
+
+    def load(self):
+        """Loads synchronously (used at startup). Returns True when a model is serving."""
+        with self._reload_lock:
+            self.status["state"] = "loading"
+            return self._load_and_swap()
+
+    def reload(self, wait=False):
+        """
+        Starts a background reload. Returns False when one is already running.
+        With wait=True the call blocks until the new model is serving (or failed).
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        self.status["state"] = "loading" if self.current is None else "reloading"
+
+        def run():
+            try:
+                self._load_and_swap()
+            finally:
+                self._reload_lock.release()
+
+        thread = threading.Thread(target=run, name=f"{self.name}-reload", daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+        return True
+
+    def watch(self, interval):
+        """Polls the artifact fingerprint every `interval` seconds and reloads on change."""
+        if self._fingerprint is None or interval <= 0 or self._watcher is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    if self._fingerprint() != self._seen_fingerprint:
+                        logger.info(f"{self.name}: artifacts changed on disk, reloading.")
+                        self.reload()
+                except Exception as e:
+                    logger.error(f"{self.name}: watcher error: {e}")
+
+        self._watcher = threading.Thread(target=run, name=f"{self.name}-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
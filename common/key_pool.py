@@ -0,0 +1,186 @@
+"""
+Pool of Gemini API keys shared by the concurrent requests of one service.
+
+Every key has its own genai client (no process-global SDK state), a
+token-bucket request budget, a health score (moving averages of error rate
+and latency) and a cooldown after quota errors. acquire() hands out the
+healthiest key that has budget left, preferring the least recently used on
+ties, so requests spread over the keys instead of draining one until it
+fails. When every key is out of budget or cooling down it waits, up to
+`max_wait` seconds, for the first one to come back.
+"""
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Request budget per key: sustained requests per minute and burst size
+KEY_RPM = float(os.getenv("LLM_KEY_RPM", "10"))
+KEY_BURST = int(os.getenv("LLM_KEY_BURST", "3"))
+# Seconds a key is skipped after a quota / rate-limit (HTTP 429) error
+QUOTA_COOLDOWN = float(os.getenv("LLM_KEY_COOLDOWN", "60"))
+# Longest acquire() waits for a key with budget before giving up
+MAX_WAIT = float(os.getenv("LLM_KEY_MAX_WAIT", "10"))
+# Weight of the newest call in the error-rate and latency moving averages
+HEALTH_ALPHA = 0.2
+# Latency at which the health score is halved (on top of the error rate)
+LATENCY_SCALE_S = 10.0
+
+
+def is_quota_error(error):
+    """True for Gemini quota / rate-limit errors (google.genai APIError or ResourceExhausted, HTTP 429)."""
+    return (getattr(error, "code", None) == 429
+            or type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+            or "quota" in str(error).lower())
+
+
+class NoKeyAvailable(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate_per_s, capacity):
+        self.rate = rate_per_s
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now):
+        self._refill(now)
+        return self.tokens
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def seconds_until_token(self, now):
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class KeySlot:
+    """One API key with its client, budget and health (guarded by the pool's lock)."""
+
+    def __init__(self, index, api_key, client, rpm, burst):
+        self.index = index
+        self.label = f"...{api_key[-4:]}" if len(api_key) > 8 else f"key{index}"
+        self.client = client
+        self.bucket = TokenBucket(rpm / 60.0, burst)
+        self.cooldown_until = 0.0
+        self.error_rate = 0.0
+        self.latency_s = None
+        self.last_used = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.quota_errors = 0
+        self.last_error = None
+
+    def health(self):
+        """1.0 for a key that never fails and answers instantly, towards 0 as errors and latency grow."""
+        latency_penalty = 1.0 / (1.0 + (self.latency_s or 0.0) / LATENCY_SCALE_S)
+        return (1.0 - self.error_rate) * latency_penalty
+
+    def usable(self, now):
+        return self.client is not None and now >= self.cooldown_until and self.bucket.available(now) >= 1
+
+
+class KeyPool:
+    """
+    api_keys       : the keys, in configuration order
+    client_factory : (api_key) -> client with generate_content(); called once per key
+    """
+
+    def __init__(self, api_keys, client_factory, rpm=KEY_RPM, burst=KEY_BURST,
+                 cooldown=QUOTA_COOLDOWN, max_wait=MAX_WAIT):
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self.slots = []
+        for index, api_key in enumerate(api_keys):
+            try:
+                client = client_factory(api_key)
+            except Exception as e:
+                client = None
+                logger.error(f"Error configuring key index {index}: {e}")
+            self.slots.append(KeySlot(index, api_key, client, rpm, burst))
+        self.waits = 0
+        self.exhausted = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def acquire(self, exclude=()):
+        """
+        Takes one request of budget from the best usable key and returns its
+        slot. Keys in `exclude` (already tried by this call) are used only if
+        no other key is usable. Raises NoKeyAvailable after max_wait seconds.
+        """
+        deadline = time.monotonic() + self.max_wait
+        waited = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                usable = [slot for slot in self.slots if slot.usable(now)]
+                fresh = [slot for slot in usable if slot.index not in exclude] or usable
+                if fresh:
+                    # Health compared in steps of 0.1, so near-equal keys take turns
+                    slot = max(fresh, key=lambda s: (round(s.health(), 1), -s.last_used))
+                    slot.bucket.take(now)
+                    slot.last_used = now
+                    slot.in_flight += 1
+                    slot.requests += 1
+                    return slot
+                pending = [slot for slot in self.slots if slot.client is not None]
+                wait = min((max(slot.cooldown_until - now, slot.bucket.seconds_until_token(now)) for slot in pending),
+                           default=float("inf"))
+                if not waited:
+                    self.waits += 1
+                    waited = True
+                if now + wait > deadline:
+                    self.exhausted += 1
+                    raise NoKeyAvailable(
+                        f"No API key available within {self.max_wait:.0f} s (all out of budget or cooling down)")
+            time.sleep(max(wait, 0.01))
+
+    def release(self, slot, latency_s, error=None):
+        """Records the outcome of a call made with `slot`."""
+        with self._lock:
+            slot.in_flight -= 1
+            slot.error_rate += HEALTH_ALPHA * ((error is not None) - slot.error_rate)
+            if error is None:
+                slot.latency_s = latency_s if slot.latency_s is None else (
+                    slot.latency_s + HEALTH_ALPHA * (latency_s - slot.latency_s))
+                return
+            slot.errors += 1
+            slot.last_error = f"{type(error).__name__}: {error}"
+            if is_quota_error(error):
+                slot.quota_errors += 1
+                slot.cooldown_until = time.monotonic() + self.cooldown
+                logger.warning(f"API key index {slot.index} hit its quota; cooling down for {self.cooldown:.0f} s")
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            keys = [{
+                "index": slot.index,
+                "key": slot.label,
+                "configured": slot.client is not None,
+                "health": round(slot.health(), 3),
+                "error_rate": round(slot.error_rate, 3),
+                "latency_ms": round(slot.latency_s * 1000, 1) if slot.latency_s is not None else None,
+                "tokens": round(slot.bucket.available(now), 2),
+                "cooldown_remaining_s": round(max(0.0, slot.cooldown_until - now), 1),
+                "in_flight": slot.in_flight,
+                "requests": slot.requests,
+                "errors": slot.errors,
+                "quota_errors": slot.quota_errors,
+                "last_error": slot.last_error,
+            } for slot in self.slots]
+            return {"waits": self.waits, "exhausted": self.exhausted, "keys": keys}
@@ -0,0 +1,181 @@
+"""
+Persistent cache of LLM responses, keyed on the normalized prompt.
+
+A small in-memory LRU sits in front of a local SQLite file, so hits survive
+restarts and are shared by every worker and service that points at the same
+file. Entries expire after the namespace's TTL; the file is trimmed to
+`max_entries` (least recently used first) as new entries arrive. The prompt
+already holds the system prompt, history and new message, so identical
+questions against the same prediction context share one entry.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                       "llm_cache.sqlite3"))
+# Rows kept in the SQLite file across all namespaces
+MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+# Entries held in memory per cache
+MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "512"))
+# Trim the file once every this many writes
+PRUNE_EVERY = 100
+
+
+def normalize_prompt(prompt):
+    """Case- and whitespace-insensitive form of a prompt, so trivially different questions share an entry."""
+    return " ".join(prompt.split()).casefold()
+
+
+def response_cache(namespace, default_ttl):
+    """
+    The cache an agent opts into, or None when disabled with LLM_CACHE_<NAMESPACE>=0.
+    LLM_CACHE_TTL_<NAMESPACE> overrides the TTL in seconds.
+    """
+    name = namespace.upper()
+    if os.getenv(f"LLM_CACHE_{name}", "1") == "0":
+        return None
+    try:
+        return ResponseCache(namespace, ttl=float(os.getenv(f"LLM_CACHE_TTL_{name}", default_ttl)))
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"LLM response cache unavailable for {namespace}: {e}")
+        return None
+
+
+class ResponseCache:
+    def __init__(self, namespace, ttl, path=CACHE_PATH, max_entries=MAX_ENTRIES, memory_entries=MEMORY_ENTRIES):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.errors = 0
+        with self._connection() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, namespace TEXT, response TEXT,
+                created REAL, expires REAL, last_used REAL)""")
+            db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def _connection(self):
+        # SQLite connections are per thread; WAL lets workers read while another writes
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def key(self, prompt, model_name=None, generation_config=None):
+        payload = json.dumps([self.namespace, model_name, generation_config, normalize_prompt(prompt)],
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Cached response text, or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[1]
+            self._memory.pop(key, None)
+        try:
+            db = self._connection()
+            row = db.execute("SELECT response, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > now:
+                with db:
+                    db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"LLM cache read failed: {e}")
+            row = None
+        with self._lock:
+            if row is None or row[1] <= now:
+                self.misses += 1
+                self.expired += row is not None
+                return None
+            self.disk_hits += 1
+            self._remember(key, row[1], row[0])
+        return row[0]
+
+    def put(self, key, response):
+        now = time.time()
+        expires = now + self.ttl
+        with self._lock:
+            self._remember(key, expires, response)
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+        try:
+            db = self._connection()
+            with db:
+                db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                           (key, self.namespace, response, now, expires, now))
+            if prune:
+                self.prune()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def forget(self, key):
+        """Drops an entry, e.g. a response the caller found unusable."""
+        with self._lock:
+            self._memory.pop(key, None)
+        try:
+            db = self._connection()
+            with db:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"LLM cache delete failed: {e}")
+
+    def prune(self):
+        """Deletes expired rows, then the least recently used beyond max_entries."""
+        db = self._connection()
+        with db:
+            db.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+            db.execute("""DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)""", (self.max_entries,))
+
+    def _remember(self, key, expires, response):
+        self._memory[key] = (expires, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        try:
+            rows = self._connection().execute(
+                "SELECT COUNT(*) FROM responses WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+        except sqlite3.Error:
+            rows = None
+        return {
+            "namespace": self.namespace,
+            "path": self.path,
+            "ttl_s": self.ttl,
+            "entries": rows,
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "errors": self.errors,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else None,
+        }
@@ -0,0 +1,285 @@
+"""
+Shared Gemini client for the advisory agents (crop, plant, soil, calendar).
+
+The google-genai SDK call is blocking, so generate() runs it on a
+worker thread and awaits the result: a slow completion holds one worker, not
+the service's event loop. The worker pool is the concurrency limit; calls
+beyond it wait in the pool's queue. Each agent keeps its own prompt builders
+and only hands the finished prompt to the client. Keys, their rate budgets
+and health live in a KeyPool (common/key_pool.py); with a ResponseCache
+(common/llm_cache.py) repeated prompts are answered without a call.
+stream() yields the completion in pieces as the SDK delivers them, for the
+/chat/stream endpoints.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common.key_pool import KeyPool, NoKeyAvailable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+API_KEY_VARS = ("GOOGLE_API_KEY_1", "GOOGLE_API_KEY_2", "GOOGLE_API_KEY_3")
+# Gemini calls in flight per service process; further calls wait for a free worker
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Finish reasons that mean the rest of a streamed reply was withheld
+BLOCKED_FINISH_REASONS = {"SAFETY", "RECITATION", "BLOCKLIST", "PROHIBITED_CONTENT", "SPII"}
+
+
+def chunk_text(chunk):
+    """Text of a streamed chunk: "" if it carries none, None if its candidate was blocked."""
+    try:
+        text = chunk.text
+    except ValueError as e:
+        # Older SDKs raise instead of returning None for blocked or empty candidates
+        logger.warning(f"Stream chunk without text: {e}")
+        return None
+    if text:
+        return text
+    if getattr(getattr(chunk, "prompt_feedback", None), "block_reason", None):
+        return None
+    for candidate in getattr(chunk, "candidates", None) or []:
+        reason = getattr(candidate, "finish_reason", None)
+        if getattr(reason, "name", reason) in BLOCKED_FINISH_REASONS:
+            logger.warning(f"Stream chunk blocked: {reason}")
+            return None
+    return ""
+
+
+def api_keys_from_env():
+    """Configured GOOGLE_API_KEY_* values, skipping empty ones and .env.example placeholders."""
+    keys = [os.getenv(var) for var in API_KEY_VARS]
+    return [key for key in keys if key and not key.startswith(("your_", "PASTE_"))]
+
+
+class GeminiClient:
+    """
+    One key's own genai.Client (google-genai SDK), bound to a model name and
+    generation config. Each key gets its own instance, so calls on different
+    keys never share or swap SDK state.
+    """
+
+    def __init__(self, api_key, model_name, generation_config=None):
+        from google import genai
+
+        self.client = genai.Client(api_key=api_key)
+        self.model_name = model_name
+        self.generation_config = generation_config
+
+    def generate_content(self, prompt, stream=False):
+        models = self.client.models
+        call = models.generate_content_stream if stream else models.generate_content
+        return call(model=self.model_name, contents=prompt, config=self.generation_config)
+
+
+class LLMError(Exception):
+    """Raised when every attempt failed; `last_error` is the error of the final one."""
+
+    def __init__(self, message, last_error=None):
+        super().__init__(message)
+        self.last_error = last_error
+
+
+class LLMClient:
+    """
+    api_keys          : keys for the pool (default: GOOGLE_API_KEY_1..3)
+    generation_config : passed to the model, e.g. {"temperature": 0}
+    max_concurrency   : worker threads, i.e. calls in flight at once
+    client_factory    : (api_key, model_name, generation_config) -> object with
+                        generate_content(prompt, stream=False); swapped for a fake in benchmarks
+    cache             : optional ResponseCache consulted before and filled after each call
+    pool_options      : KeyPool overrides (rpm, burst, cooldown, max_wait)
+    """
+
+    def __init__(self, api_keys=None, model_name=DEFAULT_MODEL, generation_config=None,
+                 max_concurrency=MAX_CONCURRENCY, client_factory=GeminiClient, cache=None, **pool_options):
+        self.api_keys = api_keys_from_env() if api_keys is None else list(api_keys)
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self.pool = KeyPool(self.api_keys, lambda key: client_factory(key, model_name, generation_config),
+                            **pool_options)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        if not self.api_keys:
+            logger.error("No API keys available.")
+
+    @property
+    def is_active(self):
+        return bool(self.api_keys)
+
+    def _cache_key(self, prompt):
+        return self.cache.key(prompt, self.model_name, self.generation_config)
+
+    def _generate_blocking(self, prompt, attempts, cache_key=None):
+        last_error, tried = None, set()
+        for _ in range(attempts):
+            try:
+                slot = self.pool.acquire(exclude=tried)
+            except NoKeyAvailable as e:
+                last_error = e
+                break
+            tried.add(slot.index)
+            start = time.perf_counter()
+            try:
+                text = slot.client.generate_content(prompt).text
+                if not text:
+                    raise ValueError("Response was empty or blocked.")
+            except Exception as e:
+                self.pool.release(slot, time.perf_counter() - start, e)
+                logger.error(f"API Error with Key Index {slot.index}: {e}")
+                last_error = e
+                continue
+            self.pool.release(slot, time.perf_counter() - start)
+            self._remember(cache_key, text)
+            return text
+        raise LLMError(f"All attempts failed: {last_error}", last_error)
+
+    async def generate(self, prompt, attempts=None, use_cache=True):
+        """
+        Completion text for `prompt`, from the cache or computed on a worker
+        thread. A failed attempt is retried on another key (default: up to one
+        attempt per key); raises LLMError once all of them failed or no key
+        had budget left. Errors are never cached.
+        """
+        if not self.api_keys:
+            raise LLMError("No API keys available.")
+        cache_key = self._cache_key(prompt) if self.cache is not None and use_cache else None
+        if cache_key is not None:
+            # Off the event loop (SQLite may wait on another worker's write), but not behind LLM calls
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                return cached
+        attempts = attempts or len(self.api_keys)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._generate_blocking, prompt, attempts, cache_key)
+
+    def generate_sync(self, prompt, attempts=None, use_cache=True):
+        """generate() for callers without an event loop (scripts, Streamlit)."""
+        if not self.api_keys:
+            raise LLMError("No API keys available.")
+        cache_key = self._cache_key(prompt) if self.cache is not None and use_cache else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        return self._executor.submit(self._generate_blocking, prompt, attempts or len(self.api_keys),
+                                     cache_key).result()
+
+    def _remember(self, cache_key, text):
+        # A failed cache write must not cost the caller a reply it already has
+        if cache_key is None:
+            return
+        try:
+            self.cache.put(cache_key, text)
+        except Exception as e:
+            logger.error(f"Could not cache LLM response: {e}")
+
+    def _stream_blocking(self, prompt, attempts, cache_key, emit, cancelled):
+        try:
+            self._stream_attempts(prompt, attempts, cache_key, emit, cancelled)
+        except Exception as e:
+            # stream() waits for a terminal event, so the worker must always send one
+            logger.error(f"Stream worker failed: {e}")
+            emit("error", LLMError(f"Stream failed: {e}", e))
+
+    def _stream_attempts(self, prompt, attempts, cache_key, emit, cancelled):
+        last_error, tried = None, set()
+        for _ in range(attempts):
+            try:
+                slot = self.pool.acquire(exclude=tried)
+            except NoKeyAvailable as e:
+                last_error = e
+                break
+            tried.add(slot.index)
+            start = time.perf_counter()
+            parts, complete = [], True
+            try:
+                for chunk in slot.client.generate_content(prompt, stream=True):
+                    if cancelled.is_set():
+                        break
+                    text = chunk_text(chunk)
+                    if text is None:
+                        complete = False
+                    elif text:
+                        parts.append(text)
+                        emit("chunk", text)
+                if not parts and not cancelled.is_set():
+                    raise ValueError("Response was empty or blocked.")
+            except Exception as e:
+                self.pool.release(slot, time.perf_counter() - start, e)
+                logger.error(f"API Error with Key Index {slot.index}: {e}")
+                last_error = e
+                if parts:
+                    # Part of the reply already reached the caller; another key would repeat it
+                    emit("error", LLMError(f"Stream interrupted: {e}", e))
+                    return
+                continue
+            self.pool.release(slot, time.perf_counter() - start)
+            # A reply with blocked pieces is not worth replaying from the cache
+            if complete and not cancelled.is_set():
+                self._remember(cache_key, "".join(parts))
+            emit("done")
+            return
+        emit("error", LLMError(f"All attempts failed: {last_error}", last_error))
+
+    async def stream(self, prompt, attempts=None, use_cache=True):
+        """
+        generate() as an async iterator of text pieces, forwarded as soon as the
+        SDK delivers them. Attempts fail over to another key only until the
+        first piece is out; after that an error raises LLMError mid-stream. A
+        cached response comes back as a single piece. Chunks without text
+        (blocked or empty candidates) are skipped, and the iterator always
+        ends, with LLMError if the worker failed.
+        """
+        if not self.api_keys:
+            raise LLMError("No API keys available.")
+        cache_key = self._cache_key(prompt) if self.cache is not None and use_cache else None
+        if cache_key is not None:
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        loop = asyncio.get_running_loop()
+        pieces = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def emit(kind, value=None):
+            try:
+                loop.call_soon_threadsafe(pieces.put_nowait, (kind, value))
+            except RuntimeError:
+                # The event loop is gone (client disconnected during shutdown)
+                cancelled.set()
+
+        loop.run_in_executor(self._executor, self._stream_blocking, prompt, attempts or len(self.api_keys),
+                             cache_key, emit, cancelled)
+        try:
+            while True:
+                kind, value = await pieces.get()
+                if kind == "chunk":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            # Stops the worker after its current piece if the caller went away
+            cancelled.set()
+
+    def forget(self, prompt):
+        """Drops the cached response to `prompt`, e.g. when the caller could not use it."""
+        if self.cache is not None:
+            self.cache.forget(self._cache_key(prompt))
+
+    def stats(self):
+        """Concurrency limit, budget, health and cooldown of every key, and cache metrics."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            **self.pool.stats(),
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
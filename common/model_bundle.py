@@ -0,0 +1,307 @@
+"""
+Versioned model bundle shared by the crop and soil services.
+
+A bundle is a directory holding one subdirectory per saved version and a
+pointer to the one being served:
+
+    <bundle>/
+        CURRENT                name of the current version directory
+        versions/<model_version>/
+            manifest.json        format version, model version, feature schema,
+                                 label mapping, training-data hash, metadata
+            objects/<name>.joblib  estimators and preprocessing objects
+            arrays/<name>.npy      plain NumPy arrays (e.g. compiled tree nodes)
+            files/<name>           opaque files (e.g. an ONNX graph)
+
+A version directory is never modified once written, and a new version goes
+live by atomically replacing CURRENT, so a loaded bundle only ever reads its
+own version's files and the bundle path never disappears. Arrays are opened
+with mmap_mode='r', so every worker process maps the same physical pages
+instead of holding a private copy. Objects are only unpickled on first
+access, so a worker that serves from the arrays never pays for them.
+Bundles written before versioning (manifest.json directly in <bundle>/) are
+still loaded, and converted in place by the next save.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+
+BUNDLE_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+POINTER_NAME = "CURRENT"
+VERSIONS_DIR = "versions"
+# Versions kept on disk besides the current one, for workers still serving them
+KEEP_OLD_VERSIONS = 2
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Hex SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _content_hash(root, relative_paths):
+    digest = hashlib.sha256()
+    for rel in sorted(relative_paths):
+        digest.update(rel.encode())
+        digest.update(file_sha256(os.path.join(root, rel)).encode())
+    return digest.hexdigest()
+
+
+def _to_json(value):
+    # NumPy scalars/arrays (e.g. label classes) are not JSON serialisable
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialise {type(value).__name__}")
+
+
+def save_bundle(path, objects, feature_schema, labels, model_classes=None, arrays=None,
+                training_data_path=None, metadata=None, files=None):
+    """
+    Writes a new version of the bundle at `path` and makes it current once it
+    is complete on disk. Older versions beyond KEEP_OLD_VERSIONS are deleted.
+
+    objects         : {name: picklable object}, e.g. {"model": clf, "scaler": scaler}
+    feature_schema  : [{"name": "N", ...}, ...] in model input order
+    labels          : human-readable label for each encoded class
+    model_classes   : encoded class of each predict_proba column (defaults to 0..n-1)
+    arrays          : {name: ndarray} stored as memory-mappable .npy files
+    files           : {name: bytes} stored verbatim
+    """
+    path = os.path.abspath(path)
+    versions_path = os.path.join(path, VERSIONS_DIR)
+    tmp_path = os.path.join(versions_path, f".tmp-{os.getpid()}")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(os.path.join(tmp_path, "objects"))
+    os.makedirs(os.path.join(tmp_path, "arrays"))
+    os.makedirs(os.path.join(tmp_path, "files"))
+
+    paths = []
+    for name, obj in objects.items():
+        rel = os.path.join("objects", f"{name}.joblib")
+        joblib.dump(obj, os.path.join(tmp_path, rel))
+        paths.append(rel)
+    array_specs = {}
+    for name, array in (arrays or {}).items():
+        array = np.ascontiguousarray(array)
+        rel = os.path.join("arrays", f"{name}.npy")
+        np.save(os.path.join(tmp_path, rel), array, allow_pickle=False)
+        paths.append(rel)
+        array_specs[name] = {"file": rel, "dtype": str(array.dtype), "shape": list(array.shape)}
+
+    file_specs = {}
+    for name, data in (files or {}).items():
+        rel = os.path.join("files", name)
+        with open(os.path.join(tmp_path, rel), "wb") as f:
+            f.write(data)
+        paths.append(rel)
+        file_specs[name] = rel
+
+    content_hash = _content_hash(tmp_path, paths)
+    created_at = datetime.now(timezone.utc)
+    manifest = {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "model_version": f"{created_at:%Y%m%d%H%M%S}-{content_hash[:8]}",
+        "created_at": created_at.isoformat(),
+        "content_sha256": content_hash,
+        "feature_schema": list(feature_schema),
+        "labels": list(labels),
+        "model_classes": list(model_classes) if model_classes is not None else list(range(len(labels))),
+        "training_data": None,
+        "objects": {name: os.path.join("objects", f"{name}.joblib") for name in objects},
+        "arrays": array_specs,
+        "files": file_specs,
+        "metadata": metadata or {},
+    }
+    if training_data_path:
+        manifest["training_data"] = {
+            "file": os.path.basename(training_data_path),
+            "sha256": file_sha256(training_data_path),
+        }
+    with open(os.path.join(tmp_path, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2, default=_to_json)
+
+    version_path = os.path.join(versions_path, manifest["model_version"])
+    if os.path.exists(version_path):
+        # Same content saved within the same second: that version is already complete
+        shutil.rmtree(tmp_path)
+    else:
+        os.replace(tmp_path, version_path)
+    _point_to(path, manifest["model_version"])
+    _remove_stale(path, manifest["model_version"])
+    return manifest
+
+
+def _point_to(path, version):
+    """Makes `version` the current one with a single atomic rename of the pointer file."""
+    tmp_pointer = os.path.join(path, f"{POINTER_NAME}.tmp-{os.getpid()}")
+    with open(tmp_pointer, "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, os.path.join(path, POINTER_NAME))
+
+
+def _remove_stale(path, current):
+    # Files of a pre-versioning bundle, now shadowed by the pointer
+    for rel in (MANIFEST_NAME, "objects", "arrays", "files"):
+        target = os.path.join(path, rel)
+        if os.path.isdir(target):
+            shutil.rmtree(target, ignore_errors=True)
+        elif os.path.exists(target):
+            os.remove(target)
+    versions_path = os.path.join(path, VERSIONS_DIR)
+    # Version names start with a UTC timestamp, so they sort oldest first
+    old = sorted(name for name in os.listdir(versions_path) if name != current and not name.startswith("."))
+    for name in old[:max(0, len(old) - KEEP_OLD_VERSIONS)]:
+        shutil.rmtree(os.path.join(versions_path, name), ignore_errors=True)
+
+
+class ModelBundle:
+    """
+    A loaded bundle version: manifest fields, memory-mapped arrays and lazily
+    loaded objects. `path` is the version's own directory.
+    """
+
+    def __init__(self, path, manifest, mmap=True):
+        self.path = path
+        self.manifest = manifest
+        self.mmap = mmap
+        mode = "r" if mmap else None
+        self.arrays = {
+            name: np.load(os.path.join(path, spec["file"]), mmap_mode=mode, allow_pickle=False)
+            for name, spec in manifest.get("arrays", {}).items()
+        }
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self.manifest["model_version"]
+
+    @property
+    def feature_names(self):
+        return [feature["name"] for feature in self.manifest["feature_schema"]]
+
+    @property
+    def labels(self):
+        return self.manifest["labels"]
+
+    @property
+    def model_classes(self):
+        return np.asarray(self.manifest["model_classes"])
+
+    @property
+    def metadata(self):
+        return self.manifest.get("metadata", {})
+
+    def has(self, name):
+        return name in self.manifest.get("objects", {})
+
+    def file_path(self, name):
+        """Absolute path of a stored file, or None when the bundle has no such file."""
+        rel = self.manifest.get("files", {}).get(name)
+        return os.path.join(self.path, rel) if rel else None
+
+    def get(self, name):
+        """Unpickles an object on first access; NumPy arrays inside it are memory-mapped."""
+        if name not in self._objects:
+            with self._lock:
+                if name not in self._objects:
+                    rel = self.manifest["objects"][name]
+                    self._objects[name] = joblib.load(
+                        os.path.join(self.path, rel), mmap_mode="r" if self.mmap else None
+                    )
+        return self._objects[name]
+
+
+def version_path(path):
+    """Directory of the current version of the bundle at `path`, or None when there is no bundle."""
+    try:
+        with open(os.path.join(path, POINTER_NAME), "r") as f:
+            return os.path.join(path, VERSIONS_DIR, f.read().strip())
+    except FileNotFoundError:
+        pass
+    # Pre-versioning layout
+    return path if os.path.isfile(os.path.join(path, MANIFEST_NAME)) else None
+
+
+def load_bundle(path, mmap=True):
+    """
+    Opens the current version of a bundle written by save_bundle. The returned
+    bundle reads from that version's directory only, whatever is saved later.
+    """
+    current = version_path(path)
+    if current is None:
+        raise FileNotFoundError(f"No model bundle at {path}")
+    with open(os.path.join(current, MANIFEST_NAME), "r") as f:
+        manifest = json.load(f)
+    version = manifest.get("format_version")
+    if version is None or version > BUNDLE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported bundle format version {version} in {current}")
+    return ModelBundle(current, manifest, mmap=mmap)
+
+
+def bundle_exists(path):
+    return version_path(path) is not None
+
+
+def bundle_markers(path):
+    """Files that change whenever a new version of the bundle at `path` goes live (for reload watchers)."""
+    return [os.path.join(path, POINTER_NAME), os.path.join(path, MANIFEST_NAME)]
+
+
+def process_memory():
+    """
+    Current process RSS and PSS in MB (Linux /proc; PSS splits shared pages
+    between processes). Elsewhere both are None and `peak_rss_mb` carries the
+    peak RSS so far instead.
+    """
+    usage = {"rss_mb": None, "pss_mb": None}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                if key in ("Rss", "Pss"):
+                    usage[f"{key.lower()}_mb"] = int(value.split()[0]) / 1024
+    except OSError:
+        usage["peak_rss_mb"] = peak_memory_mb()
+    return usage
+
+
+def peak_memory_mb():
+    """Peak RSS of this process so far in MB (Linux VmHWM, getrusage elsewhere), or None if unknown."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, KB elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def timed(fn, *args, **kwargs):
+    """Runs fn and returns (result, elapsed milliseconds)."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
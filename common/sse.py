@@ -0,0 +1,39 @@
+"""
+Server-Sent Events framing for the streaming /chat endpoints.
+
+Each piece of the reply is sent as `data: {"delta": "..."}`; the stream ends
+with `event: done` carrying the full reply, or `event: error` if generation
+broke off after part of the reply was sent.
+"""
+import json
+import logging
+
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+
+def sse_event(payload, event=None):
+    lines = [f"event: {event}"] if event else []
+    lines.append(f"data: {json.dumps(payload)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def sse_chat_events(pieces):
+    reply = []
+    try:
+        async for piece in pieces:
+            reply.append(piece)
+            yield sse_event({"delta": piece})
+    except Exception as e:
+        logger.error(f"Chat Stream Error: {e}")
+        yield sse_event({"error": "The reply was interrupted. Please try again.", "partial_reply": "".join(reply)},
+                        "error")
+        return
+    yield sse_event({"reply": "".join(reply)}, "done")
+
+
+def sse_chat_response(pieces):
+    """StreamingResponse of a reply's pieces; proxies are told not to buffer it."""
+    return StreamingResponse(sse_chat_events(pieces), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})